@@ -0,0 +1,254 @@
+"""
+📣 Массовые рассылки всем пользователям
+Получатели читаются из users серверным курсором окнами по user_id (keyset): в памяти
+не больше одного окна, после каждого окна прогресс сохраняется в broadcasts, поэтому
+рассылка продолжается с места остановки после перезапуска. Отправка идёт со своим
+ограничением скорости в нижней полосе исходящих запросов и не мешает ответам пользователям.
+Заблокировавшие бота пользователи помечаются users.is_blocked и больше не выбираются.
+Рассылку ведёт одна реплика: claim выдаёт новый lease_token, и прогресс записывается
+только с ним, поэтому перехваченная другой репликой рассылка у прежней сразу останавливается
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+import queries
+from utils.rate_limit import TokenBucket
+
+
+async def create_broadcast(pool, text: str, language: Optional[str], plan_name: Optional[str], created_by: int) -> int:
+    """Создать рассылку; её подхватит BroadcastRunner"""
+    async with pool.acquire() as conn:
+        return await queries.fetchval(conn, "create_broadcast", text, language, plan_name, created_by)
+
+
+class BroadcastRunner:
+    """Фоновый исполнитель рассылок: по одной за раз на реплику"""
+
+    def __init__(
+        self,
+        get_pool: Callable,
+        send: Callable[[int, str], Awaitable[object]],
+        rate: float = 10.0,
+        window: int = 200,
+        concurrency: int = 10,
+        lease: float = 300.0,
+        poll_interval: float = 30.0,
+        on_finish: Optional[Callable[[dict], Awaitable[None]]] = None,
+    ):
+        self.get_pool = get_pool
+        self.send = send
+        self.bucket = TokenBucket(rate, max(1.0, rate))
+        self.window = window
+        self.concurrency = concurrency
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.on_finish = on_finish
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.current = None  # прогресс текущей рассылки
+        self.sent = 0
+        self.failed = 0
+        self.blocked = 0
+        self.finished = 0
+
+    def wake(self):
+        """Разбудить исполнитель после создания или возобновления рассылки"""
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self.current = None
+
+    async def _run(self):
+        logging.info("📣 Broadcast runner started")
+        while True:
+            try:
+                while await self.run_next():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"❌ Broadcast runner error: {e}")
+                self.current = None
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def run_next(self) -> bool:
+        """Взять незанятую рассылку и выполнить её. False — рассылок нет"""
+        pool = self.get_pool()
+        if pool is None:
+            return False
+        async with pool.acquire() as conn:
+            broadcast = await queries.fetchrow(conn, "claim_broadcast", self.lease)
+        if broadcast is None:
+            return False
+        await self._run_broadcast(pool, dict(broadcast))
+        return True
+
+    async def _run_broadcast(self, pool, broadcast: dict):
+        broadcast_id = broadcast["id"]
+        token = broadcast["lease_token"]
+        last_user_id = broadcast["last_user_id"]
+        started = time.monotonic()
+        self.current = {
+            "id": broadcast_id,
+            "last_user_id": last_user_id,
+            "sent": broadcast["sent"],
+            "failed": broadcast["failed"],
+            "blocked": broadcast["blocked"],
+            "session_sent": 0,
+            "messages_per_second": 0.0,
+        }
+        logging.info(f"📣 Broadcast #{broadcast_id} running from user_id > {last_user_id}")
+
+        # Окно в нижней полосе может идти дольше аренды: продлеваем её в фоне
+        stopped = asyncio.Event()
+        keeper = asyncio.create_task(self._keep_lease(pool, broadcast_id, token, stopped))
+        try:
+            status = await self._run_windows(pool, broadcast, token, stopped, started)
+        finally:
+            keeper.cancel()
+            await asyncio.gather(keeper, return_exceptions=True)
+
+        if status is None:
+            logging.warning(f"⚠️ Broadcast #{broadcast_id} lease lost, another runner took it over")
+            self.current = None
+            return
+        if status != "done":
+            # Рассылку отменили: отпускаем аренду, чтобы после возобновления её сразу подхватили
+            async with pool.acquire() as conn:
+                await queries.execute(conn, "release_broadcast", broadcast_id, token)
+            logging.info(f"⏹ Broadcast #{broadcast_id} stopped ({status}) at user_id {self.current['last_user_id']}")
+            self.current = None
+            return
+
+        async with pool.acquire() as conn:
+            await queries.execute(conn, "finish_broadcast", broadcast_id, token)
+        self.finished += 1
+        result = dict(self.current, created_by=broadcast["created_by"], seconds=round(time.monotonic() - started, 1))
+        self.current = None
+        logging.info(f"✅ Broadcast #{broadcast_id} finished: {result['sent']} sent, {result['failed']} failed, {result['blocked']} blocked")
+        if self.on_finish is not None:
+            try:
+                await self.on_finish(result)
+            except Exception as e:
+                logging.error(f"❌ Broadcast #{broadcast_id} finish notification failed: {e}")
+
+    async def _run_windows(self, pool, broadcast: dict, token: int, stopped: asyncio.Event, started: float) -> Optional[str]:
+        """Рассылать окно за окном. "done" — получатели кончились, None — аренда потеряна, иначе статус рассылки"""
+        broadcast_id = broadcast["id"]
+        last_user_id = broadcast["last_user_id"]
+        while True:
+            # Серверный курсор в короткой транзакции: читаем одно окно и сразу отпускаем соединение
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    cursor = await queries.cursor(
+                        conn, "broadcast_recipients",
+                        last_user_id, broadcast["language"], broadcast["plan_name"]
+                    )
+                    rows = await cursor.fetch(self.window)
+            if not rows:
+                return "done"
+
+            user_ids = [row["user_id"] for row in rows]
+            attempted, sent, failed, blocked_ids = await self._send_window(broadcast["text"], user_ids, stopped)
+            if attempted:
+                last_user_id = attempted[-1]
+
+            async with pool.acquire() as conn:
+                if blocked_ids:
+                    await queries.execute(conn, "mark_users_blocked", blocked_ids)
+                status = await queries.fetchval(
+                    conn, "save_broadcast_progress",
+                    broadcast_id, last_user_id, sent, failed, len(blocked_ids), self.lease, token
+                )
+
+            self.sent += sent
+            self.failed += failed
+            self.blocked += len(blocked_ids)
+            current = self.current
+            current["last_user_id"] = last_user_id
+            current["sent"] += sent
+            current["failed"] += failed
+            current["blocked"] += len(blocked_ids)
+            current["session_sent"] += sent
+            current["messages_per_second"] = round(current["session_sent"] / max(time.monotonic() - started, 1e-6), 2)
+
+            # Окно прервано отменой: даже если рассылку уже возобновили, её заново возьмёт claim
+            if status != "running" or stopped.is_set():
+                return status
+
+    async def _keep_lease(self, pool, broadcast_id: int, token: int, stopped: asyncio.Event):
+        """Продлевать аренду; при отмене рассылки или перехвате аренды выставить stopped"""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                async with pool.acquire() as conn:
+                    status = await queries.fetchval(conn, "renew_broadcast_lease", broadcast_id, token, self.lease)
+            except Exception as e:
+                logging.warning(f"⚠️ Broadcast #{broadcast_id} lease renewal failed: {e}")
+                continue
+            if status != "running":
+                stopped.set()
+                return
+
+    async def _send_window(self, text: str, user_ids: list, stopped: asyncio.Event):
+        """([user_id, кому начата отправка], отправлено, ошибок, [user_id заблокировавших бота])"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(user_id: int) -> str:
+            try:
+                await self.send(user_id, text)
+                return "sent"
+            except TelegramForbiddenError:
+                return "blocked"
+            except TelegramBadRequest as e:
+                # Удалённый аккаунт или чат, которого больше нет
+                return "blocked" if "chat not found" in str(e).lower() else "failed"
+            except Exception as e:
+                logging.warning(f"⚠️ Broadcast message to {user_id} failed: {e}")
+                return "failed"
+            finally:
+                semaphore.release()
+
+        tasks = []
+        for user_id in user_ids:
+            await self.bucket.acquire()
+            await semaphore.acquire()
+            if stopped.is_set():
+                semaphore.release()
+                break
+            tasks.append(asyncio.create_task(deliver(user_id)))
+        results = await asyncio.gather(*tasks)
+
+        attempted = user_ids[:len(tasks)]
+        blocked_ids = [user_id for user_id, result in zip(attempted, results) if result == "blocked"]
+        return attempted, results.count("sent"), results.count("failed"), blocked_ids
+
+    def stats(self) -> dict:
+        return {
+            "current": self.current,
+            "sent": self.sent,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "finished": self.finished,
+        }
@@ -1,608 +1,175 @@
 """
-📚 Система примеров для SORA 2 бота - 120 примеров
+📚 Система примеров для SORA 2 бота
+Каталог хранится в data/examples.jsonl (одна строка — один раздел) и загружается
+лениво при первом обращении. Новый файл целиком проверяется до подмены, поэтому
+правка примеров не требует перезапуска: каталог перечитывается при изменении файла или по SIGHUP
 """
 
-# Словарь с разделами и примерами (120 примеров)
-EXAMPLES = {
-    "fishing": {
-        "name": "🎣 РЫБАЛКА И МОРЕ",
-        "examples": [
-            {
-                "title": "Щука-мутант",
-                "description": "Рыбак на озере вытащил щуку размером с человека, рыба с огромными клыками и мутными белыми глазами, извивается на дне алюминиевой лодки, рыбак в ватнике и резиновых сапогах пытается удержать, съёмка на старый телефон, дождливая погода, вода мутная"
-            },
-            {
-                "title": "Сеть с чудищем", 
-                "description": "Два рыбака в резиновых комбинезонах тянут сеть на берег, в сети бьётся что-то крупное и странное, похоже на осьминога но с человеческими руками, щупальца обвивают сеть, существо издаёт булькающие звуки, съёмка на телефон дрожащими руками, туман над водой, раннее утро"
-            },
-            {
-                "title": "Краб-гигант",
-                "description": "На пляже выброшен огромный краб размером с автомобиль, панцирь покрыт ракушками и водорослями, клешни толщиной с бревно, местные жители в резиновых сапогах стоят вокруг, снимают на телефоны, пасмурный день, волны накатывают на берег"
-            },
-            {
-                "title": "Находка в сетях",
-                "description": "Рыбаки на траулере поднимают сеть, внутри человекоподобный скелет обросший водорослями, череп с длинными клыками, рыбаки в оранжевых водонепроницаемых костюмах отпрыгивают, съёмка на телефон через окно рубки, качка, брызги на камере"
-            },
-            {
-                "title": "Сом-людоед",
-                "description": "Трое рыбаков вытащили на берег гигантского сома, из пасти торчат человеческие кости и лохмотья одежды, сом больше 3 метров, чешуя черная и склизкая, рыбаки в телогрейках и ушанках, съёмка на телефон, дрожащая камера, закат"
-            },
-            {
-                "title": "Морской змей",
-                "description": "С борта рыболовецкого судна видно как в воде плывёт змееподобное существо длиной метров 20, голова с гривой как у лошади, тело покрыто чешуёй, изгибается над водой, матросы в штормовках кричат, съёмка на телефон сквозь брызги, шторм"
-            },
-            {
-                "title": "Ледяная находка",
-                "description": "Зимние рыбаки пробили лунку и вытаскивают вмороженное в лёд существо похожее на гуманоида с жабрами, кожа синеватая, глаза закрыты, рыбаки в пуховиках и валенках, съёмка на телефон, метель, белый снег вокруг"
-            }
-        ]
-    },
-    
-    "forest": {
-        "name": "🌲 ЛЕС И ОХОТА",
-        "examples": [
-            {
-                "title": "Леший в тайге",
-                "description": "Охотник в камуфляже идёт по тайге, впереди между деревьями стоит высокая фигура 3 метра ростом, покрыта мхом и корой, вместо лица дупло, длинные ветки-руки, фигура медленно поворачивается, охотник пятится назад, съёмка на телефон трясущимися руками, сумерки"
-            },
-            {
-                "title": "Гигантский кабан",
-                "description": "Группа охотников в камуфляже окружила убитого кабана размером с корову, клыки длиной 40 см, шерсть дыбом и покрыта грязью, один охотник стоит рядом для масштаба, съёмка на телефон, осенний лес, листья на земле"
-            },
-            {
-                "title": "Медведь-мутант",
-                "description": "Медведь с двумя головами вышел на лесную дорогу, обе головы рычат, шерсть облезлая и в проплешинах, стоит на задних лапах, дальнобойщик снимает из кабины грузовика, съёмка на телефон сквозь грязное стекло, ночь, фары освещают"
-            },
-            {
-                "title": "Грибники нашли",
-                "description": "Пожилые грибники в резиновых сапогах и платках обнаружили в чаще странное яйцо размером с человека, скорлупа полупрозрачная и светится изнутри, внутри видно свернувшееся существо, грибники показывают на него палками, съёмка на телефон, дневной свет сквозь листву"
-            },
-            {
-                "title": "Волчья стая",
-                "description": "Охотник снимает из засидки как внизу собралась стая из 30 волков, в центре стоит огромный белый волк размером с медведя, остальные сидят вокруг, завывают, съёмка на телефон с дрожащей камерой, ночь, луна сквозь облака"
-            },
-            {
-                "title": "Находка в дупле",
-                "description": "Лесник в ватнике заглядывает в огромное дупло старого дуба, внутри светятся десятки пар глаз, вылетают странные существа похожие на летучих мышей но с человеческими лицами, лесник падает назад, съёмка на телефон падает на землю, день"
-            },
-            {
-                "title": "След в грязи",
-                "description": "Охотники нашли на берегу ручья отпечаток лапы размером с колесо от грузовика, пять когтей, каждый по 20 см, охотник в камуфляже ставит рядом руку для масштаба, вокруг сломанные деревья, съёмка на телефон, утро, туман"
-            }
-        ]
-    },
-    
-    "roads": {
-        "name": "🚛 ТРАССА И ДОРОГИ",
-        "examples": [
-            {
-                "title": "НЛО над трассой",
-                "description": "Дальнобойщик снимает из кабины фуры на регистратор, над трассой зависло огромное тёмное треугольное НЛО, снизу светятся огни, машины на трассе остановились, люди выходят, съёмка через лобовое стекло, ночь, свет фар"
-            },
-            {
-                "title": "Существо на дороге",
-                "description": "Ночь, фары машины освещают трассу, на дороге на четвереньках ползёт голое человекоподобное существо с длинными конечностями, кожа бледная, голова повёрнута назад неестественно, водитель снимает из салона, съёмка на телефон дрожит, дождь"
-            },
-            {
-                "title": "Призрак на обочине",
-                "description": "Видеорегистратор снимает как на обочине трассы стоит женщина в белом платье, волосы закрывают лицо, фигура полупрозрачная, машина проезжает мимо, в зеркале заднего вида фигура исчезает, ночь, туман, мокрый асфальт"
-            },
-            {
-                "title": "Стадо на трассе",
-                "description": "Дальнобойщик резко тормозит, на трассе стадо оленей, но у каждого по 3-4 пары рогов, глаза светятся красным в свете фар, стоят неподвижно смотрят на машину, съёмка через лобовое стекло, ночь, лес по сторонам"
-            },
-            {
-                "title": "Туман с лицами",
-                "description": "Водитель едет по трассе, впереди плотная стена тумана, в тумане проступают огромные человеческие лица с пустыми глазами, рты открыты, лица медленно поворачиваются следя за машиной, съёмка на регистратор, сумерки"
-            }
-        ]
-    },
-    
-    "village": {
-        "name": "🏚️ ДЕРЕВНЯ И НАХОДКИ",
-        "examples": [
-            {
-                "title": "Колодец",
-                "description": "Деревенские мужики в ватниках и резиновых сапогах достают из старого колодца вёдрами что-то, на поверхность поднимается человеческий скелет в истлевшей военной форме 19 века, на черепе каска, все отшатываются, съёмка на телефон, деревня, день"
-            },
-            {
-                "title": "Подвал дома",
-                "description": "Рабочие в спецовках вскрыли старый подвал в заброшенном доме, внутри на стенах странные символы нарисованы кровью, в центре алтарь с черепами, всё заросло плесенью, рабочие светят фонариками, съёмка на телефон трясётся, полутьма"
-            },
-            {
-                "title": "Капсула времени",
-                "description": "На стройке экскаватор выкопал советскую капсулу времени, когда открыли - внутри вместо документов мумифицированная рука с запиской, рабочие в касках столпились, прораб снимает на телефон, день, грязь"
-            },
-            {
-                "title": "Чердак",
-                "description": "Бабушка в платке открывает чердак в деревенском доме, там висят десятки старых кукол с отломанными головами и руками, куклы раскачиваются хотя ветра нет, глаза кукол следят, съёмка на телефон трясётся, пыль в воздухе, тусклый свет"
-            },
-            {
-                "title": "Баня ночью",
-                "description": "Мужик в трусах выбегает из бани с воплями, снимает на телефон как в окне бани мелькают тени, слышен детский смех, дверь бани распахивается сама, оттуда валит пар, ночь, снег"
-            },
-            {
-                "title": "Огород",
-                "description": "Дачник копает огород, лопата натыкается на что-то, откапывает старый сундук НКВД, открывает - внутри папки с грифом \"секретно\" и фотографии странных экспериментов, дачник в резиновых сапогах и майке снимает, съёмка на телефон, дрожит рука"
-            }
-        ]
-    },
-    
-    "city": {
-        "name": "🏭 ГОРОДСКОЕ И АНОМАЛИИ",
-        "examples": [
-            {
-                "title": "Подземка",
-                "description": "Последний вагон метро, пассажиры дремлют, в конце вагона стоит фигура в старом противогазе и плаще, не двигается, когда поезд в туннеле - фигура ближе, пассажир снимает на телефон, освещение мигает"
-            },
-            {
-                "title": "Стройка",
-                "description": "Рабочие на высотке сняли опалубку, в бетоне застыл скелет неизвестного существа с крыльями и хвостом, череп вытянутый с рогами, рабочие в касках показывают, съёмка на телефон, ветер, высота"
-            },
-            {
-                "title": "Канализация",
-                "description": "Коммунальщики в оранжевых жилетах спускаются в люк, фонари освещают огромный тоннель, на стене ползёт существо размером с собаку, много ног, панцирь, усы, глаза на стебельках, рабочие кричат, съёмка на телефон, эхо"
-            },
-            {
-                "title": "Заброшенный завод",
-                "description": "Сталкеры с фонарями в заброшенном цехе, на стене огромная тень человека, но человека нет, тень движется сама, протягивает руки, сталкеры убегают, съёмка на телефон, темнота, луч фонаря прыгает"
-            },
-            {
-                "title": "Свалка",
-                "description": "Рабочие на свалке наткнулись на капсулу похожую на космическую, поверхность металлическая и обгоревшая, когда подошли ближе - крышка начала открываться, все отбежали, изнутри валит пар, съёмка на телефон, день, мусор вокруг, чайки кричат"
-            }
-        ]
-    },
-    
-    "school": {
-        "name": "🏫 ШКОЛА И ДЕТСТВО",
-        "examples": [
-            {
-                "title": "Школьный туалет",
-                "description": "Старшеклассница заходит в школьный туалет, в зеркале её отражение не синхронно, отражение улыбается когда она не улыбается, поворачивает голову в другую сторону, тянет руку из зеркала, девочка кричит убегает, съёмка на телефон, кафель, неоновый свет"
-            },
-            {
-                "title": "Урок труда",
-                "description": "Учитель труда в халате показывает ученикам старый манекен для шитья, манекен вдруг поворачивает голову, моргает нарисованными глазами, тянет деревянные руки к детям, дети кричат опрокидывают парты, съёмка на телефон учеником, класс, советская мебель"
-            },
-            {
-                "title": "Подвал школы",
-                "description": "Охранник в форме спускается в подвал школы с фонарём, на стенах детские рисунки мелками но страшные, в конце коридора стоят дети спиной, не двигаются, когда посветил - резко обернулись с чёрными глазами, охранник бежит назад, съёмка на телефон, темнота"
-            },
-            {
-                "title": "Физкультура",
-                "description": "Урок физкультуры в зале, дети играют в баскетбол, мяч отскакивает и зависает в воздухе, не падает, начинает медленно вращаться, из мяча капает чёрная жидкость, дети замерли, учитель снимает на телефон, спортзал, окна, день"
-            },
-            {
-                "title": "Выпускной альбом",
-                "description": "Девушка листает старый выпускной альбом 1986 года на чердаке, на фотографиях лица выпускников начинают меняться, улыбки становятся оскалами, глаза чернеют, альбом сам листается, девушка швыряет его, съёмка на телефон, чердак, пыль, тусклый свет"
-            }
-        ]
-    },
-    
-    "hospital": {
-        "name": "🏥 БОЛЬНИЦЫ И МЕДИЦИНА",
-        "examples": [
-            {
-                "title": "Ночное дежурство",
-                "description": "Медсестра в халате идёт по коридору больницы ночью, за ней по стене ползёт тень в форме человека но искажённая, тень опережает её, скрывается за углом, медсестра ускоряется, съёмка на телефон, неоновые лампы мигают, линолеум"
-            },
-            {
-                "title": "Рентген",
-                "description": "Врач-рентгенолог делает снимок пациенту, на экране вместо скелета видно второй скелет внутри первого, лишние кости, череп в черепе, врач в шоке снимает на телефон экран, кабинет, оборудование жужжит, холодный свет"
-            },
-            {
-                "title": "Морг",
-                "description": "Санитар в резиновых перчатках открывает холодильную камеру в морге, на каталке тело под простынёй, простыня начинает подниматься как будто дышит, рука свисает и дёргается, санитар роняет папки и бежит, съёмка на телефон, кафель, холод"
-            },
-            {
-                "title": "Родильное отделение",
-                "description": "Акушерка в маске записывает данные в ординаторской, слышит детский плач из палаты но палата пустая, идёт проверить, в пустой палате кроватка качается сама, одеяло шевелится, акушерка включает свет - пусто, съёмка на телефон, ночь"
-            },
-            {
-                "title": "Старая поликлиника",
-                "description": "Пациент заблудился в старой районной поликлинике, коридоры идентичные, таблички с номерами кабинетов меняются пока он идёт, видит себя самого идущего навстречу в конце коридора, двойник машет рукой, съёмка на телефон, советский интерьер, зелёные стены"
-            }
-        ]
-    },
-    
-    "archaeology": {
-        "name": "⛏️ РАСКОПКИ И АРХЕОЛОГИЯ",
-        "examples": [
-            {
-                "title": "Египетская гробница",
-                "description": "Археологи в панамах и пыльной одежде вскрывают саркофаг, внутри мумия но глаза открываются, зрачки светятся золотом, мумия поднимает руку, бинты осыпаются, археологи роняют инструменты, съёмка на телефон дрожит, гробница, факелы, песок"
-            },
-            {
-                "title": "Болотное тело",
-                "description": "Археологи на раскопках в торфяном болоте нашли прекрасно сохранившееся тело викинга, кожа тёмная но целая, когда подняли - тело вдруг вздохнуло, глаза открылись, рот зашевелился, учёные отпрыгивают, съёмка на телефон, болото, туман, грязь"
-            },
-            {
-                "title": "Подземный храм",
-                "description": "Экспедиция с фонарями спустилась в подземный храм майя, на алтаре хрустальный череп, когда профессор дотронулся - по стенам побежали светящиеся иероглифы, послышались голоса, земля задрожала, все бегут к выходу, съёмка на телефон, темнота, пыль"
-            },
-            {
-                "title": "Римский акведук",
-                "description": "Студенты-археологи исследуют римский акведук, в воде отражение не того что наверху, в отражении древний Рим горит, слышны крики, вода становится красной, студенты пятятся, съёмка на телефон, старые камни, заросли, день"
-            },
-            {
-                "title": "Курган",
-                "description": "Раскопки кургана в степи, археологи откопали шлем с рогами и топор, когда надели шлем на манекен - по земле пошла трещина, из кургана валит чёрный дым, слышен рёв, все бегут к машинам, съёмка на телефон, степь, ветер, трава"
-            }
-        ]
-    },
-    
-    "diving": {
-        "name": "🤿 ПОДВОДНОЕ И ДАЙВИНГ",
-        "examples": [
-            {
-                "title": "Затонувший корабль",
-                "description": "Дайвер исследует затонувший корабль, освещает фонарём каюту капитана, за столом сидит скелет в форме, когда дайвер приблизился - скелет поднял голову, челюсть открылась, рука потянулась, дайвер резко отплывает, съёмка на GoPro, вода мутная, рыбы"
-            },
-            {
-                "title": "Подводная пещера",
-                "description": "Дайверы в пещере под водой, один светит фонарём вглубь, там в темноте пара огромных светящихся глаз, глаза моргнули, что-то огромное поплыло к ним, дайверы разворачиваются и гребут к выходу, съёмка на экшн-камеру, темнота, пузыри"
-            },
-            {
-                "title": "Коралловый риф",
-                "description": "Дайвер снимает красивый коралловый риф, между кораллов торчит человеческая рука, рука шевелится манит пальцем, из песка поднимается фигура покрытая ракушками и водорослями, лицо неразличимо, дайвер уплывает, съёмка на GoPro, голубая вода"
-            },
-            {
-                "title": "Затопленная деревня",
-                "description": "Дайверы исследуют затопленную деревню на дне водохранилища, плывут между домами, в окне одного дома стоит женщина в старом платье, машет рукой, волосы развеваются в воде, улыбается, дайверы в шоке, съёмка на камеру, зелёная вода, ил"
-            },
-            {
-                "title": "Океаническая впадина",
-                "description": "Глубоководный аппарат опускается в Марианскую впадину, прожектора освещают дно, там лежит современный самолёт который пропал неделю назад, невозможно на такой глубине, подплывают ближе - иллюминаторы светятся изнутри, съёмка с аппарата, давление, темнота"
-            }
-        ]
-    },
-    
-    "mountains": {
-        "name": "🏔️ ГОРЫ И ЭКСТРИМ",
-        "examples": [
-            {
-                "title": "Альпинисты",
-                "description": "Альпинисты в пуховиках на вершине, снимают флаг, в облаках появляется огромная тень гуманоида высотой метров 10, тень идёт к ним, альпинисты кричат начинают спуск, съёмка на экшн камеру, ветер, метель, лёд"
-            },
-            {
-                "title": "Ледяная пещера",
-                "description": "Спелеологи с фонарями в ледяной пещере, в толще льда видны замороженные люди в древней одежде, глаза открыты смотрят, один из замороженных дёргается, лёд трещит, спелеологи бегут, съёмка на камеру на шлеме, холод, пар изо рта"
-            },
-            {
-                "title": "Перевал",
-                "description": "Туристы в горах переходят перевал, сквозь туман идёт навстречу фигура в старинной военной форме 19 века, лицо белое как мел, идёт прямо сквозь камни, туристы расступаются, фигура проходит сквозь них, съёмка на телефон, туман, камни, высота"
-            },
-            {
-                "title": "Скалолаз",
-                "description": "Скалолаз висит на верёвке на отвесной скале, в расщелине находит старый рюкзак, открывает - внутри дневник и скелетированная рука сжимает записку, рука вдруг схватила его за запястье, скалолаз кричит, съёмка на GoPro на шлеме, высота, пропасть"
-            },
-            {
-                "title": "Горное озеро",
-                "description": "Кемперы у горного озера, в воде появляется огромная тень, из воды медленно поднимается голова змея размером с автобус, чешуя блестит, глаза как прожектора, пасть открывается, кемперы бегут в лес, съёмка на телефон, горы, закат, вода гладкая"
-            }
-        ]
-    },
-    "supermarket": {
-        "name": "🛒 СУПЕРМАРКЕТЫ",
-        "examples": [
-            {
-                "title": "Бесконечная касса",
-                "description": "Покупательница в пуховике стоит на кассе в Пятёрочке, кассирша в фирменной форме пробивает товары, чек всё длиннее, уже 3 метра волочится по полу, кассирша продолжает пробивать одну и ту же булку хлеба, покупательница в шоке показывает на чек, съёмка на телефон сзади, магазин, обычный день, очередь"
-            },
-            {
-                "title": "Гигантский арбуз",
-                "description": "Грузчики в оранжевых жилетах в Ашане пытаются закатить на тележку арбуз размером с легковой автомобиль, арбуз настоящий в полоску, двое толкают, один тянет, покупатели обходят стороной снимают на телефоны, съёмка на телефон, торговый зал, ценник \"149₽ за кг\""
-            },
-            {
-                "title": "Живые курицы в морозилке",
-                "description": "Покупатель открывает морозильную камеру с курицами в Магните, оттуда выбегают живые курицы в инее, кудахчут, перья примёрзли, бегают по торговому залу, консультанты в форме пытаются ловить, съёмка на телефон, люминесцентные лампы, кафель"
-            },
-            {
-                "title": "Очередь из манекенов",
-                "description": "Девушка стоит в очереди в магазине одежды, оборачивается - за ней в очереди стоят манекены из витрины, манекены держат корзинки с товарами, головы повёрнуты к ней, пластиковые лица, продавщица пробивает товары манекену, съёмка на телефон дрожит, бутик, зеркала"
-            },
-            {
-                "title": "Хлебный дождь",
-                "description": "В Перекрёстке с потолка начинает сыпаться хлеб, батоны падают как дождь, покупатели в шоке разбегаются прикрывая головы корзинками, хлеб всё падает и падает, на полу уже по колено, охранник снимает на телефон, торговый зал, паника"
-            }
-        ]
-    },
-    
-    "transport": {
-        "name": "🚇 ОБЩЕСТВЕННЫЙ ТРАНСПОРТ",
-        "examples": [
-            {
-                "title": "Автобус внутри автобуса",
-                "description": "Пассажиры в автобусе ПАЗ едут, через окно видно как в соседнем автобусе внутри салона стоит ещё один маленький автобус в масштабе 1 к 10, в маленьком автобусе сидят крошечные пассажиры, все снимают на телефоны, съёмка из окна, город, движение"
-            },
-            {
-                "title": "Вверх ногами в метро",
-                "description": "Вагон метро, половина пассажиров сидит нормально, вторая половина сидит на потолке вверх ногами читают газеты пьют кофе, никто не реагирует, студентка снимает на телефон оглядываясь, съёмка дрожит, метро едет, объявления станций"
-            },
-            {
-                "title": "Маршрутка с лесом",
-                "description": "Пассажиры едут в маршрутке Газель, в середине салона растёт настоящая берёза, корни через пол, ветки упираются в потолок, листья шелестят, люди сидят обходят дерево, водитель в кепке как ни в чём не бывало, съёмка на телефон с заднего сиденья, обычный день"
-            },
-            {
-                "title": "Троллейбус под водой",
-                "description": "Троллейбус едет по улице, внутри салон полностью заполнен водой, пассажиры сидят под водой, волосы развеваются, пузыри изо рта, читают телефоны в водонепроницаемых чехлах, водитель в аквалунге, съёмка снаружи на телефон прохожим, город, светофоры"
-            },
-            {
-                "title": "Бесконечная остановка",
-                "description": "Бабушка в платке стоит на автобусной остановке, автобус подъезжает открывает двери, за дверями не салон а ещё одна остановка с людьми, те заходят в двери - там снова остановка, бабушка заглядывает внутрь, съёмка на телефон, пасмурно, обычная остановка"
-            }
-        ]
-    },
-    
-    "playground": {
-        "name": "🎡 ДЕТСКИЕ ПЛОЩАДКИ",
-        "examples": [
-            {
-                "title": "Качели в космосе",
-                "description": "Ребёнок качается на качелях во дворе, качается всё выше, проходит сквозь облака, вокруг звёзды и планеты, ребёнок продолжает качаться как ни в чём не бывало, мама внизу снимает на телефон задрав голову, съёмка снизу вверх, двор, панельки, вечер"
-            },
-            {
-                "title": "Гигантский голубь",
-                "description": "На детской площадке обычные голуби клюют крошки, рядом сидит голубь размером с корову, перья взъерошены, клюёт хлеб, дети кормят его из ведра, родители снимают на телефоны, никто не паникует, съёмка на телефон, песочница, качели, солнечно"
-            },
-            {
-                "title": "Песочница-портал",
-                "description": "Дети играют в песочнице во дворе, один мальчик копает ведёрком, вдруг лопатка проваливается в темноту, из песка идёт свечение, ребёнок заглядывает внутрь, в глубине видны звёзды, воспитательница подбегает, съёмка на телефон родителем, детская площадка, день"
-            },
-            {
-                "title": "Деревья с экранами",
-                "description": "Парк, на деревьях вместо листьев висят старые советские телевизоры, на экранах показывают разные каналы, деревья шелестят антеннами, люди на лавочках смотрят как обычно, бабушка с семечками снимает на кнопочный телефон, аллея, осень"
-            },
-            {
-                "title": "Карусель сквозь время",
-                "description": "Детская карусель крутится на площадке, дети на лошадках, с каждым оборотом дети меняются - сначала современные, потом в одежде 90-х, потом СССР, опять современные, родители снимают на телефоны озадаченные, съёмка на телефон, двор, ржавая карусель"
-            }
-        ]
-    },
-    
-    "office": {
-        "name": "💼 ОФИСЫ И РАБОТА",
-        "examples": [
-            {
-                "title": "Ксерокс клонирует людей",
-                "description": "Офис, сотрудник в рубашке делает копии на ксероксе, случайно положил руку на стекло, из лотка выезжает плоская бумажная копия его руки, шевелит пальцами, сотрудник в шоке показывает коллегам, съёмка на телефон коллегой, офис, кулер, стол"
-            },
-            {
-                "title": "Лифт в разные эпохи",
-                "description": "Менеджер в костюме заходит в лифт офисного центра, нажимает 5 этаж, двери открываются - выходит в средневековый замок, возвращается, нажимает 3 этаж - будущее с роботами, паникует жмёт кнопки, съёмка на камеру лифта, стены лифта, дисплей этажей"
-            },
-            {
-                "title": "Коллеги-голограммы",
-                "description": "Совещание в переговорной, менеджер докладывает, половина коллег мерцают как голограммы, сквозь них видно стену, один коллега проходит сквозь стол, все остальные делают вид что так и надо, кто-то снимает на телефон под столом, офис, проектор"
-            },
-            {
-                "title": "Бесконечный коридор",
-                "description": "Секретарша идёт по офисному коридору, коридор повторяется одинаковыми секциями, идёт уже 5 минут, двери с одинаковыми табличками, навстречу идёт она сама, обе останавливаются, съёмка от первого лица на телефон, линолеум, лампы дневного света"
-            },
-            {
-                "title": "Комнатные растения выросли",
-                "description": "Офис после выходных, комнатные фикусы выросли до потолка, корни проросли сквозь столы, сотрудники работают как обычно за компьютерами обходя ветки, уборщица поливает их из ведра, директор снимает на телефон, open space, окна, город за окном"
-            }
-        ]
-    },
-    
-    "cafe": {
-        "name": "☕ КАФЕ И РЕСТОРАНЫ",
-        "examples": [
-            {
-                "title": "Официант-левитация",
-                "description": "Кафе, официант в фартуке приносит заказ, не идёт а парит в 30 см над полом, ноги болтаются, поднос держит ровно, расставляет тарелки на стол посетителям, те снимают на телефоны, официант уплывает к кухне, съёмка на телефон, столики, люди, окна"
-            },
-            {
-                "title": "Борщ в аквариуме",
-                "description": "Столовая, повар в колпаке разливает борщ из огромного аквариума, в борще плавают живые рыбы и свекла, черпает половником, наливает в тарелку, бабушки в очереди с подносами не реагируют, один мужик снимает на телефон, съёмка, раздача, пар"
-            },
-            {
-                "title": "Стулья на потолке",
-                "description": "Ресторан работает, посетители сидят за столами на потолке вверх ногами, люстры свисают вверх к полу, официанты ходят по потолку, внизу на полу один посетитель сидит нормально озирается, снимает всё на телефон, съёмка снизу вверх, интерьер, свет"
-            },
-            {
-                "title": "Макдональдс в лесу",
-                "description": "Обычный Макдональдс, посетители за столиками, но вместо стен и окон вокруг густой лес, деревья прямо из пола, птицы поют, белка прыгает по столу, кассир в форме принимает заказ как обычно, подросток снимает на телефон, съёмка, красные стулья, трей"
-            },
-            {
-                "title": "Чай из крана",
-                "description": "Бабушка в платке в дешёвом кафе подходит к крану с водой чтобы налить воды, из крана льётся готовый чай с пакетиком, дымится, бабушка наливает в стакан, пробует, кивает, другие посетители тоже наливают себе чай из крана, съёмка на телефон, столовая советская"
-            }
-        ]
-    },
-    
-    "street": {
-        "name": "🏙️ УЛИЦА И ГОРОД",
-        "examples": [
-            {
-                "title": "Светофор не для машин",
-                "description": "Перекрёсток, светофор переключается, на красный - все машины взлетают вверх зависают, на зелёный - опускаются едут дальше, пешеходы идут как обычно, один дедушка снимает на кнопочный телефон, съёмка с тротуара, город, день, облака"
-            },
-            {
-                "title": "Лавочка в облаках",
-                "description": "Парковая лавочка стоит на аллее, на ней сидят бабушки с семечками, лавочка медленно поднимается в воздух вместе с бабушками, они продолжают щёлкать семечки и болтать, внизу другие бабушки показывают вверх, снимают на телефоны, съёмка снизу, парк, осень"
-            },
-            {
-                "title": "Асфальт как вода",
-                "description": "Улица, пешеходы идут, один мужик в спортивках случайно наступил на асфальт неправильно, нога провалилась как в воду, круги по асфальту, вытащил ногу - сухая, попробовал ещё раз - опять проваливается, прохожие обходят снимают на телефоны, съёмка, город"
-            },
-            {
-                "title": "Граффити оживает",
-                "description": "Стена панельки с граффити, парень в худи рисует баллончиком, граффити-человечек начинает двигаться на стене, машет руками, выглядывает из-за угла стены, художник отходит в шоке, другие граффити тоже шевелятся, прохожие снимают, съёмка на телефон, двор"
-            },
-            {
-                "title": "Почтовый ящик-портал",
-                "description": "Бабушка опускает письмо в почтовый ящик во дворе, из щели ящика вырывается яркий свет и слышны тропические птицы, из щели вылетает попугай ара, садится на ящик, бабушка отшатывается, другие бабушки подходят снимают на телефоны, съёмка, подъезд, обычный день"
-            }
-        ]
-    },
-    "babushka": {
-        "name": "🦏 БАБКИ И ЖИВОТНЫЕ",
-        "examples": [
-            {
-                "title": "Бабка выгуливает носорога",
-                "description": "Утро в спальном районе, бабушка в цветастом халате и тапочках выгуливает носорога на поводке как собаку, носорог нюхает кусты, бабка ругается \"Куда потащил, Борька!\", соседи с авоськами проходят мимо равнодушно, съёмка на телефон из окна, двор, панельки, лавочки"
-            },
-            {
-                "title": "Бабка кормит бегемота",
-                "description": "Кухня в хрущёвке, бабушка в фартуке и платке варит борщ, за столом сидит огромный бегемот на табуретке, бабка накладывает ему полную тарелку, бегемот ест ложкой, бабка причитает \"Ещё добавки возьмёшь?\", съёмка на телефон внуком, кухня, клеёнка на столе"
-            },
-            {
-                "title": "Бабка в автобусе с жирафом",
-                "description": "Переполненный автобус, бабушка в платке с авоськой требует уступить место, рядом стоит жираф голова торчит через люк в крыше, бабка к нему \"Держись, Геннадий!\", пассажиры жмутся равнодушно в телефоны, съёмка на телефон, автобус, поручни"
-            },
-            {
-                "title": "Бабка доит слона",
-                "description": "Деревенский двор, бабушка в ватнике и резиновых сапогах доит слона как корову, ведро стоит, слон хоботом берёт сено, бабка ворчит \"Стой смирно!\", куры клюют зерно вокруг, съёмка на телефон соседкой через забор, деревня, дрова, сарай"
-            },
-            {
-                "title": "Бабка в очереди с пингвином",
-                "description": "Очередь в поликлинике, бабушка в платке сидит на стуле, на коленях пингвин в шарфике, бабка его гладит и говорит \"Не бойся, Петенька, сейчас доктор посмотрит\", другие бабки обсуждают рецепты не обращая внимания, съёмка на телефон медсестрой, коридор, линолеум"
-            },
-            {
-                "title": "Бабка чешет спину медведю",
-                "description": "Лавочка у подъезда, бабушка в халате сидит рядом с бурым медведем, чешет ему спину массажёром, медведь блаженно закрыл глаза, бабка: \"Вот так лучше, Михалыч?\", соседки с семечками сплетничают рядом, съёмка на телефон, двор, детская площадка вдали"
-            }
-        ]
-    },
-    
-    "mythical": {
-        "name": "🐉 БАБКИ И МИФИЧЕСКИЕ",
-        "examples": [
-            {
-                "title": "Бабка кормит дракона",
-                "description": "Балкон в панельке, бабушка в халате и бигудях сыпет зерно огромному дракону который сидит на соседнем балконе, дракон клюёт как курица, бабка: \"Жоржик, не жадничай!\", дракон чихает огнём, бабка машет платком, съёмка на телефон из окна напротив"
-            },
-            {
-                "title": "Бабка ругается с домовым",
-                "description": "Кухня ночью, бабушка в ночной рубашке и платке трясёт скалкой, в углу сидит мохнатый домовой в ушанке, бабка: \"Опять молоко выпил, леший!\", домовой съёживается прикрывается лапами, кот спит на холодильнике, съёмка на телефон, тусклая лампочка"
-            },
-            {
-                "title": "Бабка стрижёт единорога",
-                "description": "Двор частного дома, бабушка в фартуке стрижёт машинкой гриву белому единорогу, шерсть летит, рог переливается, единорог стоит смирно, бабка: \"Жарко тебе небось было!\", стрижка как у пуделя местами, съёмка на телефон соседом, забор, яблони"
-            },
-            {
-                "title": "Бабка в маршрутке с гномом",
-                "description": "Маршрутка, час пик, бабушка в платке держит на коленях гнома в красном колпаке и бороде, гном дремлет, бабка его укачивает, водитель в зеркало косится, пассажиры вокруг смотрят в окна делая вид что не видят, съёмка на телефон, пластиковые сиденья"
-            },
-            {
-                "title": "Бабка гладит василиска",
-                "description": "Подъезд, бабушка в тапках и халате гладит гигантского василиска-ящера, василиск свернулся у батареи греется, бабка чешет ему пузо, василиск довольно жмурится, соседка с мусорным ведром проходит мимо кивает \"Здрасьте\", съёмка на телефон, почтовые ящики"
-            },
-            {
-                "title": "Бабка купает кентавра",
-                "description": "Деревенская баня, бабушка в платке поливает из ковша кентавра, кентавр сидит в деревянной лохани, бабка трёт ему спину мочалкой на палке, кентавр чешет лошадиное ухо, пар, веники на стене, съёмка на телефон через приоткрытую дверь, деревня"
-            }
-        ]
-    },
-    
-    "dinosaurs": {
-        "name": "🦖 БАБКИ И ДИНОЗАВРЫ",
-        "examples": [
-            {
-                "title": "Бабка и велоцираптор в магазине",
-                "description": "Продуктовый магазин, бабушка в платке с авоськой выбирает огурцы, рядом на поводке велоцираптор в намордннике, велоцираптор тянется к колбасе на витрине, бабка одёргивает: \"Фу, нельзя!\", продавщица взвешивает помидоры равнодушно, съёмка на телефон покупателем"
-            },
-            {
-                "title": "Бабка моет трицератопса",
-                "description": "Двор многоэтажки, бабушка в резиновых сапогах и фартуке моет из шланга трёхрогого динозавра размером с гараж, трицератопс стоит довольный, пена стекает, бабка трёт щёткой на палке: \"Вымажется как поросёнок!\", соседи сушат бельё на балконах, съёмка на телефон"
-            },
-            {
-                "title": "Бабка кормит птеродактиля",
-                "description": "Крыша панельки, бабушка в халате и платке на табуретке, кормит с руки семечками огромного птеродактиля который сидит на спутниковой тарелке, птеродактиль клюёт аккуратно, бабка гладит клюв, внизу двор, съёмка дроном, крыши, антенны"
-            },
-            {
-                "title": "Бабка выгоняет стегозавра с огорода",
-                "description": "Огород в деревне, бабушка в ватнике машет граблями на стегозавра с пластинами на спине, стегозавр топчет капусту, бабка: \"Пошёл вон с грядок, окаянный!\", динозавр пятится переваливаясь, огород, забор, теплица, съёмка на телефон через окно дома"
-            },
-            {
-                "title": "Бабка лечит бронтозавра",
-                "description": "Сельская улица, бабушка-травница в платке ставит банки на спину бронтозавра лежащего поперёк дороги, шея длинная, голова грустная, бабка: \"Простыл небось!\", банки стеклянные, куры ходят вокруг, съёмка на телефон мужиком на велике, деревня"
-            },
-            {
-                "title": "Бабка и тираннозавр на скамейке",
-                "description": "Парк, лавочка, бабушка в платке кормит голубей, рядом сидит тираннозавр с маленькими лапками, бабка отсыпает ему семечки в лапку, тираннозавр пытается взять но лапки короткие, бабка вздыхает насыпает в пасть, съёмка на телефон, аллея, осень"
-            }
-        ]
-    },
-    
-    "aliens": {
-        "name": "👽 БАБКИ И ПРИШЕЛЬЦЫ",
-        "examples": [
-            {
-                "title": "Бабка кормит пельменями инопланетянина",
-                "description": "Кухня, бабушка в фартуке накладывает пельмени серому пришельцу с большой головой сидящему за столом, инопланетянин ест вилкой неумело, бабка доливает сметану: \"Ешь, ешь, худой совсем!\", НЛО видно в окне, съёмка на телефон, клеёнка, телевизор работает"
-            },
-            {
-                "title": "Бабка в автобусе с пришельцем",
-                "description": "Автобус, бабушка в платке с авоськой на коленях сидит пришельцем в скафандре, пришельцу душно, бабка расстёгивает ему шлем: \"Жарко тебе, Вася?\", пассажиры смотрят в окна, водитель объявляет остановки, съёмка на телефон, пластик, поручни"
-            },
-            {
-                "title": "Бабка ругает робота",
-                "description": "Двор, бабушка в тапках и халате грозит пальцем большому роботу, робот опустил голову виновато, бабка: \"Опять клумбу затоптал!\", робот пищит, соседские бабки на лавочке одобрительно кивают, съёмка на телефон из окна, клумбы, песочница"
-            },
-            {
-                "title": "Бабка лечит инопланетянина банками",
-                "description": "Сельская изба, бабушка в платке ставит банки на спину зелёному пришельцу лежащему на печи, пришельцу больно, бабка: \"Потерпи, милок!\", банки присасываются, кот смотрит с подоконника, съёмка на телефон внучкой, печь, половики"
-            },
-            {
-                "title": "Бабка торгуется с роботом на рынке",
-                "description": "Рынок, овощной ряд, бабушка в платке торгуется с продавцом-роботом с экраном вместо лица, бабка щупает помидоры: \"Дорого! У Люси дешевле!\", робот моргает огоньками, взвешивает, другие бабки в очереди, съёмка на телефон, палатки, ящики"
-            }
-        ]
-    },
-    
-    "incredible": {
-        "name": "🎪 БАБКИ В НЕВЕРОЯТНЫХ",
-        "examples": [
-            {
-                "title": "Бабка левитирует на лавочке",
-                "description": "Двор панельки, бабушка в платке сидит на лавочке парит на метр над землёй, вяжет спицами спокойно, тапочки висят в воздухе, соседки рядом лузгают семечки обсуждают цены, никто не удивлён, съёмка на телефон, двор, турники, качели"
-            },
-            {
-                "title": "Бабка дрессирует Годзиллу",
-                "description": "Пустырь на окраине города, бабушка в ватнике с указкой командует огромной Годзилле: \"Сидеть! Лапу!\", Годзилла послушно садится, даёт лапу, панельки на фоне, бабка хвалит даёт кусок колбасы, съёмка дроном сверху, пустырь, мусор"
-            },
-            {
-                "title": "Бабка на метле в маршрутке",
-                "description": "Маршрутка, бабушка в платке стоит на метле парит над пассажирами держась за поручень, метла в воздухе, бабка с авоськой, водитель смотрит в зеркало: \"Бабуль, проездной!\", бабка ищет в авоське, пассажиры в телефонах, съёмка на телефон"
-            },
-            {
-                "title": "Бабка укачивает Ктулху",
-                "description": "Берег моря, бабушка в платке и ватнике сидит на камне, на руках держит маленького Ктулху со щупальцами, баюкает, поёт колыбельную, Ктулху сворачивается спит, волны, чайки, другие бабки собирают ракушки, съёмка на телефон, закат, пляж"
-            },
-            {
-                "title": "Бабка катается на мамонте",
-                "description": "Зимний двор, бабушка в пуховом платке и валенках едет верхом на мохнатом мамонте, в руках авоська, мамонт медленно идёт к магазину, бабка: \"Поворачивай, Кеша!\", дети лепят снеговика не обращают внимания, съёмка на телефон, снег, панельки"
-            },
-            {
-                "title": "Бабка играет в карты с зомби",
-                "description": "Подъезд, лестничная клетка, бабушка в халате и трое зомби сидят на ступеньках играют в дурака, зомби стонут, бабка: \"Не отвлекайся, ходи!\", зомби кладёт карту гниющей рукой, лампочка мигает, почтовые ящики, съёмка на телефон соседом"
-            },
-            {
-                "title": "Бабка доит облако",
-                "description": "Крыша многоэтажки, бабушка в платке и фартуке доит белое пушистое облако в ведро, облако парит на месте, из него капает молоко, бабка приговаривает: \"Стой смирно, Зорька!\", внизу двор, антенны вокруг, съёмка дроном, небо голубое"
-            }
-        ]
+import asyncio
+import json
+import logging
+import os
+import re
+
+EXAMPLES_PATH = os.getenv(
+    "EXAMPLES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "examples.jsonl")
+)
+
+# Id раздела — стабильный ключ в callback_data (category_<id>), без "_" и не длиннее 32 символов
+CATEGORY_ID_RE = re.compile(r"^[a-z0-9]{1,32}$")
+
+_catalog = None  # {category_key: {"name": str, "examples": [{"title", "description"}]}}
+_signature = None  # (mtime_ns, size) последнего прочитанного файла
+_reload_hooks = []
+_reloads = 0
+_reload_errors = 0
+
+
+def parse_catalog(lines, source: str = EXAMPLES_PATH) -> dict:
+    """Разобрать и проверить каталог; ValueError с номером строки при ошибке"""
+    catalog = {}
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        where = f"{source}:{lineno}"
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{where}: invalid JSON: {e}") from e
+
+        category_key = entry.get("id") if isinstance(entry, dict) else None
+        if not isinstance(category_key, str) or not CATEGORY_ID_RE.match(category_key):
+            raise ValueError(f"{where}: category id must match {CATEGORY_ID_RE.pattern}")
+        if category_key in catalog:
+            raise ValueError(f"{where}: duplicate category id {category_key!r}")
+        name = entry.get("name")
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError(f"{where}: category {category_key!r} has no name")
+        items = entry.get("examples")
+        if not isinstance(items, list) or not items:
+            raise ValueError(f"{where}: category {category_key!r} has no examples")
+
+        examples = []
+        for index, item in enumerate(items):
+            title = item.get("title") if isinstance(item, dict) else None
+            description = item.get("description") if isinstance(item, dict) else None
+            if not isinstance(title, str) or not title.strip() or not isinstance(description, str) or not description.strip():
+                raise ValueError(f"{where}: example {index} of {category_key!r} needs title and description")
+            examples.append({"title": title, "description": description})
+        catalog[category_key] = {"name": name, "examples": examples}
+
+    if not catalog:
+        raise ValueError(f"{source}: catalog is empty")
+    return catalog
+
+
+def _file_signature(path: str):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read(path: str):
+    """(каталог, сигнатура файла)"""
+    signature = _file_signature(path)
+    with open(path, encoding="utf-8") as f:
+        return parse_catalog(f, path), signature
+
+
+def get_examples() -> dict:
+    """Текущий каталог; загружается при первом обращении"""
+    global _catalog, _signature
+    if _catalog is None:
+        _catalog, _signature = _read(EXAMPLES_PATH)
+        logging.info(f"📚 Examples catalog loaded: {len(_catalog)} categories, {sum(len(c['examples']) for c in _catalog.values())} examples")
+    return _catalog
+
+
+def on_examples_reload(hook):
+    """Зарегистрировать функцию, которая вызывается после подмены каталога"""
+    _reload_hooks.append(hook)
+    return hook
+
+
+def reload_examples() -> bool:
+    """
+    Перечитать каталог. Ошибка в файле не ломает работающий бот: остаётся прежний каталог.
+    Подмена и перестроение зависимых индексов идут без await, то есть атомарно для event loop
+    """
+    global _catalog, _signature, _reloads, _reload_errors
+    try:
+        catalog, signature = _read(EXAMPLES_PATH)
+    except (OSError, ValueError) as e:
+        _reload_errors += 1
+        # Запоминаем сигнатуру, чтобы не повторять ошибку до следующей правки файла
+        try:
+            _signature = _file_signature(EXAMPLES_PATH)
+        except OSError:
+            pass
+        logging.error(f"❌ Examples catalog reload failed, keeping previous version: {e}")
+        return False
+
+    _catalog, _signature = catalog, signature
+    _reloads += 1
+    for hook in _reload_hooks:
+        hook(catalog)
+    logging.info(f"📚 Examples catalog reloaded: {len(catalog)} categories")
+    return True
+
+
+def reload_if_changed() -> bool:
+    """Перечитать каталог, если файл изменился с последнего чтения"""
+    if _catalog is None:
+        return False
+    try:
+        signature = _file_signature(EXAMPLES_PATH)
+    except OSError:
+        return False
+    if signature == _signature:
+        return False
+    return reload_examples()
+
+
+async def watch_examples(interval: float):
+    """Фоновая проверка изменений файла каталога"""
+    while True:
+        await asyncio.sleep(interval)
+        reload_if_changed()
+
+
+def examples_stats() -> dict:
+    catalog = _catalog or {}
+    return {
+        "loaded": _catalog is not None,
+        "categories": len(catalog),
+        "examples": sum(len(c["examples"]) for c in catalog.values()),
+        "reloads": _reloads,
+        "reload_errors": _reload_errors,
     }
-}
+
+
+def __getattr__(name):
+    # Совместимость: examples.EXAMPLES — текущий каталог
+    if name == "EXAMPLES":
+        return get_examples()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Функция для получения всех категорий
 def get_categories():
     """Возвращает список всех категорий"""
-    return list(EXAMPLES.keys())
+    return list(get_examples().keys())
 
 # Функция для получения названия категории
 def get_category_name(category_key: str):
     """Возвращает отображаемое название категории"""
-    return EXAMPLES.get(category_key, {}).get("name", category_key)
+    return get_examples().get(category_key, {}).get("name", category_key)
 
 # Функция для получения примеров из категории
 def get_examples_from_category(category_key: str):
     """Возвращает список примеров из указанной категории"""
-    return EXAMPLES.get(category_key, {}).get("examples", [])
+    return get_examples().get(category_key, {}).get("examples", [])
 
 # Функция для получения конкретного примера
 def get_example(category_key: str, index: int):
@@ -615,4 +182,4 @@ def get_example(category_key: str, index: int):
 # Функция для получения количества примеров в категории
 def get_category_count(category_key: str):
     """Возвращает количество примеров в категории"""
-    return len(get_examples_from_category(category_key))
\ No newline at end of file
+    return len(get_examples_from_category(category_key))
@@ -0,0 +1,97 @@
+"""
+🌐 Общий HTTP-клиент для Kie.AI, Sora 2 API и скачивания видео
+Одна долгоживущая aiohttp-сессия на процесс: keep-alive, кэш DNS и лимиты соединений на хост
+"""
+
+import logging
+import os
+
+import aiohttp
+
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", 100))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 20))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", 300))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 60))
+
+# Таймауты по типу запроса
+TIMEOUTS = {
+    "kie": aiohttp.ClientTimeout(total=90, connect=10),
+    "sora": aiohttp.ClientTimeout(total=120, connect=10),
+    "download": aiohttp.ClientTimeout(total=300, connect=10, sock_read=60),
+}
+
+_session = None
+_stats = {
+    "requests": 0,
+    "request_errors": 0,
+    "connections_created": 0,
+    "connections_reused": 0,
+    "dns_cache_hits": 0,
+    "dns_cache_misses": 0,
+}
+
+
+def _count(name: str):
+    async def handler(session, context, params):
+        _stats[name] += 1
+    return handler
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    """Счётчики запросов и переиспользования соединений"""
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(_count("requests"))
+    trace.on_request_exception.append(_count("request_errors"))
+    trace.on_connection_create_end.append(_count("connections_created"))
+    trace.on_connection_reuseconn.append(_count("connections_reused"))
+    trace.on_dns_cache_hit.append(_count("dns_cache_hits"))
+    trace.on_dns_cache_miss.append(_count("dns_cache_misses"))
+    return trace
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Общая сессия; создаётся при первом обращении внутри event loop"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            enable_cleanup_closed=True,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=TIMEOUTS["kie"],
+            headers={"User-Agent": "SORA2Bot/1.0"},
+            trace_configs=[_trace_config()],
+        )
+        logging.info("🌐 Shared HTTP session created")
+    return _session
+
+
+def timeout_for(endpoint: str) -> aiohttp.ClientTimeout:
+    """Таймаут для типа запроса"""
+    return TIMEOUTS[endpoint]
+
+
+async def start():
+    """Создание сессии при старте бота"""
+    get_session()
+
+
+async def close():
+    """Закрытие сессии при остановке бота"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logging.info("🌐 Shared HTTP session closed")
+    _session = None
+
+
+def stats() -> dict:
+    """Статистика соединений: доля переиспользованных keep-alive соединений"""
+    acquired = _stats["connections_created"] + _stats["connections_reused"]
+    result = dict(_stats)
+    result["reuse_rate"] = round(_stats["connections_reused"] / acquired, 4) if acquired else 0.0
+    return result
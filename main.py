@@ -3,6 +3,10 @@ import logging
 import asyncio
 import uuid
 import json
+import hashlib
+import signal
+import html
+import re
 from datetime import datetime
 import aiohttp
 from aiohttp import web
@@ -10,18 +14,37 @@ import asyncpg
 from aiogram import Bot, Dispatcher, types
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from aiogram.filters import Command
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.filters import Command, CommandObject
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, InlineQueryResultsButton
 from yookassa import Configuration, Payment
 
 # Импорт модулей для мультиязычности
-from translations import get_text, is_rtl_language
-from utils.keyboards import main_menu, language_selection, orientation_menu, tariff_selection, help_keyboard, support_sent_keyboard, video_confirmation_keyboard, video_ready_keyboard
-from examples import EXAMPLES, get_categories, get_examples_from_category, get_example, get_category_name
+from translations import LANG, get_text, is_rtl_language, button_action, on_translations_reload, reload_translations
+from utils.keyboards import main_menu, language_selection, orientation_menu, tariff_selection, help_keyboard, support_sent_keyboard, video_confirmation_keyboard, video_ready_keyboard, change_orientation_keyboard, foreign_tariffs_keyboard, warm_keyboards, keyboard_cache_stats
+from examples import get_examples, get_example, on_examples_reload, reload_examples, watch_examples, examples_stats
+from utils.examples_view import ExamplesView, EXAMPLES_INTRO_TEXT
+from utils.examples_search import ExamplesSearch
+from utils.examples_inline import ExamplesInline
 from tribute_subscription import create_subscription, get_tariff_info
+from utils.cache import TTLCache
+from migrations import run_migrations
+import queries
+import payment_inbox
+import outbox
+import broadcast
+import http_client
+from utils.middlewares import UserContext, UserContextMiddleware, SessionMiddleware, mark_user_dirty
+from utils.update_pool import UpdatePool
+from utils.sessions import SessionStore, PostgresSessionBackend
+from utils.cache_sync import CacheInvalidationBus
+from utils.outbound import OutboundScheduler, PRIORITY_HIGH, PRIORITY_BULK, set_outbound_priority, outbound_priority
+from utils.callback_dispatch import CallbackDispatcher
+from utils.callbacks import LanguageCallback, SubscriptionCallback, CategoryCallback, CategoryPageCallback, ExampleCallback, ExampleCreateCallback
 
 # Импорт Sora client
-from sora_client import create_sora_task, extract_user_from_param
+from sora_client import create_sora_task, extract_user_from_param, is_kie_available, kie_retry_after
+import sora_client
+from sora_queue import SubmissionScheduler
 
 # === CONFIGURATION ===
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -52,6 +75,64 @@ SORA_API_URL = os.getenv("SORA_API_URL", "https://api.sora2.com/v1/videos")
 KIE_API_KEY = os.getenv("KIE_API_KEY")
 KIE_API_URL = os.getenv("KIE_API_URL", "https://api.kie.ai/api/v1/jobs/createTask")
 
+# Webhook: быстрый ответ Telegram и фоновая обработка апдейтов
+WEBHOOK_ASYNC = os.getenv("WEBHOOK_ASYNC", "true").lower() == "true"
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", 16))
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", 1000))
+UPDATE_PER_CHAT_LIMIT = int(os.getenv("UPDATE_PER_CHAT_LIMIT", 10))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+
+# Outbox уведомлений (платежи, возвраты)
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 20))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+
+# Массовые рассылки (/broadcast): администраторы и скорость отправки
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if x}
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 10))
+BROADCAST_WINDOW = int(os.getenv("BROADCAST_WINDOW", 200))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 10))
+
+# Outbound Bot API limits (Telegram: ~30 сообщений/с на бота, ~1/с в чат, ~20/мин в группу)
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", 25))
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", 1))
+OUTBOUND_GROUP_RATE = float(os.getenv("OUTBOUND_GROUP_RATE", 0.33))
+OUTBOUND_CHAT_BURST = float(os.getenv("OUTBOUND_CHAT_BURST", 3))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", 3))
+
+# KIE.AI submission queue configuration
+SORA_SUBMIT_RATE = float(os.getenv("SORA_SUBMIT_RATE", 2))
+SORA_SUBMIT_BURST = float(os.getenv("SORA_SUBMIT_BURST", 5))
+SORA_SUBMIT_MIN_RATE = float(os.getenv("SORA_SUBMIT_MIN_RATE", 0.2))
+SORA_SUBMIT_CONCURRENCY = int(os.getenv("SORA_SUBMIT_CONCURRENCY", 10))
+SORA_SUBMIT_QUEUE_SIZE = int(os.getenv("SORA_SUBMIT_QUEUE_SIZE", 500))
+
+# Examples catalog: проверка изменений data/examples.jsonl (0 — только по SIGHUP)
+EXAMPLES_RELOAD_INTERVAL = float(os.getenv("EXAMPLES_RELOAD_INTERVAL", 30))
+
+# Examples search
+SEARCH_RESULTS_LIMIT = int(os.getenv("SEARCH_RESULTS_LIMIT", 8))
+
+# Inline mode (@bot <запрос>)
+# Ответы персональные: после окончания тарифа примеры остаются в кэше Telegram не дольше INLINE_CACHE_TIME
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", 300))
+INLINE_DENIED_CACHE_TIME = 10
+INLINE_PAGE_SIZE = int(os.getenv("INLINE_PAGE_SIZE", 20))
+
+# User sessions (состояние диалога): memory — только эта реплика, postgres — общее для всех реплик
+SESSION_TTL = float(os.getenv("SESSION_TTL", 86400))
+SESSION_MAX_USERS = int(os.getenv("SESSION_MAX_USERS", 100000))
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+
+# Database pool configuration
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+
+# User cache configuration
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+# Сброс кэша на всех репликах через LISTEN/NOTIFY; без него при нескольких репликах USER_CACHE_TTL должен быть ~0
+USER_CACHE_SYNC = os.getenv("USER_CACHE_SYNC", "true" if SESSION_BACKEND == "postgres" else "false").lower() == "true"
+
 # === TARIFF CONFIGURATION ===
 tariff_videos = {
     "trial": 3,
@@ -93,86 +174,84 @@ else:
 bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 dp = Dispatcher()
 
+# Все запросы бота к чатам проходят через лимиты Telegram с приоритетами
+outbound = OutboundScheduler(
+    global_rate=OUTBOUND_GLOBAL_RATE,
+    chat_rate=OUTBOUND_CHAT_RATE,
+    group_rate=OUTBOUND_GROUP_RATE,
+    chat_burst=OUTBOUND_CHAT_BURST,
+    max_retries=OUTBOUND_MAX_RETRIES
+)
+bot.session.middleware(outbound)
+
 # === DATABASE CONNECTION ===
 db_pool = None
 
+# Кэш строк users: {user_id: dict}. Обновляется при каждой записи в users
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Кэш локален для реплики: записи другой реплики (платёж, смена языка) сбрасывают его через NOTIFY
+user_cache_bus = CacheInvalidationBus(
+    DATABASE_URL,
+    get_pool=lambda: db_pool,
+    channel="user_cache",
+    on_invalidate=lambda key: _forget_cached_user(int(key)),
+    on_reset=lambda: (_user_reads.clear(), user_cache.clear())
+) if USER_CACHE_SYNC else None
+
+# Чтения users в полёте: {user_id: метка}. Запись снимает метку, и SELECT, начатый до неё,
+# не кладёт в кэш строку до записи (иначе она жила бы весь USER_CACHE_TTL)
+_user_reads = {}
+
+def _forget_cached_user(user_id: int):
+    _user_reads.pop(user_id, None)
+    user_cache.invalidate(user_id)
+
+def _update_cached_user(user_id: int, **fields):
+    """Write-through обновление закэшированного пользователя"""
+    _user_reads.pop(user_id, None)
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        user_cache.set(user_id, {**cached, **fields})
+    mark_user_dirty(user_id)
+    if user_cache_bus:
+        user_cache_bus.publish(user_id)
+
+def _invalidate_user(user_id: int):
+    """Сброс закэшированного пользователя после записи"""
+    _forget_cached_user(user_id)
+    mark_user_dirty(user_id)
+    if user_cache_bus:
+        user_cache_bus.publish(user_id)
+
 async def init_database():
-    """Инициализация базы данных и создание таблиц"""
+    """Подключение к базе данных и миграция схемы"""
     global db_pool
     
     try:
         logging.info("✅ Connecting to DATABASE_URL...")
         logging.info(f"🔍 DATABASE_URL format: {DATABASE_URL[:20]}...{DATABASE_URL[-10:]}")
         
-        # Подключение к базе данных с таймаутом
+        # Применяем недостающие миграции схемы (см. migrations.py) на отдельном соединении:
+        # запросы пула подготавливаются уже под актуальную схему
+        conn = await asyncpg.connect(DATABASE_URL, timeout=10)
+        try:
+            await run_migrations(conn)
+        finally:
+            await conn.close()
+        
+        # Подключение к базе данных с таймаутом; каждое новое соединение
+        # сразу подготавливает все запросы из queries.py
         db_pool = await asyncpg.create_pool(
             DATABASE_URL,
-            min_size=1,
-            max_size=10,
-            command_timeout=10
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            command_timeout=10,
+            init=queries.prepare_connection
         )
         logging.info("✅ Database connected successfully.")
         
-        # Создание таблицы users
-        async with db_pool.acquire() as conn:
-            # Проверяем существование таблицы
-            table_exists = await conn.fetchval("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_name = 'users'
-                )
-            """)
-            
-            if not table_exists:
-                logging.info("📋 Creating table 'users'...")
-                await conn.execute('''
-                            CREATE TABLE users (
-                                id SERIAL PRIMARY KEY,
-                                user_id BIGINT UNIQUE,
-                                username TEXT,
-                                first_name TEXT,
-                                plan_name TEXT DEFAULT 'Без тарифа',
-                                videos_left INT DEFAULT 0,
-                                total_payments INT DEFAULT 0,
-                                language TEXT DEFAULT 'en',
-                                created_at TIMESTAMP DEFAULT NOW()
-                            )
-                ''')
-                logging.info("✅ Table 'users' created successfully.")
-            else:
-                logging.info("✅ Table 'users' already exists.")
-                # Добавляем поле language если его нет
-                await conn.execute('''
-                    ALTER TABLE users ADD COLUMN IF NOT EXISTS language TEXT DEFAULT 'en'
-                ''')
-                logging.info("✅ Language column checked/added.")
-                
-                # Обновляем всех пользователей с trial на "Без тарифа"
-                await conn.execute('''
-                    UPDATE users SET plan_name = 'Без тарифа', videos_left = 0 
-                    WHERE plan_name = 'trial'
-                ''')
-                trial_users_updated = await conn.fetchval('''
-                    SELECT COUNT(*) FROM users WHERE plan_name = 'Без тарифа'
-                ''')
-                if trial_users_updated and trial_users_updated > 0:
-                    logging.info(f"✅ Updated {trial_users_updated} users from 'trial' to 'Без тарифа'")
-                
-                # Изменяем дефолтные значения в таблице для новых пользователей
-                await conn.execute('''
-                    ALTER TABLE users ALTER COLUMN plan_name SET DEFAULT 'Без тарифа'
-                ''')
-                await conn.execute('''
-                    ALTER TABLE users ALTER COLUMN videos_left SET DEFAULT 0
-                ''')
-                logging.info("✅ Updated default values: plan_name='Без тарифа', videos_left=0")
-            
-            # Создание индекса для быстрого поиска по user_id
-            await conn.execute('''
-                CREATE INDEX IF NOT EXISTS idx_users_user_id ON users(user_id)
-            ''')
-            
-        logging.info("✅ Table 'users' ready")
+        logging.info("✅ Database ready")
         return True
         
     except Exception as e:
@@ -193,15 +272,46 @@ async def get_user(user_id: int):
             'language': 'en'
         }
         
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+        
+    read = _user_reads[user_id] = object()
     try:
         async with db_pool.acquire() as conn:
-            user = await conn.fetchrow(
-                "SELECT * FROM users WHERE user_id = $1", user_id
-            )
-            return user
+            user = await queries.fetch_user(conn, user_id)
+        if user is None:
+            return None
+        # Пока шёл SELECT, строку изменили: отдаём прочитанное, но не кэшируем
+        if _user_reads.get(user_id) is read:
+            user_cache.set(user_id, user)
+        return user
     except Exception as e:
         logging.error(f"❌ Error getting user {user_id}: {e}")
         return None
+    finally:
+        if _user_reads.get(user_id) is read:
+            del _user_reads[user_id]
+
+def has_examples_access(user) -> bool:
+    """Примеры доступны только с оплаченным тарифом и ненулевым балансом"""
+    return bool(user) and user.get('plan_name') != 'Без тарифа' and user.get('videos_left', 0) > 0
+
+async def get_user_language(user_id: int, default: str = 'en') -> str:
+    """Язык пользователя: из кэша или одной колонкой из БД"""
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached.get('language') or default
+    if not db_pool:
+        return default
+    
+    try:
+        async with db_pool.acquire() as conn:
+            language = await queries.fetch_user_language(conn, user_id)
+        return language or default
+    except Exception as e:
+        logging.error(f"❌ Error getting language for user {user_id}: {e}")
+        return default
 
 async def create_user(user_id: int, username: str = None, first_name: str = None):
     """Создание нового пользователя"""
@@ -211,13 +321,10 @@ async def create_user(user_id: int, username: str = None, first_name: str = None
         
     try:
         async with db_pool.acquire() as conn:
-            result = await conn.execute('''
-                INSERT INTO users (user_id, username, first_name)
-                VALUES ($1, $2, $3)
-                ON CONFLICT (user_id) DO NOTHING
-            ''', user_id, username, first_name)
+            created = await queries.fetchval(conn, "create_user", user_id, username, first_name)
             
-            if "INSERT" in result:
+            _invalidate_user(user_id)
+            if created is not None:
                 logging.info(f"✅ Created new user {user_id} ({first_name})")
             else:
                 logging.info(f"✅ User {user_id} already exists")
@@ -227,52 +334,102 @@ async def create_user(user_id: int, username: str = None, first_name: str = None
         logging.error(f"❌ Error creating user {user_id}: {e}")
         return False
 
-async def update_user_videos(user_id: int, videos_left: int):
-    """Обновление количества оставшихся видео"""
+# === BALANCE OPERATIONS ===
+# Каждая операция - один UPDATE ... RETURNING, безопасный при параллельных нажатиях и вебхуках
+
+async def reserve_video(user_id: int):
+    """Атомарное списание одного видео. Возвращает новый баланс или None, если видео нет"""
     if not db_pool:
-        logging.warning("⚠️ Database not available, skipping video update")
-        return False
+        logging.warning("⚠️ Database not available, skipping video reservation")
+        return None
         
     try:
         async with db_pool.acquire() as conn:
-            await conn.execute('''
-                UPDATE users SET videos_left = $2 WHERE user_id = $1
-            ''', user_id, videos_left)
-        logging.info(f"✅ Updated user {user_id} videos to {videos_left}")
-        return True
+            new_balance = await queries.fetchval(conn, "reserve_video", user_id)
     except Exception as e:
-        logging.error(f"❌ Error updating user videos {user_id}: {e}")
-        return False
+        _invalidate_user(user_id)
+        logging.error(f"❌ Error reserving video for user {user_id}: {e}")
+        return None
+    
+    if new_balance is None:
+        logging.info(f"⚠️ User {user_id} has no videos to reserve")
+        return None
+    
+    _update_cached_user(user_id, videos_left=new_balance)
+    logging.info(f"✅ Reserved video for user {user_id}. Balance: {new_balance}")
+    return new_balance
 
-async def add_user_videos(user_id: int, videos_to_add: int):
-    """Добавление видео к существующему балансу"""
+async def credit_user_videos(user_id: int, videos_to_add: int):
+    """Атомарное начисление видео. Возвращает новый баланс или None при ошибке"""
     if not db_pool:
         logging.warning("⚠️ Database not available, skipping video addition")
-        return False
+        return None
         
     try:
         async with db_pool.acquire() as conn:
-            # Получаем текущий баланс
-            current_videos = await conn.fetchval('''
-                SELECT videos_left FROM users WHERE user_id = $1
-            ''', user_id)
-            
-            if current_videos is None:
-                logging.error(f"❌ User {user_id} not found in database")
-                return False
-            
-            # Добавляем новые видео
-            new_balance = current_videos + videos_to_add
-            
-            await conn.execute('''
-                UPDATE users SET videos_left = $2 WHERE user_id = $1
-            ''', user_id, new_balance)
-            
-        logging.info(f"✅ Added {videos_to_add} videos to user {user_id}. Balance: {current_videos} → {new_balance}")
-        return True
+            new_balance = await queries.fetchval(conn, "credit_videos", user_id, videos_to_add)
     except Exception as e:
+        _invalidate_user(user_id)
         logging.error(f"❌ Error adding videos to user {user_id}: {e}")
-        return False
+        return None
+    
+    if new_balance is None:
+        logging.error(f"❌ User {user_id} not found in database")
+        return None
+    
+    _update_cached_user(user_id, videos_left=new_balance)
+    logging.info(f"✅ Added {videos_to_add} videos to user {user_id}. Balance: {new_balance}")
+    return new_balance
+
+async def refund_video(user_id: int):
+    """Возврат одного видео после неудачной генерации"""
+    return await credit_user_videos(user_id, 1)
+
+async def refund_video_with_notice(user_id: int, render_notice, task_id: str = None):
+    """
+    Возврат видео и уведомление об этом в одной транзакции: текст render_notice(баланс)
+    записывается в outbox и будет доставлен, даже если Bot API сейчас недоступен.
+    С task_id в той же транзакции задача переводится в failed, поэтому возврат не повторится.
+    Возвращает новый баланс или None при ошибке
+    """
+    if not db_pool:
+        logging.warning("⚠️ Database not available, skipping video refund")
+        return None
+    
+    new_balance = None
+    try:
+        async with db_pool.acquire() as conn:
+            async with conn.transaction():
+                if task_id and not await queries.fetchval(conn, "finish_sora_task", task_id, "failed"):
+                    logging.warning(f"⚠️ Sora task {task_id} is no longer claimed, skipping refund")
+                    return None
+                new_balance = await queries.fetchval(conn, "credit_videos", user_id, 1)
+                if new_balance is None:
+                    # Пользователя нет: откатываем и перевод задачи в failed
+                    raise LookupError(f"user {user_id} not found")
+                await outbox.enqueue(conn, [(user_id, render_notice(new_balance))], kind="refund")
+    except LookupError:
+        logging.error(f"❌ User {user_id} not found in database")
+        return None
+    except Exception as e:
+        _invalidate_user(user_id)
+        logging.error(f"❌ Error refunding video to user {user_id}: {e}")
+        return None
+    
+    _update_cached_user(user_id, videos_left=new_balance)
+    outbox_sender.wake()
+    logging.info(f"✅ Refunded 1 video to user {user_id}. Balance: {new_balance}")
+    return new_balance
+
+async def unblock_user(user_id: int):
+    """Пользователь снова написал боту: он опять получает рассылки"""
+    if not db_pool:
+        return
+    try:
+        async with db_pool.acquire() as conn:
+            await queries.execute(conn, "unblock_user", user_id)
+    except Exception as e:
+        logging.error(f"❌ Error unblocking user {user_id}: {e}")
 
 async def update_user_language(user_id: int, language: str):
     """Обновление языка пользователя"""
@@ -282,12 +439,12 @@ async def update_user_language(user_id: int, language: str):
         
     try:
         async with db_pool.acquire() as conn:
-            await conn.execute('''
-                UPDATE users SET language = $2 WHERE user_id = $1
-            ''', user_id, language)
+            await queries.fetchval(conn, "set_user_language", user_id, language)
+        _update_cached_user(user_id, language=language)
         logging.info(f"✅ Updated user {user_id} language to {language}")
         return True
     except Exception as e:
+        _invalidate_user(user_id)
         logging.error(f"❌ Error updating user language {user_id}: {e}")
         return False
 
@@ -299,27 +456,144 @@ async def update_user_tariff(user_id: int, tariff_name: str, videos_count: int,
         
     try:
         async with db_pool.acquire() as conn:
-            # Получаем текущее количество видео
-            current_videos = await conn.fetchval(
-                "SELECT videos_left FROM users WHERE user_id = $1", user_id
-            )
-            
-            # Суммируем с новым количеством видео
-            total_videos = (current_videos or 0) + videos_count
-            
-            await conn.execute('''
-                UPDATE users SET 
-                    plan_name = $2, 
-                    videos_left = $3, 
-                    total_payments = total_payments + $4 
-                WHERE user_id = $1
-            ''', user_id, tariff_name, total_videos, payment_amount)
-        logging.info(f"✅ Updated user {user_id} tariff to {tariff_name}: {current_videos or 0} + {videos_count} = {total_videos} videos")
+            # Начисляем видео к текущему балансу одним запросом
+            row = await queries.fetchrow(conn, "apply_tariff", user_id, tariff_name, videos_count, payment_amount)
+        if row is None:
+            logging.error(f"❌ User {user_id} not found in database")
+            return False
+        _update_cached_user(
+            user_id,
+            plan_name=tariff_name,
+            videos_left=row['videos_left'],
+            total_payments=row['total_payments']
+        )
+        logging.info(f"✅ Updated user {user_id} tariff to {tariff_name}: +{videos_count} = {row['videos_left']} videos")
         return True
     except Exception as e:
+        _invalidate_user(user_id)
         logging.error(f"❌ Error updating user tariff {user_id}: {e}")
         return False
 
+# === SORA TASKS ===
+# Задачи Kie.AI хранятся в sora_tasks: callback находит пользователя одним запросом по task_id
+
+# Сколько секунд захват задачи (processing) защищён от повторного callback
+SORA_TASK_LEASE = 600.0
+
+async def save_sora_task(task_id: str, user_id: int, prompt: str, aspect_ratio: str):
+    """Сохранение созданной задачи генерации"""
+    if not db_pool:
+        return False
+        
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    try:
+        async with db_pool.acquire() as conn:
+            await queries.execute(conn, "create_sora_task", task_id, user_id, prompt_hash, aspect_ratio)
+        return True
+    except Exception as e:
+        logging.error(f"❌ Error saving Sora task {task_id}: {e}")
+        return False
+
+async def set_sora_task_message(task_id: str, message_id: int):
+    """Сохранение ID сообщения "Задача отправлена" для удаления при получении видео"""
+    if not db_pool:
+        return False
+        
+    try:
+        async with db_pool.acquire() as conn:
+            await queries.execute(conn, "set_sora_task_message", task_id, message_id)
+        return True
+    except Exception as e:
+        logging.error(f"❌ Error saving message for Sora task {task_id}: {e}")
+        return False
+
+async def claim_sora_task(task_id: str):
+    """
+    Захват задачи для обработки callback: pending -> processing. Итоговый статус ставится
+    только после доставки видео или возврата, при ошибке задача возвращается в pending.
+    Захват, не завершённый за SORA_TASK_LEASE секунд (реплика упала), можно перехватить
+    """
+    if not db_pool:
+        return None
+        
+    try:
+        async with db_pool.acquire() as conn:
+            return await queries.fetchrow(conn, "claim_sora_task", task_id, SORA_TASK_LEASE)
+    except Exception as e:
+        logging.error(f"❌ Error claiming Sora task {task_id}: {e}")
+        return None
+
+async def finish_sora_task(task_id: str, status: str):
+    """Перевод захваченной задачи в итоговый статус"""
+    if not db_pool:
+        return False
+        
+    try:
+        async with db_pool.acquire() as conn:
+            return bool(await queries.fetchval(conn, "finish_sora_task", task_id, status))
+    except Exception as e:
+        logging.error(f"❌ Error finishing Sora task {task_id}: {e}")
+        return False
+
+async def release_sora_task(task_id: str):
+    """Вернуть задачу в pending, чтобы повторный callback Kie.AI обработал её заново"""
+    if not db_pool:
+        return False
+        
+    try:
+        async with db_pool.acquire() as conn:
+            await queries.execute(conn, "release_sora_task", task_id)
+        return True
+    except Exception as e:
+        logging.error(f"❌ Error releasing Sora task {task_id}: {e}")
+        return False
+
+async def get_sora_task(task_id: str):
+    """Получение задачи по task_id"""
+    if not db_pool:
+        return None
+        
+    try:
+        async with db_pool.acquire() as conn:
+            return await queries.fetchrow(conn, "get_sora_task", task_id)
+    except Exception as e:
+        logging.error(f"❌ Error getting Sora task {task_id}: {e}")
+        return None
+
+async def set_sora_task_video_message(task_id: str, message_id: int):
+    """Сохранение ID сообщения с готовым видео"""
+    if not db_pool:
+        return False
+        
+    try:
+        async with db_pool.acquire() as conn:
+            await queries.execute(conn, "set_sora_task_video_message", task_id, message_id)
+        return True
+    except Exception as e:
+        logging.error(f"❌ Error saving video message for Sora task {task_id}: {e}")
+        return False
+
+async def get_sora_task_stats():
+    """Количество и длительность генераций за последние 24 часа по статусам"""
+    if not db_pool:
+        return {}
+        
+    try:
+        async with db_pool.acquire() as conn:
+            rows = await queries.fetch(conn, "sora_task_stats")
+    except Exception as e:
+        logging.error(f"❌ Error getting Sora task stats: {e}")
+        return {}
+    
+    return {
+        row['status']: {
+            "tasks": row['tasks'],
+            "avg_seconds": round(float(row['avg_seconds']), 1) if row['avg_seconds'] is not None else None,
+            "max_seconds": round(float(row['max_seconds']), 1) if row['max_seconds'] is not None else None
+        }
+        for row in rows
+    }
+
 async def create_sora_video(description: str, orientation: str, user_id: int):
     """Создание видео через Sora 2 API"""
     if not SORA_API_KEY:
@@ -349,26 +623,26 @@ async def create_sora_video(description: str, orientation: str, user_id: int):
         
         logging.info(f"🎬 Creating Sora video for user {user_id}: {description[:50]}...")
         
-        # Отправляем запрос к Sora 2 API
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120)) as session:
-            async with session.post(SORA_API_URL, json=payload, headers=headers) as response:
-                response_text = await response.text()
-                logging.info(f"🎬 Sora API response status: {response.status}")
+        # Отправляем запрос к Sora 2 API через общую HTTP-сессию
+        session = http_client.get_session()
+        async with session.post(SORA_API_URL, json=payload, headers=headers, timeout=http_client.timeout_for("sora")) as response:
+            response_text = await response.text()
+            logging.info(f"🎬 Sora API response status: {response.status}")
+            
+            if response.status == 200:
+                data = await response.json()
+                video_url = data.get("video_url")
+                video_id = data.get("id")
                 
-                if response.status == 200:
-                    data = await response.json()
-                    video_url = data.get("video_url")
-                    video_id = data.get("id")
-                    
-                    if video_url:
-                        logging.info(f"✅ Sora video created successfully: {video_id}")
-                        return video_url, video_id
-                    else:
-                        logging.error(f"❌ No video URL in response: {data}")
-                        return None, "no_url"
+                if video_url:
+                    logging.info(f"✅ Sora video created successfully: {video_id}")
+                    return video_url, video_id
                 else:
-                    logging.error(f"❌ Sora API error: {response.status} - {response_text}")
-                    return None, f"api_error_{response.status}"
+                    logging.error(f"❌ No video URL in response: {data}")
+                    return None, "no_url"
+            else:
+                logging.error(f"❌ Sora API error: {response.status} - {response_text}")
+                return None, f"api_error_{response.status}"
                     
     except aiohttp.ClientError as e:
         logging.error(f"❌ Network error creating Sora video: {e}")
@@ -380,28 +654,44 @@ async def create_sora_video(description: str, orientation: str, user_id: int):
         logging.error(f"❌ Unexpected error creating Sora video: {e}")
         return None, "unknown_error"
 
-# === GLOBAL STATES ===
-user_waiting_for_support = set()
-user_waiting_for_video_orientation = {}
-user_video_requests = {}  # {user_id: {'description': str, 'orientation': str}}
-user_prompt_messages = {}  # {user_id: message_id} - сообщения с промптом
-user_confirmation_messages = {}  # {user_id: message_id} - сообщения подтверждения
-user_video_messages = {}  # {user_id: message_id} - сообщения с видео и кнопками
+# Очередь отправки задач в KIE.AI: лимит частоты и параллельности, адаптация к 429/5xx
+sora_scheduler = SubmissionScheduler(
+    create_sora_task,
+    rate=SORA_SUBMIT_RATE,
+    burst=SORA_SUBMIT_BURST,
+    concurrency=SORA_SUBMIT_CONCURRENCY,
+    max_queue=SORA_SUBMIT_QUEUE_SIZE,
+    min_rate=SORA_SUBMIT_MIN_RATE
+)
 
-# Состояния для системы примеров
-user_example_category = {}  # {user_id: category_name}
-user_example_index = {}     # {user_id: current_index}
-user_example_for_creation = {}  # {user_id: description} - пример для создания видео
+_background_tasks = set()
 
-# Сообщения задач для удаления при получении видео
-user_task_messages = {}  # {user_id: message_id} - сообщения "Задача отправлена в Sora 2!"
+def spawn_background(coro):
+    """Запуск корутины в фоне с сохранением ссылки на задачу"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+# Пользователь загружается один раз на апдейт и передаётся в хендлеры как user_ctx
+dp.update.outer_middleware(UserContextMiddleware(get_user))
+
+# === GLOBAL STATES ===
+# Состояние диалога: одна сессия на пользователя, неактивные вытесняются по TTL.
+# С SESSION_BACKEND=postgres сессии общие для всех реплик и синхронизируются раз в апдейт
+sessions = SessionStore(
+    ttl=SESSION_TTL,
+    maxsize=SESSION_MAX_USERS,
+    backend=PostgresSessionBackend(lambda: db_pool, ttl=SESSION_TTL) if SESSION_BACKEND == "postgres" else None
+)
+dp.update.outer_middleware(SessionMiddleware(sessions))
 
 # === MAIN MENU ===
 # Функции меню перенесены в utils/keyboards.py
 
 # === /start ===
 @dp.message(Command("start"))
-async def cmd_start(message: types.Message):
+async def cmd_start(message: types.Message, user_ctx: UserContext):
     # Игнорируем команды из группы поддержки
     if message.chat.id == int(SUPPORT_CHAT_ID):
         return
@@ -410,10 +700,11 @@ async def cmd_start(message: types.Message):
     first_name = message.from_user.first_name
     
     # Проверяем или создаем пользователя в БД
-    user = await get_user(user_id)
+    user = await user_ctx.get()
     if not user:
         await create_user(user_id, username, first_name)
-        user = await get_user(user_id)
+    else:
+        await unblock_user(user_id)
     
     # ВСЕГДА показываем выбор языка первым при команде /start
     await message.answer(
@@ -423,15 +714,15 @@ async def cmd_start(message: types.Message):
 
 # === /help ===
 @dp.message(Command("help"))
-async def cmd_help_command(message: types.Message):
+async def cmd_help_command(message: types.Message, user_ctx: UserContext):
     # Игнорируем команды из группы поддержки
     if message.chat.id == int(SUPPORT_CHAT_ID):
         return
     user_id = message.from_user.id
-    user = await get_user(user_id)
+    user = await user_ctx.get()
     user_language = user.get('language', 'en') if user else 'en'
     
-    user_waiting_for_support.add(user_id)
+    sessions.session(user_id).waiting_for_support = True
     await message.answer(
         get_text(user_language, "help_text"),
         reply_markup=main_menu(user_language),
@@ -440,31 +731,82 @@ async def cmd_help_command(message: types.Message):
 
 # === /examples ===
 @dp.message(Command("examples"))
-async def cmd_examples(message: types.Message):
+async def cmd_examples(message: types.Message, user_ctx: UserContext):
     """Обработка команды /examples"""
     # Игнорируем команды из группы поддержки
     if message.chat.id == int(SUPPORT_CHAT_ID):
         return
     
     user_id = message.from_user.id
-    user = await get_user(user_id)
+    user = await user_ctx.get()
     user_language = user.get('language', 'en') if user else 'en'
     
-    await handle_examples(message, user_language)
+    await handle_examples(message, user_language, user_ctx)
+
+# === /search ===
+@dp.message(Command("search"))
+async def cmd_search(message: types.Message, command: CommandObject, user_ctx: UserContext):
+    """Обработка команды /search <слова> — поиск по примерам"""
+    # Игнорируем команды из группы поддержки
+    if message.chat.id == int(SUPPORT_CHAT_ID):
+        return
+    
+    user = await user_ctx.get()
+    user_language = user.get('language', 'en') if user else 'en'
+    
+    # Примеры доступны только с оплаченным тарифом
+    if not has_examples_access(user):
+        await message.answer(
+            get_text(user_language, "examples_subscription_required"),
+            reply_markup=tariff_selection(user_language),
+            parse_mode="HTML"
+        )
+        return
+    
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer(get_text(user_language, "search_usage"), parse_mode="HTML")
+        return
+    
+    results = examples_search.search(query, limit=SEARCH_RESULTS_LIMIT)
+    safe_query = html.escape(query[:100])
+    if not results:
+        await message.answer(get_text(user_language, "search_no_results", query=safe_query), parse_mode="HTML")
+        return
+    
+    # Каждый результат — кнопка, открывающая карточку примера
+    keyboard = []
+    for category_key, index, _ in results:
+        example = get_example(category_key, index)
+        title = example['title'] if len(example['title']) <= 60 else example['title'][:57] + "..."
+        keyboard.append([InlineKeyboardButton(
+            text=f"🎬 {title}",
+            callback_data=ExampleCallback(category=category_key, index=index).pack()
+        )])
+    keyboard.append([InlineKeyboardButton(
+        text=get_text(user_language, "btn_main_menu"),
+        callback_data="main_menu"
+    )])
+    
+    await message.answer(
+        get_text(user_language, "search_results", query=safe_query, count=len(results)),
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard),
+        parse_mode="HTML"
+    )
 
 # === /profile ===
 @dp.message(Command("profile"))
-async def cmd_profile(message: types.Message):
+async def cmd_profile(message: types.Message, user_ctx: UserContext):
     """Обработка команды /profile"""
     # Игнорируем команды из группы поддержки
     if message.chat.id == int(SUPPORT_CHAT_ID):
         return
     
     user_id = message.from_user.id
-    user = await get_user(user_id)
+    user = await user_ctx.get()
     user_language = user.get('language', 'en') if user else 'en'
     
-    await handle_profile(message, user_language)
+    await handle_profile(message, user_language, user_ctx)
 
 # === /language ===
 @dp.message(Command("language"))
@@ -478,14 +820,14 @@ async def cmd_language(message: types.Message):
 
 # === /create ===
 @dp.message(Command("create"))
-async def cmd_create(message: types.Message):
+async def cmd_create(message: types.Message, user_ctx: UserContext):
     """Обработка команды /create - показать выбор ориентации"""
     # Игнорируем команды из группы поддержки
     if message.chat.id == int(SUPPORT_CHAT_ID):
         return
     
     user_id = message.from_user.id
-    user = await get_user(user_id)
+    user = await user_ctx.get()
     user_language = user.get('language', 'en') if user else 'en'
     
     # Показываем выбор ориентации
@@ -496,417 +838,448 @@ async def cmd_create(message: types.Message):
 
 # === /buy ===
 @dp.message(Command("buy"))
-async def cmd_buy(message: types.Message):
+async def cmd_buy(message: types.Message, user_ctx: UserContext):
     """Обработка команды /buy - показать тарифы"""
     # Игнорируем команды из группы поддержки
     if message.chat.id == int(SUPPORT_CHAT_ID):
         return
     
     user_id = message.from_user.id
-    user = await get_user(user_id)
+    user = await user_ctx.get()
     user_language = user.get('language', 'en') if user else 'en'
     
     await handle_buy_tariff(message, user_language)
 
-# === CALLBACK: Language choice ===
-@dp.callback_query()
-async def callback_handler(callback: types.CallbackQuery):
-    user_id = callback.from_user.id
-    
-    # Обработка кнопок главного меню
-    if callback.data == "menu_create_video":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        await callback.message.edit_text(
-            get_text(user_language, "choose_orientation"),
-            reply_markup=orientation_menu(user_language)
-        )
-        await callback.answer()
+# === /broadcast (только для ADMIN_IDS) ===
+BROADCAST_USAGE = (
+    "📣 <b>Рассылка</b>\n\n"
+    "<code>/broadcast [lang=ru] [plan=\"Premium\"] текст</code> — новая рассылка (HTML)\n"
+    "<code>/broadcast status</code> — последние рассылки\n"
+    "<code>/broadcast cancel ID</code> — остановить\n"
+    "<code>/broadcast resume ID</code> — продолжить с места остановки"
+)
+BROADCAST_OPTION_RE = re.compile(r'(lang|plan)=("[^"]*"|\S+)\s*')
+
+@dp.message(Command("broadcast"))
+async def cmd_broadcast(message: types.Message, command: CommandObject):
+    """Управление массовыми рассылками"""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    if not db_pool:
+        await message.answer("⚠️ База данных недоступна")
         return
     
-    elif callback.data == "menu_examples":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        
-        # Проверяем, есть ли у пользователя оплаченная подписка
-        if not user or user.get('plan_name') == 'Без тарифа' or user.get('videos_left', 0) <= 0:
-            await callback.message.edit_text(
-                get_text(user_language, "examples_subscription_required"),
-                reply_markup=tariff_selection(user_language),
-                parse_mode="HTML"
-            )
-        else:
-            markup = build_categories_keyboard(0, user_language)
-            text = "🎬 <b>Готовые идеи для создания вирусных видео!</b>\n\n<b>Как использовать:</b>\n1️⃣ Выбери понравившийся пример\n2️⃣ Скопируй текст\n3️⃣ Вставь в бот и создай видео!\nИли измени под свою идею 💡\n\n<b>Кнопки с разделами и примерами 👇</b>"
-            await callback.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
-        await callback.answer()
+    args = (command.args or "").strip()
+    action, _, rest = args.partition(" ")
+    
+    if action in ("", "status"):
+        async with db_pool.acquire() as conn:
+            rows = await queries.fetch(conn, "recent_broadcasts", 5)
+        lines = [
+            f"#{row['id']} {row['status']} [{row['language'] or 'все'} / {row['plan_name'] or 'все'}]: "
+            f"✅ {row['sent']} ❌ {row['failed']} 🚫 {row['blocked']}"
+            for row in rows
+        ]
+        current = broadcast_runner.current
+        if current:
+            lines.append(f"\n⚡ #{current['id']}: {current['messages_per_second']} сообщений/с")
+        await message.answer("\n".join(lines) if lines else BROADCAST_USAGE, parse_mode="HTML")
         return
     
-    elif callback.data == "menu_profile":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        
-        if not user:
-            await callback.message.edit_text(get_text(user_language, "error_getting_data"))
-            await callback.answer()
+    if action in ("cancel", "resume"):
+        if not rest.strip().isdigit():
+            await message.answer(BROADCAST_USAGE, parse_mode="HTML")
             return
-        
-        safe_name = user.get('first_name') or getattr(callback.from_user, 'first_name', None) or "Not specified"
-        
-        try:
-            date_str = user['created_at'].strftime('%d.%m.%Y') if user.get('created_at') else "Unknown"
-        except:
-            date_str = "Unknown"
-        
-        profile_text = get_text(
-            user_language,
-            "profile",
-            name=safe_name,
-            plan=user['plan_name'],
-            videos_left=user['videos_left'],
-            date=date_str
-        )
-        
-        await callback.message.edit_text(profile_text, reply_markup=tariff_selection(user_language))
-        await callback.answer()
+        async with db_pool.acquire() as conn:
+            changed = await queries.fetchval(conn, f"{action}_broadcast", int(rest))
+        if changed is None:
+            await message.answer(f"⚠️ Рассылку #{rest.strip()} нельзя {'остановить' if action == 'cancel' else 'продолжить'}")
+            return
+        if action == "resume":
+            broadcast_runner.wake()
+        await message.answer(f"✅ Рассылка #{changed}: {'остановлена' if action == 'cancel' else 'продолжается'}")
         return
     
-    elif callback.data == "menu_help":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        user_waiting_for_support.add(user_id)
-        await callback.message.edit_text(
-            get_text(user_language, "help_text"),
-            reply_markup=help_keyboard(user_language),
-            parse_mode="HTML",
-            disable_web_page_preview=True
-        )
-        await callback.answer()
+    # Новая рассылка: ведущие опции lang=/plan=, дальше текст
+    options = {}
+    text = args
+    while True:
+        match = BROADCAST_OPTION_RE.match(text)
+        if not match:
+            break
+        options[match.group(1)] = match.group(2).strip('"')
+        text = text[match.end():]
+    if not text.strip():
+        await message.answer(BROADCAST_USAGE, parse_mode="HTML")
         return
     
-    elif callback.data == "cancel_help":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        # Убираем пользователя из очереди поддержки
-        user_waiting_for_support.discard(user_id)
-        await callback.message.edit_text(
-            get_text(user_language, "choose_action"),
-            reply_markup=main_menu(user_language),
-            parse_mode="HTML"
-        )
-        await callback.answer()
+    # Превью администратору: заодно проверяем HTML до запуска рассылки
+    try:
+        await message.answer(text)
+    except Exception as e:
+        await message.answer(f"⚠️ Текст не отправляется: {html.escape(str(e))}")
         return
     
-    elif callback.data == "menu_language":
-        await callback.message.edit_text(
-            get_text('en', "choose_language"),
-            reply_markup=language_selection()
+    broadcast_id = await broadcast.create_broadcast(db_pool, text, options.get("lang"), options.get("plan"), message.from_user.id)
+    broadcast_runner.wake()
+    logging.info(f"📣 Broadcast #{broadcast_id} created by {message.from_user.id}: lang={options.get('lang')}, plan={options.get('plan')}")
+    await message.answer(f"📣 Рассылка #{broadcast_id} запущена. Статус: /broadcast status")
+
+# === INLINE MODE ===
+@dp.inline_query()
+async def inline_examples(inline_query: types.InlineQuery, user_ctx: UserContext):
+    """@bot <запрос>: готовые страницы примеров; пользователь берётся из кэша users"""
+    user = await user_ctx.get()
+    if not has_examples_access(user):
+        # Без тарифа — пустой ответ с кнопкой перехода в бота. Кэш короткий:
+        # после оплаты примеры должны появиться сразу
+        user_language = user.get('language', 'en') if user else 'en'
+        await inline_query.answer(
+            [],
+            cache_time=INLINE_DENIED_CACHE_TIME,
+            is_personal=True,
+            button=InlineQueryResultsButton(
+                text=get_text(user_language, "inline_subscription_required"),
+                start_parameter="examples"
+            )
         )
-        await callback.answer()
         return
     
-    # Обработка выбора языка
-    if callback.data.startswith("lang_"):
-        language = callback.data.replace("lang_", "")
-        first_name = getattr(callback.from_user, 'first_name', None) or "friend"
-        
-        # Обновляем язык пользователя в БД
-        await update_user_language(user_id, language)
-        
-        # Получаем пользователя с обновленным языком
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else language
-        
-        # Отправляем подтверждение
+    results, next_offset = examples_inline.page(inline_query.query, inline_query.offset)
+    # Доступ зависит от тарифа, поэтому ответ персональный: Telegram кэширует его для каждого пользователя
+    await inline_query.answer(
+        results,
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=True,
+        next_offset=next_offset
+    )
+
+# === CALLBACKS ===
+# Inline-кнопки маршрутизируются через таблицу: точное значение callback_data или префикс CallbackData
+callbacks = CallbackDispatcher()
+
+@dp.callback_query()
+async def callback_handler(callback: types.CallbackQuery, user_ctx: UserContext):
+    await callbacks.dispatch(callback, user_ctx=user_ctx)
+    await callback.answer()
+
+# Обработка кнопок главного меню
+@callbacks.action("menu_create_video", "change_orientation")
+async def cb_choose_orientation(callback: types.CallbackQuery, user_ctx: UserContext):
+    user_language = await user_ctx.language()
+    await callback.message.edit_text(
+        get_text(user_language, "choose_orientation"),
+        reply_markup=orientation_menu(user_language)
+    )
+
+@callbacks.action("menu_examples")
+async def cb_menu_examples(callback: types.CallbackQuery, user_ctx: UserContext):
+    user = await user_ctx.get()
+    user_language = user.get('language', 'en') if user else 'en'
+    
+    # Проверяем, есть ли у пользователя оплаченная подписка
+    if not has_examples_access(user):
         await callback.message.edit_text(
-            get_text(user_language, "lang_selected")
-        )
-        
-        # Отправляем приветственное сообщение на выбранном языке
-        welcome_text = get_text(
-            user_language, 
-            "welcome",
-            name=first_name,
-            plan=user.get('plan_name', 'Без тарифа') if user else 'Без тарифа',
-            videos_left=user.get('videos_left', 0) if user else 0
-        )
-        
-        await callback.message.answer(
-            welcome_text,
-            disable_web_page_preview=True
-        )
-        
-        # Показываем "Выбери действие:" с главным меню
-        await callback.message.answer(
-            get_text(user_language, "choose_action"),
-            reply_markup=main_menu(user_language)
+            get_text(user_language, "examples_subscription_required"),
+            reply_markup=tariff_selection(user_language),
+            parse_mode="HTML"
         )
-        
-        await callback.answer()
+    else:
+        markup = examples_view.categories_page(0, user_language)
+        text = EXAMPLES_INTRO_TEXT
+        await callback.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
+
+@callbacks.action("menu_profile")
+async def cb_menu_profile(callback: types.CallbackQuery, user_ctx: UserContext):
+    user = await user_ctx.get()
+    user_language = user.get('language', 'en') if user else 'en'
+    
+    if not user:
+        await callback.message.edit_text(get_text(user_language, "error_getting_data"))
         return
     
-    # Обработка выбора ориентации
-    if callback.data == "orientation_vertical":
-        user_waiting_for_video_orientation[user_id] = "vertical"
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        
-        # Проверяем, есть ли сохраненный пример для создания
-        if user_id in user_example_for_creation:
-            # Создаем видео из примера
-            description = user_example_for_creation[user_id]
-            del user_example_for_creation[user_id]  # Удаляем после использования
-            await handle_video_description_from_example(callback, description)
-        else:
-            # Обычный выбор ориентации
-            prompt_msg = await callback.message.edit_text(
-                get_text(
-                    user_language, 
-                    "orientation_selected",
-                    orientation=get_text(user_language, "orientation_vertical_name")
-                )
-            )
-            # Сохраняем ID сообщения промпта
-            user_prompt_messages[user_id] = prompt_msg.message_id
-    elif callback.data == "orientation_horizontal":
-        user_waiting_for_video_orientation[user_id] = "horizontal"
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        
-        # Проверяем, есть ли сохраненный пример для создания
-        if user_id in user_example_for_creation:
-            # Создаем видео из примера
-            description = user_example_for_creation[user_id]
-            del user_example_for_creation[user_id]  # Удаляем после использования
-            await handle_video_description_from_example(callback, description)
-        else:
-            # Обычный выбор ориентации
-            prompt_msg = await callback.message.edit_text(
-                get_text(
-                    user_language,
-                    "orientation_selected",
-                    orientation=get_text(user_language, "orientation_horizontal_name")
-                )
-            )
-            # Сохраняем ID сообщения промпта
-            user_prompt_messages[user_id] = prompt_msg.message_id
+    safe_name = user.get('first_name') or getattr(callback.from_user, 'first_name', None) or "Not specified"
     
-    # Обработка смены ориентации после создания видео
-    elif callback.data == "change_orientation":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        
-        await callback.message.edit_text(
-            get_text(user_language, "choose_orientation"),
-            reply_markup=orientation_menu(user_language)
-        )
-        await callback.answer()
-        return
+    try:
+        date_str = user['created_at'].strftime('%d.%m.%Y') if user.get('created_at') else "Unknown"
+    except:
+        date_str = "Unknown"
     
-    # Обработка кнопки "Главное меню" из меню ориентации
-    elif callback.data == "main_menu":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        
-        # Показываем главное меню (inline)
-        await callback.message.edit_text(
-            get_text(user_language, "choose_action"),
-            reply_markup=main_menu(user_language)
+    profile_text = get_text(
+        user_language,
+        "profile",
+        name=safe_name,
+        plan=user['plan_name'],
+        videos_left=user['videos_left'],
+        date=date_str
+    )
+    
+    await callback.message.edit_text(profile_text, reply_markup=tariff_selection(user_language))
+
+@callbacks.action("menu_help")
+async def cb_menu_help(callback: types.CallbackQuery, user_ctx: UserContext):
+    user_language = await user_ctx.language()
+    sessions.session(callback.from_user.id).waiting_for_support = True
+    await callback.message.edit_text(
+        get_text(user_language, "help_text"),
+        reply_markup=help_keyboard(user_language),
+        parse_mode="HTML",
+        disable_web_page_preview=True
+    )
+
+@callbacks.action("cancel_help")
+async def cb_cancel_help(callback: types.CallbackQuery, user_ctx: UserContext):
+    user_language = await user_ctx.language()
+    # Убираем пользователя из очереди поддержки
+    session = sessions.get(callback.from_user.id)
+    if session:
+        session.waiting_for_support = False
+    await callback.message.edit_text(
+        get_text(user_language, "choose_action"),
+        reply_markup=main_menu(user_language),
+        parse_mode="HTML"
+    )
+
+@callbacks.action("menu_language")
+async def cb_menu_language(callback: types.CallbackQuery, user_ctx: UserContext):
+    await callback.message.edit_text(
+        get_text('en', "choose_language"),
+        reply_markup=language_selection()
+    )
+
+# Обработка выбора языка
+@callbacks.payload(LanguageCallback)
+async def cb_language(callback: types.CallbackQuery, user_ctx: UserContext, payload: LanguageCallback):
+    language = payload.code
+    first_name = getattr(callback.from_user, 'first_name', None) or "friend"
+    
+    # Обновляем язык пользователя в БД
+    await update_user_language(callback.from_user.id, language)
+    
+    # Получаем пользователя с обновленным языком
+    user = await user_ctx.get()
+    user_language = user.get('language', 'en') if user else language
+    
+    # Отправляем подтверждение
+    await callback.message.edit_text(
+        get_text(user_language, "lang_selected")
+    )
+    
+    # Отправляем приветственное сообщение на выбранном языке
+    welcome_text = get_text(
+        user_language, 
+        "welcome",
+        name=first_name,
+        plan=user.get('plan_name', 'Без тарифа') if user else 'Без тарифа',
+        videos_left=user.get('videos_left', 0) if user else 0
+    )
+    
+    await callback.message.answer(
+        welcome_text,
+        disable_web_page_preview=True
+    )
+    
+    # Показываем "Выбери действие:" с главным меню
+    await callback.message.answer(
+        get_text(user_language, "choose_action"),
+        reply_markup=main_menu(user_language)
+    )
+
+# Обработка выбора ориентации
+@callbacks.action("orientation_vertical")
+async def cb_orientation_vertical(callback: types.CallbackQuery, user_ctx: UserContext):
+    await choose_orientation(callback, user_ctx, "vertical")
+
+@callbacks.action("orientation_horizontal")
+async def cb_orientation_horizontal(callback: types.CallbackQuery, user_ctx: UserContext):
+    await choose_orientation(callback, user_ctx, "horizontal")
+
+async def choose_orientation(callback: types.CallbackQuery, user_ctx: UserContext, orientation: str):
+    """Запоминаем ориентацию и просим описание (или сразу создаём видео из примера)"""
+    user_id = callback.from_user.id
+    session = sessions.session(user_id)
+    session.orientation = orientation
+    user_language = await user_ctx.language()
+    
+    # Проверяем, есть ли сохраненный пример для создания
+    if session.example_for_creation:
+        # Создаем видео из примера
+        description = session.example_for_creation
+        session.example_for_creation = None  # Удаляем после использования
+        await handle_video_description_from_example(callback, description, user_ctx)
+    else:
+        # Обычный выбор ориентации
+        prompt_msg = await callback.message.edit_text(
+            get_text(
+                user_language, 
+                "orientation_selected",
+                orientation=get_text(user_language, f"orientation_{orientation}_name")
+            )
         )
-        await callback.answer()
-        return
+        # Сохраняем ID сообщения промпта
+        session.prompt_message_id = prompt_msg.message_id
+
+# Обработка кнопки "Главное меню" из меню ориентации
+@callbacks.action("main_menu")
+async def cb_main_menu(callback: types.CallbackQuery, user_ctx: UserContext):
+    user_language = await user_ctx.language()
+    
+    # Показываем главное меню (inline)
+    await callback.message.edit_text(
+        get_text(user_language, "choose_action"),
+        reply_markup=main_menu(user_language)
+    )
+
+# Обработка покупки тарифов - основные тарифы через YooKassa
+@callbacks.action("buy_trial", "buy_basic", "buy_maximum")
+async def cb_buy_tariff(callback: types.CallbackQuery, user_ctx: UserContext):
+    user_language = await user_ctx.language()
+    tariff = callback.data.replace("buy_", "")
+    await handle_payment(callback, tariff, tariff_prices[tariff], user_language)
+
+@callbacks.action("buy_foreign")
+async def cb_buy_foreign(callback: types.CallbackQuery, user_ctx: UserContext):
+    user_language = await user_ctx.language()
+    
+    # Получаем переводы названий тарифов и слова "видео"
+    trial_name = get_text(user_language, 'foreign_trial')
+    basic_name = get_text(user_language, 'foreign_basic')
+    premium_name = get_text(user_language, 'foreign_premium')
+    videos_word = get_text(user_language, 'videos')
     
-    # Обработка покупки тарифов - основные тарифы через YooKassa
-    elif callback.data == "buy_trial":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        await handle_payment(callback, "trial", tariff_prices["trial"], user_language)
-    elif callback.data == "buy_basic":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        await handle_payment(callback, "basic", tariff_prices["basic"], user_language)
-    elif callback.data == "buy_maximum":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        await handle_payment(callback, "maximum", tariff_prices["maximum"], user_language)
-    elif callback.data == "buy_foreign":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        
-        # Получаем переводы названий тарифов и слова "видео"
-        trial_name = get_text(user_language, 'foreign_trial')
-        basic_name = get_text(user_language, 'foreign_basic')
-        premium_name = get_text(user_language, 'foreign_premium')
-        videos_word = get_text(user_language, 'videos')
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=f"🌱 {trial_name} — 3 {videos_word} — €5", url="https://web.tribute.tg/p/lEw")],
-            [InlineKeyboardButton(text=f"✨ {basic_name} — 10 {videos_word} — €12", url="https://web.tribute.tg/p/lEu")],
-            [InlineKeyboardButton(text=f"💎 {premium_name} — 30 {videos_word} — €25", url="https://web.tribute.tg/p/lEv")],
-            [InlineKeyboardButton(
-                text=get_text(user_language, "btn_main_menu"),
-                callback_data="main_menu"
-            )]
-        ])
-        
-        text = (
-            f"{get_text(user_language, 'foreign_card_title')}\n\n"
-            f"🌱 <b>{trial_name}</b> — 3 {videos_word} — €5\n"
-            f"✨ <b>{basic_name}</b> — 10 {videos_word} — €12\n"
-            f"💎 <b>{premium_name}</b> — 30 {videos_word} — €25\n\n"
-            f"{get_text(user_language, 'foreign_card_description')}"
-        )
-        
-        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
-        await callback.answer()
-        return
+    keyboard = foreign_tariffs_keyboard(user_language)
     
-    # Обработка выбора подписок Tribute
-    elif callback.data.startswith("sub_"):
-        tariff = callback.data.replace("sub_", "")
-        tariff_info = get_tariff_info(tariff)
-        
-        if not tariff_info:
-            await callback.message.edit_text("❌ Неизвестный тариф. Попробуйте позже.")
-            await callback.answer()
-            return
-        
-        # Получаем язык пользователя
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        
-        # Показываем меню Tribute тарифов
-        await send_foreign_tariffs(callback.message, user_language)
-        await callback.answer()
-        return
+    text = (
+        f"{get_text(user_language, 'foreign_card_title')}\n\n"
+        f"🌱 <b>{trial_name}</b> — 3 {videos_word} — €5\n"
+        f"✨ <b>{basic_name}</b> — 10 {videos_word} — €12\n"
+        f"💎 <b>{premium_name}</b> — 30 {videos_word} — €25\n\n"
+        f"{get_text(user_language, 'foreign_card_description')}"
+    )
     
-    # Обработка выбора категории примеров
-    elif callback.data.startswith("category_"):
-        category_key = callback.data.replace("category_", "")
-        user_example_category[user_id] = category_key
-        user_example_index[user_id] = 0
-        await show_example(callback, category_key, 0)
-    
-    # Обработка навигации по примерам
-    elif callback.data == "example_prev":
-        category_key = user_example_category.get(user_id)
-        if category_key:
-            examples = get_examples_from_category(category_key)
-            if examples:
-                current_index = user_example_index.get(user_id, 0)
-                prev_index = (current_index - 1) % len(examples)
-                user_example_index[user_id] = prev_index
-                await show_example(callback, category_key, prev_index)
-    
-    elif callback.data == "example_next":
-        category_key = user_example_category.get(user_id)
-        if category_key:
-            examples = get_examples_from_category(category_key)
-            if examples:
-                current_index = user_example_index.get(user_id, 0)
-                next_index = (current_index + 1) % len(examples)
-                user_example_index[user_id] = next_index
-                await show_example(callback, category_key, next_index)
-    
-    elif callback.data == "example_back_to_categories":
-        await show_categories(callback, 0)
-    
-    elif callback.data.startswith("catpage_"):
-        try:
-            page = int(callback.data.replace("catpage_", ""))
-        except Exception:
-            page = 0
-        await show_categories(callback, page)
-    
-    elif callback.data == "example_create_video":
-        category_key = user_example_category.get(user_id)
-        current_index = user_example_index.get(user_id, 0)
-        if category_key:
-            example = get_example(category_key, current_index)
-            if example:
-                # Сохраняем пример для создания видео
-                user_example_for_creation[user_id] = example['description']
-                
-                # Получаем язык пользователя для отображения меню ориентации
-                user = await get_user(user_id)
-                user_language = user.get('language', 'en') if user else 'en'
-                
-                # Показываем выбор ориентации
-                await callback.message.edit_text(
-                    get_text(user_language, "choose_orientation"),
-                    reply_markup=orientation_menu(user_language)
-                )
+    await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+
+# Обработка выбора подписок Tribute
+@callbacks.payload(SubscriptionCallback)
+async def cb_subscription(callback: types.CallbackQuery, user_ctx: UserContext, payload: SubscriptionCallback):
+    tariff_info = get_tariff_info(payload.tariff)
     
-    # Обработка кнопок подтверждения создания видео
-    elif callback.data == "confirm_create_video":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
-        
-        # Получаем данные из состояния пользователя
-        if user_id in user_video_requests:
-            video_data = user_video_requests[user_id]
-            description = video_data['description']
-            orientation = video_data['orientation']
-            
-            # Удаляем данные из состояния
-            del user_video_requests[user_id]
-            
-            # Начинаем создание видео
-            await create_video(callback.message, user_id, description, orientation, user_language)
-        else:
-            await callback.message.edit_text(
-                get_text(user_language, "error_getting_data"),
-                reply_markup=main_menu(user_language)
-            )
-        await callback.answer()
+    if not tariff_info:
+        await callback.message.edit_text("❌ Неизвестный тариф. Попробуйте позже.")
         return
     
-    elif callback.data == "edit_video_request":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
+    # Получаем язык пользователя
+    user_language = await user_ctx.language()
+    
+    # Показываем меню Tribute тарифов
+    await send_foreign_tariffs(callback.message, user_language)
+
+# Обработка выбора категории примеров
+@callbacks.payload(CategoryCallback)
+async def cb_category(callback: types.CallbackQuery, user_ctx: UserContext, payload: CategoryCallback):
+    await show_example(callback, user_ctx, payload.key, 0)
+
+# Карточка примера: результаты поиска и листание ⏪/⏩ (раздел и индекс — в callback_data)
+@callbacks.payload(ExampleCallback)
+async def cb_example_open(callback: types.CallbackQuery, user_ctx: UserContext, payload: ExampleCallback):
+    await show_example(callback, user_ctx, payload.category, payload.index)
+
+# Кнопки карточек, отправленных до перехода на ex_/exc_: позиция не сохранялась, возвращаем к разделам
+@callbacks.action("example_prev", "example_next", "example_create_video")
+async def cb_example_legacy(callback: types.CallbackQuery, user_ctx: UserContext):
+    await show_categories(callback, user_ctx, 0)
+
+@callbacks.action("example_back_to_categories")
+async def cb_example_back(callback: types.CallbackQuery, user_ctx: UserContext):
+    await show_categories(callback, user_ctx, 0)
+
+@callbacks.payload(CategoryPageCallback)
+async def cb_category_page(callback: types.CallbackQuery, user_ctx: UserContext, payload: CategoryPageCallback):
+    await show_categories(callback, user_ctx, payload.page)
+
+@callbacks.payload(ExampleCreateCallback)
+async def cb_example_create_video(callback: types.CallbackQuery, user_ctx: UserContext, payload: ExampleCreateCallback):
+    example = get_example(payload.category, payload.index)
+    if example:
+        # Сохраняем пример для создания видео
+        sessions.session(callback.from_user.id).example_for_creation = example['description']
         
-        # Удаляем данные из состояния
-        if user_id in user_video_requests:
-            del user_video_requests[user_id]
+        # Получаем язык пользователя для отображения меню ориентации
+        user_language = await user_ctx.language()
         
-        # Показываем промпт для ввода нового запроса
-        orientation_name = get_text(user_language, "orientation_vertical_name")
-        prompt_msg = await callback.message.edit_text(
-            get_text(user_language, "orientation_selected").format(orientation=orientation_name),
-            reply_markup=orientation_menu(user_language),
-            parse_mode="HTML"
+        # Показываем выбор ориентации
+        await callback.message.edit_text(
+            get_text(user_language, "choose_orientation"),
+            reply_markup=orientation_menu(user_language)
         )
-        # Сохраняем ID сообщения промпта
-        user_prompt_messages[user_id] = prompt_msg.message_id
-        await callback.answer()
-        return
+    else:
+        # Каталог обновился и примера с таким индексом больше нет
+        await show_categories(callback, user_ctx, 0)
+
+# Обработка кнопок подтверждения создания видео
+@callbacks.action("confirm_create_video")
+async def cb_confirm_create_video(callback: types.CallbackQuery, user_ctx: UserContext):
+    user_id = callback.from_user.id
+    user_language = await user_ctx.language()
     
-    elif callback.data == "cancel_video_request":
-        user = await get_user(user_id)
-        user_language = user.get('language', 'en') if user else 'en'
+    # Получаем данные из состояния пользователя
+    session = sessions.get(user_id)
+    if session and session.video_request:
+        video_data = session.video_request
+        description = video_data['description']
+        orientation = video_data['orientation']
         
         # Удаляем данные из состояния
-        if user_id in user_video_requests:
-            del user_video_requests[user_id]
+        session.video_request = None
         
-        # Удаляем сообщение подтверждения
-        if user_id in user_confirmation_messages:
-            del user_confirmation_messages[user_id]
-        
-        # Возвращаемся в главное меню
+        # Начинаем создание видео
+        await create_video(callback.message, user_id, description, orientation, user_language, user_ctx)
+    else:
         await callback.message.edit_text(
-            get_text(user_language, "choose_action"),
-            reply_markup=main_menu(user_language),
-            parse_mode="HTML"
+            get_text(user_language, "error_getting_data"),
+            reply_markup=main_menu(user_language)
         )
-        await callback.answer()
-        return
+
+@callbacks.action("edit_video_request")
+async def cb_edit_video_request(callback: types.CallbackQuery, user_ctx: UserContext):
+    user_id = callback.from_user.id
+    user_language = await user_ctx.language()
     
-    await callback.answer()
+    # Удаляем данные из состояния
+    session = sessions.session(user_id)
+    session.video_request = None
+    
+    # Показываем промпт для ввода нового запроса
+    orientation_name = get_text(user_language, "orientation_vertical_name")
+    prompt_msg = await callback.message.edit_text(
+        get_text(user_language, "orientation_selected", orientation=orientation_name),
+        reply_markup=orientation_menu(user_language),
+        parse_mode="HTML"
+    )
+    # Сохраняем ID сообщения промпта
+    session.prompt_message_id = prompt_msg.message_id
+
+@callbacks.action("cancel_video_request")
+async def cb_cancel_video_request(callback: types.CallbackQuery, user_ctx: UserContext):
+    user_id = callback.from_user.id
+    user_language = await user_ctx.language()
+    
+    # Удаляем данные из состояния и сообщение подтверждения
+    session = sessions.get(user_id)
+    if session:
+        session.video_request = None
+        session.confirmation_message_id = None
+    
+    # Возвращаемся в главное меню
+    await callback.message.edit_text(
+        get_text(user_language, "choose_action"),
+        reply_markup=main_menu(user_language),
+        parse_mode="HTML"
+    )
 
 # === DEFAULT HANDLER ===
 @dp.message()
-async def handle_text(message: types.Message):
+async def handle_text(message: types.Message, user_ctx: UserContext):
     # Игнорируем сообщения из группы поддержки
     if message.chat.id == int(SUPPORT_CHAT_ID):
         logging.info(f"🆘 Ignoring message from support group: {message.chat.id}")
@@ -914,9 +1287,10 @@ async def handle_text(message: types.Message):
     
     user_id = message.from_user.id
     text = message.text.strip()
+    session = sessions.get(user_id)
 
     # Если пользователь сейчас пишет в поддержку
-    if user_id in user_waiting_for_support:
+    if session and session.waiting_for_support:
         logging.info(f"🆘 User {user_id} is writing to support. SUPPORT_CHAT_ID: {SUPPORT_CHAT_ID}")
         username = message.from_user.username or "без ника"
         full_name = message.from_user.full_name
@@ -939,7 +1313,7 @@ async def handle_text(message: types.Message):
             logging.info(f"✅ Message ID: {result.message_id}")
             
             # Получаем язык пользователя для кнопок
-            user = await get_user(user_id)
+            user = await user_ctx.get()
             user_language = user.get('language', 'ru') if user else 'ru'
             
             await message.answer(
@@ -952,15 +1326,16 @@ async def handle_text(message: types.Message):
             logging.error(f"❌ SUPPORT_CHAT_ID: {SUPPORT_CHAT_ID}, Type: {type(SUPPORT_CHAT_ID)}")
             logging.error(f"❌ Full error details: {str(e)}")
             await message.answer("⚠️ Не удалось отправить сообщение. Попробуй позже.")
-        user_waiting_for_support.remove(user_id)
+        session.waiting_for_support = False
         return
 
     # Получаем язык пользователя
-    user = await get_user(user_id)
+    user = await user_ctx.get()
     user_language = user.get('language', 'en') if user else 'en'
     
-    # Обработка старых текстовых кнопок (для совместимости)
-    if text in [get_text(lang, "btn_create_video") for lang in ["ru", "en", "es", "ar", "hi"]]:
+    # Обработка старых текстовых кнопок (для совместимости): один поиск по индексу текстов
+    action = button_action(text)
+    if action == "btn_create_video":
         # Удаляем предыдущее сообщение и показываем выбор ориентации БЕЗ меню
         try:
             await message.delete()
@@ -971,16 +1346,15 @@ async def handle_text(message: types.Message):
             reply_markup=orientation_menu(user_language),
             parse_mode="HTML"
         )
-    elif text in [get_text(lang, "btn_examples") for lang in ["ru", "en", "es", "ar", "hi"]]:
+    elif action == "btn_examples":
         # Удаляем предыдущее сообщение и показываем примеры БЕЗ меню
         try:
             await message.delete()
         except:
             pass
-        user = await get_user(user_id)
         
         # Проверяем, есть ли у пользователя оплаченная подписка
-        if not user or user.get('plan_name') == 'Без тарифа' or user.get('videos_left', 0) <= 0:
+        if not has_examples_access(user):
             # Показываем сообщение о необходимости подписки БЕЗ меню
             await message.answer(
                 get_text(user_language, "examples_subscription_required"),
@@ -988,16 +1362,15 @@ async def handle_text(message: types.Message):
             )
         else:
             # Если подписка есть, показываем примеры БЕЗ меню
-            markup = build_categories_keyboard(0, user_language)
-            text = "🎬 <b>Готовые идеи для создания вирусных видео!</b>\n\n<b>Как использовать:</b>\n1️⃣ Выбери понравившийся пример\n2️⃣ Скопируй текст\n3️⃣ Вставь в бот и создай видео!\nИли измени под свою идею 💡\n\n<b>Кнопки с разделами и примерами 👇</b>"
+            markup = examples_view.categories_page(0, user_language)
+            text = EXAMPLES_INTRO_TEXT
             await message.answer(text, reply_markup=markup, parse_mode="HTML")
-    elif text in [get_text(lang, "btn_profile") for lang in ["ru", "en", "es", "ar", "hi"]]:
+    elif action == "btn_profile":
         # Удаляем предыдущее сообщение и показываем профиль С тарифами
         try:
             await message.delete()
         except:
             pass
-        user = await get_user(user_id)
         if not user:
             await message.answer(get_text(user_language, "error_getting_data"), parse_mode="HTML")
             return
@@ -1020,20 +1393,20 @@ async def handle_text(message: types.Message):
         
         # Показываем профиль С клавиатурой тарифов
         await message.answer(profile_text, reply_markup=tariff_selection(user_language), parse_mode="HTML")
-    elif text in [get_text(lang, "btn_help") for lang in ["ru", "en", "es", "ar", "hi"]]:
+    elif action == "btn_help":
         # Удаляем предыдущее сообщение и показываем помощь БЕЗ меню
         try:
             await message.delete()
         except:
             pass
-        user_waiting_for_support.add(user_id)
+        sessions.session(user_id).waiting_for_support = True
         await message.answer(
             get_text(user_language, "help_text"),
             reply_markup=help_keyboard(user_language),
             parse_mode="HTML",
             disable_web_page_preview=True
         )
-    elif text in [get_text(lang, "btn_language") for lang in ["ru", "en", "es", "ar", "hi"]]:
+    elif action == "btn_language":
         # Удаляем предыдущее сообщение и показываем выбор языка БЕЗ меню
         try:
             await message.delete()
@@ -1044,14 +1417,14 @@ async def handle_text(message: types.Message):
             reply_markup=language_selection(),
             parse_mode="HTML"
         )
-    elif text in [get_text(lang, "btn_buy_foreign") for lang in ["ru", "en", "es", "ar", "hi"]]:
+    elif action == "btn_buy_foreign":
         # Удаляем предыдущее сообщение и показываем иностранные тарифы
         try:
             await message.delete()
         except:
             pass
         await send_foreign_tariffs(message, user_language)
-    elif text in [get_text(lang, "btn_buy_tariff") for lang in ["ru", "en", "es", "ar", "hi"]]:
+    elif action == "btn_buy_tariff":
         # Удаляем предыдущее сообщение и показываем тарифы
         try:
             await message.delete()
@@ -1059,20 +1432,20 @@ async def handle_text(message: types.Message):
             pass
         await handle_buy_tariff(message, user_language)
     # Если пользователь выбрал ориентацию, то это описание для видео
-    elif user_id in user_waiting_for_video_orientation and user_waiting_for_video_orientation[user_id]:
+    elif session and session.orientation:
         # Удаляем кнопки под видео если они есть
         try:
-            if user_id in user_video_messages:
+            if session.video_message_id:
                 await bot.edit_message_reply_markup(
                     user_id, 
-                    user_video_messages[user_id], 
+                    session.video_message_id, 
                     reply_markup=None
                 )
-                del user_video_messages[user_id]
+                session.video_message_id = None
         except Exception as e:
             logging.warning(f"⚠️ Failed to remove video buttons for user {user_id}: {e}")
         
-        await handle_video_description(message, user_language)
+        await handle_video_description(message, user_language, user_ctx)
     else:
         # Если пользователь написал что-то непонятное, показываем главное меню
         await message.answer(
@@ -1081,13 +1454,12 @@ async def handle_text(message: types.Message):
             parse_mode="HTML"
         )
 
-async def handle_examples(message: types.Message, user_language: str):
+async def handle_examples(message: types.Message, user_language: str, user_ctx: UserContext):
     """Обработка команды /examples - показывает категории"""
-    user_id = message.from_user.id
-    user = await get_user(user_id)
+    user = await user_ctx.get()
     
     # Проверяем, есть ли у пользователя оплаченная подписка
-    if not user or user.get('plan_name') == 'Без тарифа' or user.get('videos_left', 0) <= 0:
+    if not has_examples_access(user):
         # Показываем сообщение о необходимости подписки
         await message.answer(
             get_text(user_language, "examples_subscription_required"),
@@ -1097,8 +1469,8 @@ async def handle_examples(message: types.Message, user_language: str):
         return
     
     # Если подписка есть, показываем примеры
-    markup = build_categories_keyboard(0, user_language)
-    text = "🎬 <b>Готовые идеи для создания вирусных видео!</b>\n\n<b>Как использовать:</b>\n1️⃣ Выбери понравившийся пример\n2️⃣ Скопируй текст\n3️⃣ Вставь в бот и создай видео!\nИли измени под свою идею 💡\n\n<b>Кнопки с разделами и примерами 👇</b>"
+    markup = examples_view.categories_page(0, user_language)
+    text = EXAMPLES_INTRO_TEXT
     await message.answer(text, reply_markup=markup, parse_mode="HTML")
 
 async def send_foreign_tariffs(message: types.Message, user_language: str):
@@ -1109,15 +1481,7 @@ async def send_foreign_tariffs(message: types.Message, user_language: str):
     premium_name = get_text(user_language, 'foreign_premium')
     videos_word = get_text(user_language, 'videos')
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=f"🌱 {trial_name} — 3 {videos_word} — €5", url="https://web.tribute.tg/p/lEw")],
-        [InlineKeyboardButton(text=f"✨ {basic_name} — 10 {videos_word} — €12", url="https://web.tribute.tg/p/lEu")],
-        [InlineKeyboardButton(text=f"💎 {premium_name} — 30 {videos_word} — €25", url="https://web.tribute.tg/p/lEv")],
-        [InlineKeyboardButton(
-            text=get_text(user_language, "btn_main_menu"),
-            callback_data="main_menu"
-        )]
-    ])
+    keyboard = foreign_tariffs_keyboard(user_language)
     
     text = (
         f"{get_text(user_language, 'foreign_card_title')}\n\n"
@@ -1133,11 +1497,11 @@ async def send_foreign_tariffs(message: types.Message, user_language: str):
         parse_mode="HTML"
     )
 
-async def handle_profile(message: types.Message, user_language: str):
+async def handle_profile(message: types.Message, user_language: str, user_ctx: UserContext):
     """Обработка команды /profile"""
     try:
         user_id = message.from_user.id
-        user = await get_user(user_id)
+        user = await user_ctx.get()
         
         if not user:
             await message.answer(get_text(user_language, "error_getting_data"))
@@ -1172,16 +1536,17 @@ async def handle_profile(message: types.Message, user_language: str):
         fallback_text = f"💰 <b>Profile</b>\n\n👤 Name: <b>{safe_name}</b>\n📦 Plan: <b>{user.get('plan_name', 'Unknown')}</b>\n🎞 Videos left: <b>{user.get('videos_left', 0)}</b>\n📅 Registration: <b>{date_str}</b>"
         await message.answer(fallback_text, parse_mode="HTML")
 
-async def handle_video_description(message: types.Message, user_language: str):
+async def handle_video_description(message: types.Message, user_language: str, user_ctx: UserContext):
     """Обработка описания видео - показывает подтверждение"""
     user_id = message.from_user.id
     text = message.text.strip()
-    orientation = user_waiting_for_video_orientation.get(user_id)
+    session = sessions.session(user_id)
+    orientation = session.orientation
     
     logging.info(f"🎬 User {user_id} sent video description: {text[:50]}... (orientation: {orientation})")
     
     # Получаем данные пользователя
-    user = await get_user(user_id)
+    user = await user_ctx.get()
     if not user:
         await message.answer(get_text(user_language, "error_restart"))
         return
@@ -1195,7 +1560,7 @@ async def handle_video_description(message: types.Message, user_language: str):
         return
     
     # Сохраняем запрос пользователя для подтверждения
-    user_video_requests[user_id] = {
+    session.video_request = {
         'description': text,
         'orientation': orientation
     }
@@ -1216,48 +1581,86 @@ async def handle_video_description(message: types.Message, user_language: str):
         parse_mode="HTML"
     )
     # Сохраняем ID сообщения подтверждения
-    user_confirmation_messages[user_id] = confirmation_msg.message_id
+    session.confirmation_message_id = confirmation_msg.message_id
 
-async def create_video(message: types.Message, user_id: int, description: str, orientation: str, user_language: str):
+async def create_video(message: types.Message, user_id: int, description: str, orientation: str, user_language: str, user_ctx: UserContext):
     """Создание видео после подтверждения"""
     logging.info(f"🎬 Starting video creation for user {user_id}: {description[:50]}... (orientation: {orientation})")
     
     # Получаем данные пользователя
-    user = await get_user(user_id)
+    user = await user_ctx.get()
     if not user:
         await message.answer(get_text(user_language, "error_restart"))
         return
     
-    # Сразу отправляем сообщение о создании видео
-    creating_msg = await message.answer(
-        get_text(user_language, "video_creating")
-    )
+    # Провайдер недоступен (breaker разомкнут) — отказываем до списания видео
+    if not is_kie_available():
+        await message.answer(get_text(user_language, "sora_unavailable", retry_after=kie_retry_after()))
+        return
     
-    # Уменьшаем количество видео ТОЛЬКО после успешного начала процесса
-    await update_user_videos(user_id, user['videos_left'] - 1)
+    # Атомарно списываем видео: повторное нажатие не уведёт баланс в минус
+    videos_left = await reserve_video(user_id)
+    if videos_left is None:
+        await message.answer(
+            get_text(user_language, "no_videos_left"),
+            reply_markup=tariff_selection(user_language)
+        )
+        return
     
+    creating_msg = None
     try:
+        # Сразу отправляем сообщение о создании видео
+        creating_msg = await message.answer(
+            get_text(user_language, "video_creating")
+        )
+        
         # Определяем aspect_ratio для KIE.AI
         aspect_ratio = "portrait" if orientation == "vertical" else "landscape"
         
-        # Создаем задачу через KIE.AI Sora-2 API
-        task_id, status = await create_sora_task(
+        # Ставим задачу в очередь отправки в KIE.AI Sora-2 API
+        ticket = sora_scheduler.submit(
             prompt=description, 
             aspect_ratio=aspect_ratio, 
             user_id=user_id
         )
         
+        if ticket.queued:
+            # Очередь занята: показываем позицию и дожидаемся отправки в фоне, не блокируя хендлер
+            await creating_msg.edit_text(
+                get_text(user_language, "video_queued", position=ticket.position, eta=ticket.eta)
+            )
+            spawn_background(finish_video_submission(message, ticket, creating_msg, user_id, description, user_language, videos_left))
+            return
+    except Exception as e:
+        await fail_video_submission(message, e, creating_msg, user_id, user_language, videos_left)
+        return
+    
+    await finish_video_submission(message, ticket, creating_msg, user_id, description, user_language, videos_left)
+    
+    # НЕ очищаем состояние - пользователь может создавать новые видео
+
+async def finish_video_submission(message: types.Message, ticket, creating_msg: types.Message, user_id: int, description: str, user_language: str, videos_left: int):
+    """Дождаться ответа KIE.AI по заявке из очереди и сообщить пользователю"""
+    try:
+        task_id, status = await ticket.result()
+        
         if task_id and status == "success":
+            # Сохраняем задачу: callback найдёт пользователя по task_id
+            await save_sora_task(task_id, user_id, description, ticket.kwargs["aspect_ratio"])
+            
             # Удаляем предыдущие сообщения (промпт и подтверждение)
+            session = sessions.get(user_id)
             try:
-                if user_id in user_prompt_messages:
-                    await bot.delete_message(user_id, user_prompt_messages[user_id])
-                    del user_prompt_messages[user_id]
-                if user_id in user_confirmation_messages:
-                    await bot.delete_message(user_id, user_confirmation_messages[user_id])
-                    del user_confirmation_messages[user_id]
+                if session and session.prompt_message_id:
+                    await bot.delete_message(user_id, session.prompt_message_id)
+                    session.prompt_message_id = None
+                if session and session.confirmation_message_id:
+                    await bot.delete_message(user_id, session.confirmation_message_id)
+                    session.confirmation_message_id = None
             except Exception as e:
                 logging.warning(f"⚠️ Failed to delete previous messages for user {user_id}: {e}")
+            # Заявка могла ждать в очереди дольше апдейта: сохраняем сессию сами
+            await sessions.flush(user_id)
             
             # Успешно отправлено в KIE.AI
             task_msg = await creating_msg.edit_text(
@@ -1265,7 +1668,7 @@ async def create_video(message: types.Message, user_id: int, description: str, o
                 parse_mode="HTML"
             )
             # Сохраняем ID сообщения для последующего удаления
-            user_task_messages[user_id] = task_msg.message_id
+            await set_sora_task_message(task_id, task_msg.message_id)
             logging.info(f"✅ Sora task created for user {user_id}: {task_id}")
         else:
             # Ошибка или demo режим
@@ -1274,49 +1677,54 @@ async def create_video(message: types.Message, user_id: int, description: str, o
                 await asyncio.sleep(3)
                 await creating_msg.edit_text(
                     "🎬 <b>Демо режим</b>\n\n⚠️ KIE.AI API не настроен\n🔄 В реальной версии здесь будет ваше видео\n\n" +
-                    get_text(user_language, "video_ready", videos_left=user['videos_left'] - 1)
+                    get_text(user_language, "video_ready", videos_left=videos_left)
                 )
             else:
                 # Ошибка создания - возвращаем видео обратно
-                await update_user_videos(user_id, user['videos_left'])
+                refunded = await refund_video(user_id)
+                if refunded is not None:
+                    videos_left = refunded
                 
                 await creating_msg.edit_text(
-                    get_text(user_language, "video_error", videos_left=user['videos_left'])
+                    get_text(user_language, "video_error", videos_left=videos_left)
                 )
                 
     except Exception as e:
-        logging.error(f"❌ Critical error in create_video: {e}")
-        
-        # Возвращаем видео обратно при любой критической ошибке
-        try:
-            await update_user_videos(user_id, user['videos_left'])
-            logging.info(f"✅ Returned video to user {user_id} due to critical error")
-        except Exception as db_error:
-            logging.error(f"❌ Failed to return video to user {user_id}: {db_error}")
-        
-        # Пытаемся отправить сообщение об ошибке
+        await fail_video_submission(message, e, creating_msg, user_id, user_language, videos_left)
+
+async def fail_video_submission(message: types.Message, error: Exception, creating_msg, user_id: int, user_language: str, videos_left: int):
+    """Возврат видео и сообщение об ошибке при сбое создания"""
+    logging.error(f"❌ Critical error in create_video: {error}")
+    
+    # Возвращаем видео обратно при любой критической ошибке
+    refunded = await refund_video(user_id)
+    if refunded is not None:
+        videos_left = refunded
+        logging.info(f"✅ Returned video to user {user_id} due to critical error")
+    else:
+        logging.error(f"❌ Failed to return video to user {user_id}")
+    
+    # Пытаемся отправить сообщение об ошибке
+    try:
+        await creating_msg.edit_text(
+            get_text(user_language, "video_error", videos_left=videos_left)
+        )
+    except Exception as msg_error:
+        logging.error(f"❌ Failed to send error message: {msg_error}")
+        # Последняя попытка - простое сообщение
         try:
-            await creating_msg.edit_text(
-                get_text(user_language, "video_error", videos_left=user['videos_left'])
+            await message.answer(
+                f"❌ Произошла ошибка при создании видео. Видео возвращено на баланс.\n\n🎞 Осталось видео: {videos_left}"
             )
-        except Exception as msg_error:
-            logging.error(f"❌ Failed to send error message: {msg_error}")
-            # Последняя попытка - простое сообщение
-            try:
-                await message.answer(
-                    f"❌ Произошла ошибка при создании видео. Видео возвращено на баланс.\n\n🎞 Осталось видео: {user['videos_left']}"
-                )
-            except:
-                logging.error("❌ Complete failure to notify user about error")
-    
-    # НЕ очищаем состояние - пользователь может создавать новые видео
+        except:
+            logging.error("❌ Complete failure to notify user about error")
 
 async def cmd_help(message: types.Message, user_language: str):
     """Обработка команды /help"""
     user_id = message.from_user.id
     logging.info(f"🆘 User {user_id} clicked Help button. Adding to support queue.")
-    user_waiting_for_support.add(user_id)
-    logging.info(f"🆘 Users waiting for support: {user_waiting_for_support}")
+    sessions.session(user_id).waiting_for_support = True
+    logging.info(f"🆘 User {user_id} is waiting for support")
     await message.answer(
         get_text(user_language, "help_text"),
         reply_markup=main_menu(user_language),
@@ -1478,11 +1886,55 @@ async def handle_foreign_payment(callback: types.CallbackQuery, user_language: s
     await callback.answer()
 
 # === WEBHOOK HANDLERS ===
+async def process_update(update: types.Update):
+    """Обработка апдейта воркером пула"""
+    await dp.feed_update(bot, update)
+
+def update_key(update: types.Update):
+    """Ключ упорядочивания: апдейты одного пользователя (чата) идут строго по очереди"""
+    try:
+        event = update.event
+    except Exception:
+        return ("update", update.update_id)
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(event, "chat", None)
+    if chat is not None:
+        return chat.id
+    # Апдейты без отправителя не упорядочиваем
+    return ("update", update.update_id)
+
+def callback_tap_key(update: types.Update):
+    """Повторное нажатие той же inline-кнопки на том же сообщении"""
+    callback = update.callback_query
+    if callback is None or callback.message is None:
+        return None
+    return (callback.message.message_id, callback.data)
+
+# Апдейты из вебхука обрабатываются в фоне ограниченным числом воркеров:
+# по порядку для одного пользователя, параллельно для разных
+update_pool = UpdatePool(
+    process_update,
+    key=update_key,
+    dedupe=callback_tap_key,
+    workers=UPDATE_WORKERS,
+    maxsize=UPDATE_QUEUE_SIZE,
+    per_key_limit=UPDATE_PER_CHAT_LIMIT
+)
+
 async def handle_webhook(request):
     """Обработчик webhook от Telegram"""
     try:
         data = await request.json()
         update = types.Update(**data)
+        if WEBHOOK_ASYNC:
+            # Сразу отвечаем Telegram, обработка идёт в пуле воркеров
+            if not update_pool.submit(update):
+                # Очередь переполнена: Telegram повторит доставку позже
+                logging.warning(f"⚠️ Update queue is full, rejecting update {update.update_id}")
+                return web.Response(status=503)
+            return web.Response()
         await dp.feed_update(bot, update)
         return web.Response()
     except KeyError as e:
@@ -1496,6 +1948,59 @@ async def health(request):
     """Health check для Railway"""
     return web.Response(text="OK")
 
+async def metrics(request):
+    """Внутренние метрики бота (кэши, очереди)"""
+    return web.json_response({
+        "user_cache": user_cache.stats(),
+        "user_cache_sync": user_cache_bus.stats() if user_cache_bus else None,
+        "sessions": sessions.stats(),
+        "sora_tasks_24h": await get_sora_task_stats(),
+        "payment_inbox": await payment_worker.stats(),
+        "outbox": await outbox_sender.stats(),
+        "broadcast": broadcast_runner.stats(),
+        "http": http_client.stats(),
+        "sora_queue": sora_scheduler.stats(),
+        "kie": sora_client.resilience_stats(),
+        "updates": update_pool.stats(),
+        "outbound": outbound.stats(),
+        "callbacks": callbacks.stats(),
+        "keyboards": keyboard_cache_stats(),
+        "examples": examples_stats(),
+        "examples_view": examples_view.stats(),
+        "examples_search": examples_search.stats(),
+        "examples_inline": examples_inline.stats(),
+    })
+
+# Соответствие товаров Tribute и количества видео
+# Настоящие product_id из ссылок Tribute: https://web.tribute.tg/p/lEw
+# Но Tribute отправляет числовые ID в webhook'ах
+TRIBUTE_PRODUCT_VIDEOS = {
+    "lEw": 3,   # Trial ($5) - https://web.tribute.tg/p/lEw
+    "lEu": 10,  # Basic ($12) - https://web.tribute.tg/p/lEu  
+    "lEv": 30,  # Premium ($25) - https://web.tribute.tg/p/lEv
+    "83236": 3, # Trial (числовой ID из webhook)
+    "83237": 10, # Basic (предполагаемый числовой ID)
+    "83238": 30  # Premium (предполагаемый числовой ID)
+}
+
+# События, которые сохраняются в payment_inbox и применяются воркером
+TRIBUTE_DONATION_EVENTS = ("new_donation", "recurrent_donation")
+TRIBUTE_SUBSCRIPTION_EVENTS = ("new_digital_product", "cancelled_subscription")
+
+async def accept_payment_event(provider: str, event_id: str, event_type: str, payload: dict):
+    """Запись события в payment_inbox и мгновенный ответ провайдеру"""
+    if not db_pool:
+        logging.error(f"❌ Database not available, {provider} event {event_id} will be retried by provider")
+        return web.Response(text="Error", status=500)
+    
+    is_new = await payment_inbox.store_event(db_pool, provider, event_id, event_type, payload)
+    if is_new:
+        payment_worker.wake()
+        logging.info(f"💳 {provider} event {event_id} ({event_type}) queued")
+    else:
+        logging.info(f"ℹ️ {provider} event {event_id} already received, skipping duplicate")
+    return web.Response(text="OK")
+
 async def yookassa_webhook(request):
     """Обработчик webhook от YooKassa"""
     try:
@@ -1503,42 +2008,19 @@ async def yookassa_webhook(request):
         raw_data = await request.text()
         logging.info(f"💳 YooKassa webhook received: {raw_data}")
         
-        data = await request.json()
-        logging.info(f"💳 YooKassa webhook parsed data: {data}")
+        data = json.loads(raw_data)
         
         # Проверяем тип события
         event_type = data.get('event')
         logging.info(f"💳 YooKassa event type: {event_type}")
         
-        if event_type == 'payment.succeeded':
-            payment_data = data.get('object', {})
-            logging.info(f"💳 Payment data: {payment_data}")
-            
-            # Получаем метаданные
-            metadata = payment_data.get('metadata', {})
-            user_id = int(metadata.get('user_id'))
-            tariff = metadata.get('tariff')
-            videos_count = int(metadata.get('videos_count'))
-            amount = payment_data.get('amount', {}).get('value')
-            
-            logging.info(f"💳 Processing payment for user {user_id}, tariff {tariff}, videos {videos_count}, amount {amount}")
-            
-            # Обновляем тариф пользователя
-            tariff_name = tariff_names.get(tariff, tariff)
-            success = await update_user_tariff(user_id, tariff_name, videos_count, int(float(amount)))
-            logging.info(f"💳 User tariff update result: {success}")
-            
-            # Отправляем уведомление пользователю
-            try:
-                success_text = f"✅ <b>Оплата прошла успешно!</b>\n\n🎬 Тариф: <b>{tariff_name}</b>\n🎞 Видео: <b>{videos_count}</b>\n💰 Сумма: <b>{amount} ₽</b>\n\n🎉 Теперь вы можете создавать видео!"
-                await bot.send_message(user_id, success_text)
-                logging.info(f"💳 Success message sent to user {user_id}")
-            except Exception as e:
-                logging.error(f"❌ Error sending success message to user {user_id}: {e}")
-        else:
+        if event_type != 'payment.succeeded':
             logging.info(f"💳 YooKassa event {event_type} ignored")
+            return web.Response(text="OK")
         
-        return web.Response(text="OK")
+        payment_id = data.get('object', {}).get('id')
+        event_id = f"{event_type}:{payment_id}" if payment_id else payment_inbox.payload_event_id(raw_data)
+        return await accept_payment_event("yookassa", event_id, event_type, data)
         
     except Exception as e:
         logging.error(f"❌ Error in YooKassa webhook: {e}")
@@ -1549,49 +2031,18 @@ async def yookassa_webhook(request):
 async def tribute_webhook(request):
     """Обработчик webhook от Tribute для донатов"""
     try:
-        data = await request.json()
+        raw_data = await request.text()
+        data = json.loads(raw_data)
         logging.info(f"🎬 Tribute donation webhook received: {data}")
         
         # Проверяем тип события согласно документации Tribute
         event_name = data.get('name')
-        payload = data.get('payload', {})
-        
-        if event_name == 'new_donation':
-            # Новый донат - активируем тариф
-            telegram_user_id = payload.get('telegram_user_id')
-            amount = payload.get('amount', 0)
-            
-            if telegram_user_id:
-                # Активируем тариф (50 видео за $10)
-                videos_to_add = 50
-                await update_user_videos(telegram_user_id, videos_to_add)
-                
-                # Отправляем подтверждение пользователю
-                try:
-                    await bot.send_message(
-                        telegram_user_id,
-                        f"🎉 <b>Оплата прошла успешно!</b>\n\n✅ Тариф активирован\n🎬 Видео на балансе: {videos_to_add}\n\nСпасибо за покупку!"
-                    )
-                    logging.info(f"✅ Tribute donation processed for user {telegram_user_id}")
-                except Exception as e:
-                    logging.error(f"❌ Error sending success message to user {telegram_user_id}: {e}")
-        
-        elif event_name == 'recurrent_donation':
-            # Регулярный донат
-            telegram_user_id = payload.get('telegram_user_id')
-            if telegram_user_id:
-                videos_to_add = 50
-                await update_user_videos(telegram_user_id, videos_to_add)
-                
-                try:
-                    await bot.send_message(
-                        telegram_user_id,
-                        f"🔄 <b>Регулярный платеж обработан!</b>\n\n✅ Добавлено видео: {videos_to_add}\n\nСпасибо за поддержку!"
-                    )
-                except Exception as e:
-                    logging.error(f"❌ Error sending recurrent payment message to user {telegram_user_id}: {e}")
+        if event_name not in TRIBUTE_DONATION_EVENTS:
+            return web.Response(text="OK")
         
-        return web.Response(text="OK")
+        return await accept_payment_event(
+            "tribute_donation", payment_inbox.payload_event_id(raw_data), event_name, data
+        )
         
     except Exception as e:
         logging.error(f"❌ Error in Tribute donation webhook: {e}")
@@ -1613,90 +2064,23 @@ async def tribute_subscription_webhook(request):
         raw_data = await request.text()
         logging.info(f"📝 Tribute webhook raw data: {raw_data}")
         
-        data = await request.json()
+        data = json.loads(raw_data)
         signature = request.headers.get("trbt-signature")
-        logging.info(f"🎬 Tribute webhook received: {data}")
         logging.info(f"🧾 Tribute signature: {signature}")
         
-        # Детальное логирование webhook-пакета
-        import json
-        logging.info("📩 Tribute webhook received (raw): %s", json.dumps(data, indent=2, ensure_ascii=False))
-
         event_name = data.get("name")
         payload = data.get("payload", {})
-        metadata = payload.get("metadata", {})
 
         logging.info(f"🎯 Event: {event_name}, payload: {payload}")
 
-        # Соответствие товаров Tribute и количества видео
-        # Настоящие product_id из ссылок Tribute: https://web.tribute.tg/p/lEw
-        # Но Tribute отправляет числовые ID в webhook'ах
-        product_map = {
-            "lEw": 3,   # Trial ($5) - https://web.tribute.tg/p/lEw
-            "lEu": 10,  # Basic ($12) - https://web.tribute.tg/p/lEu  
-            "lEv": 30,  # Premium ($25) - https://web.tribute.tg/p/lEv
-            "83236": 3, # Trial (числовой ID из webhook)
-            "83237": 10, # Basic (предполагаемый числовой ID)
-            "83238": 30  # Premium (предполагаемый числовой ID)
-        }
-
-        # Обрабатываем события от Tribute
-        if event_name == "new_digital_product":
-            # Обработка цифровых товаров (ваши тарифы)
-            telegram_user_id = payload.get("telegram_user_id")
-            product_id = payload.get("product_id")
-            
-            logging.info(f"🔍 Digital product purchase: user_id={telegram_user_id}, product_id={product_id}")
-            
-            if not telegram_user_id:
+        if event_name in TRIBUTE_SUBSCRIPTION_EVENTS:
+            if event_name == "new_digital_product" and not payload.get("telegram_user_id"):
                 logging.error("❌ Missing telegram_user_id in payload")
                 return web.Response(text="Missing user", status=400)
-
-            # Получаем данные для fallback-логики
-            product_name = payload.get("product_name", "").lower().strip()
-            amount = payload.get("amount", 0)
             
-            # Основная карта по product_id
-            videos_count = product_map.get(product_id)
-            
-            # Fallback по названию продукта
-            if not videos_count and product_name:
-                if "trial" in product_name or "test" in product_name or "пробный" in product_name:
-                    videos_count = 3
-                elif "basic" in product_name or "базовый" in product_name:
-                    videos_count = 10
-                elif "premium" in product_name or "maximum" in product_name or "премиум" in product_name:
-                    videos_count = 30
-            
-            # Fallback по сумме (если название пустое)
-            if not videos_count and amount > 0:
-                if amount == 500:  # $5 = Trial
-                    videos_count = 3
-                elif amount == 1200:  # $12 = Basic
-                    videos_count = 10
-                elif amount == 2500:  # $25 = Premium
-                    videos_count = 30
-            
-            if videos_count:
-                # Добавляем видео к балансу пользователя
-                success = await add_user_videos(telegram_user_id, videos_count)
-                if success:
-                    try:
-                        await bot.send_message(
-                            telegram_user_id,
-                            f"✅ <b>Your plan is activated!</b> {videos_count} videos added to your balance 🎬"
-                        )
-                        logging.info(f"✅ Tribute digital product activated for user {telegram_user_id} - {videos_count} videos")
-                    except Exception as e:
-                        logging.error(f"❌ Error sending confirmation: {e}")
-                else:
-                    logging.error(f"❌ Failed to add videos to user {telegram_user_id}")
-            else:
-                # Если всё ещё неизвестно — логируем все параметры
-                logging.warning(f"⚠️ Unknown product_id: {product_id}, name: '{product_name}', amount: {amount}")
-                logging.info(f"📋 Full payload for debugging: {payload}")
-                logging.info(f"🔍 Available product_ids in map: {list(product_map.keys())}")
-                logging.info(f"💰 Amount-based fallback: 500→3, 1200→10, 2500→30")
+            return await accept_payment_event(
+                "tribute", payment_inbox.payload_event_id(raw_data), event_name, data
+            )
                 
         elif event_name == "new_subscription":
             # Обработка подписок (если будете использовать)
@@ -1712,18 +2096,6 @@ async def tribute_subscription_webhook(request):
             logging.info(f"🔍 Donation received: user_id={telegram_user_id}")
             # Здесь можно добавить логику для донатов
             
-        elif event_name == "cancelled_subscription":
-            telegram_user_id = payload.get("telegram_user_id")
-            if telegram_user_id:
-                try:
-                    await bot.send_message(
-                        telegram_user_id,
-                        "❌ <b>Subscription cancelled</b>\n\n"
-                        "Your subscription has been cancelled, but remaining videos will stay until the end of this month."
-                    )
-                    logging.info(f"✅ Subscription cancelled for user {telegram_user_id}")
-                except Exception as e:
-                    logging.error(f"❌ Error sending cancellation: {e}")
         else:
             logging.info(f"ℹ️ Event {event_name} not handled")
 
@@ -1735,34 +2107,237 @@ async def tribute_subscription_webhook(request):
         logging.error(traceback.format_exc())
         return web.Response(text="Error", status=500)
 
+# === PAYMENT EVENTS ===
+# Применение событий из payment_inbox. Вызывается воркером внутри транзакции:
+# все изменения баланса идут через переданное соединение
+
+async def apply_yookassa_event(conn, data: dict):
+    """Зачисление успешной оплаты YooKassa"""
+    payment_data = data.get('object', {})
+    
+    # Получаем метаданные
+    metadata = payment_data.get('metadata', {})
+    user_id = int(metadata.get('user_id'))
+    tariff = metadata.get('tariff')
+    videos_count = int(metadata.get('videos_count'))
+    amount = payment_data.get('amount', {}).get('value')
+    
+    logging.info(f"💳 Processing payment for user {user_id}, tariff {tariff}, videos {videos_count}, amount {amount}")
+    
+    # Обновляем тариф пользователя
+    tariff_name = tariff_names.get(tariff, tariff)
+    row = await queries.fetchrow(conn, "apply_tariff", user_id, tariff_name, videos_count, int(float(amount)))
+    if row is None:
+        logging.error(f"❌ User {user_id} not found in database")
+        return []
+    
+    logging.info(f"✅ Updated user {user_id} tariff to {tariff_name}: +{videos_count} = {row['videos_left']} videos")
+    success_text = f"✅ <b>Оплата прошла успешно!</b>\n\n🎬 Тариф: <b>{tariff_name}</b>\n🎞 Видео: <b>{videos_count}</b>\n💰 Сумма: <b>{amount} ₽</b>\n\n🎉 Теперь вы можете создавать видео!"
+    return [(user_id, success_text)]
+
+async def apply_tribute_donation_event(conn, data: dict):
+    """Активация тарифа по донату Tribute"""
+    event_name = data.get('name')
+    payload = data.get('payload', {})
+    telegram_user_id = payload.get('telegram_user_id')
+    if not telegram_user_id:
+        return []
+    
+    # Активируем тариф (50 видео за $10)
+    videos_to_add = 50
+    await queries.fetchval(conn, "set_user_videos", telegram_user_id, videos_to_add)
+    logging.info(f"✅ Tribute donation processed for user {telegram_user_id}")
+    
+    if event_name == 'new_donation':
+        text = f"🎉 <b>Оплата прошла успешно!</b>\n\n✅ Тариф активирован\n🎬 Видео на балансе: {videos_to_add}\n\nСпасибо за покупку!"
+    else:
+        text = f"🔄 <b>Регулярный платеж обработан!</b>\n\n✅ Добавлено видео: {videos_to_add}\n\nСпасибо за поддержку!"
+    return [(telegram_user_id, text)]
+
+async def apply_tribute_event(conn, data: dict):
+    """Зачисление цифрового товара Tribute и уведомление об отмене подписки"""
+    event_name = data.get("name")
+    payload = data.get("payload", {})
+    telegram_user_id = payload.get("telegram_user_id")
+    
+    if event_name == "cancelled_subscription":
+        if not telegram_user_id:
+            return []
+        logging.info(f"✅ Subscription cancelled for user {telegram_user_id}")
+        return [(
+            telegram_user_id,
+            "❌ <b>Subscription cancelled</b>\n\n"
+            "Your subscription has been cancelled, but remaining videos will stay until the end of this month."
+        )]
+    
+    # Обработка цифровых товаров (ваши тарифы)
+    product_id = payload.get("product_id")
+    logging.info(f"🔍 Digital product purchase: user_id={telegram_user_id}, product_id={product_id}")
+    
+    # Получаем данные для fallback-логики
+    product_name = payload.get("product_name", "").lower().strip()
+    amount = payload.get("amount", 0)
+    
+    # Основная карта по product_id
+    videos_count = TRIBUTE_PRODUCT_VIDEOS.get(product_id)
+    
+    # Fallback по названию продукта
+    if not videos_count and product_name:
+        if "trial" in product_name or "test" in product_name or "пробный" in product_name:
+            videos_count = 3
+        elif "basic" in product_name or "базовый" in product_name:
+            videos_count = 10
+        elif "premium" in product_name or "maximum" in product_name or "премиум" in product_name:
+            videos_count = 30
+    
+    # Fallback по сумме (если название пустое)
+    if not videos_count and amount > 0:
+        if amount == 500:  # $5 = Trial
+            videos_count = 3
+        elif amount == 1200:  # $12 = Basic
+            videos_count = 10
+        elif amount == 2500:  # $25 = Premium
+            videos_count = 30
+    
+    if not videos_count:
+        # Если всё ещё неизвестно — логируем все параметры
+        logging.warning(f"⚠️ Unknown product_id: {product_id}, name: '{product_name}', amount: {amount}")
+        logging.info(f"📋 Full payload for debugging: {payload}")
+        logging.info(f"🔍 Available product_ids in map: {list(TRIBUTE_PRODUCT_VIDEOS.keys())}")
+        logging.info(f"💰 Amount-based fallback: 500→3, 1200→10, 2500→30")
+        return []
+    
+    # Добавляем видео к балансу пользователя
+    new_balance = await queries.fetchval(conn, "credit_videos", telegram_user_id, videos_count)
+    if new_balance is None:
+        logging.error(f"❌ Failed to add videos to user {telegram_user_id}")
+        return []
+    
+    logging.info(f"✅ Tribute digital product activated for user {telegram_user_id} - {videos_count} videos")
+    return [(telegram_user_id, f"✅ <b>Your plan is activated!</b> {videos_count} videos added to your balance 🎬")]
+
+async def send_payment_notifications(notifications):
+    """После применения платежа: сброс кэша; сами уведомления уже лежат в outbox"""
+    for user_id, _ in notifications:
+        _invalidate_user(user_id)
+    outbox_sender.wake()
+
+async def send_outbox_notification(chat_id: int, text: str):
+    """Доставка уведомления из outbox (подтверждения оплаты, возвраты) — вне очереди обычных ответов"""
+    with outbound_priority(PRIORITY_HIGH):
+        return await bot.send_message(chat_id, text, disable_web_page_preview=True)
+
+async def send_broadcast_message(chat_id: int, text: str):
+    """Сообщение рассылки — в нижней полосе: ответы пользователям идут первыми"""
+    with outbound_priority(PRIORITY_BULK):
+        return await bot.send_message(chat_id, text, disable_web_page_preview=True)
+
+async def report_broadcast(result: dict):
+    """Итог рассылки автору"""
+    if result.get("created_by"):
+        await bot.send_message(
+            result["created_by"],
+            f"✅ Рассылка #{result['id']} завершена за {result['seconds']} с\n\n"
+            f"Отправлено: {result['sent']}\nОшибок: {result['failed']}\nЗаблокировали бота: {result['blocked']}\n"
+            f"Скорость: {result['messages_per_second']} сообщений/с"
+        )
+
+broadcast_runner = broadcast.BroadcastRunner(
+    get_pool=lambda: db_pool,
+    send=send_broadcast_message,
+    rate=BROADCAST_RATE,
+    window=BROADCAST_WINDOW,
+    concurrency=BROADCAST_CONCURRENCY,
+    on_finish=report_broadcast
+)
+
+outbox_sender = outbox.OutboxSender(
+    get_pool=lambda: db_pool,
+    send=send_outbox_notification,
+    batch_size=OUTBOX_BATCH_SIZE,
+    max_attempts=OUTBOX_MAX_ATTEMPTS
+)
+
+payment_worker = payment_inbox.PaymentInboxWorker(
+    get_pool=lambda: db_pool,
+    handlers={
+        "yookassa": apply_yookassa_event,
+        "tribute_donation": apply_tribute_donation_event,
+        "tribute": apply_tribute_event,
+    },
+    notify=send_payment_notifications
+)
+
+async def resolve_sora_task(task_data: dict):
+    """
+    Определение пользователя задачи по callback. Возвращает (user_id, task_message_id, state):
+    claimed — задача захвачена этим запросом, untracked — задачи нет в sora_tasks,
+    done — уже обработана, busy — её сейчас обрабатывает другой запрос
+    """
+    task_id = task_data.get("taskId")
+    if task_id:
+        task = await claim_sora_task(task_id)
+        if task:
+            return task['user_id'], task['task_message_id'], "claimed"
+        existing = await get_sora_task(task_id)
+        if existing:
+            state = "busy" if existing['status'] in ("pending", "processing") else "done"
+            return None, None, state
+    
+    # Задачи, созданные до появления sora_tasks: ищем user_id в param
+    return extract_user_from_param(task_data.get("param", "")), None, "untracked"
+
+async def delete_sora_task_message(user_id: int, task_message_id):
+    """Удаление сообщения "Задача отправлена в Sora 2!" если есть"""
+    if not task_message_id:
+        return
+    try:
+        logging.info(f"🗑️ Deleting task message {task_message_id} for user {user_id}")
+        await bot.delete_message(user_id, task_message_id)
+    except Exception as e:
+        logging.warning(f"⚠️ Could not delete task message for user {user_id}: {e}")
+
 async def sora_callback(request):
     """Callback от Kie.AI Sora-2 — получение готового видео"""
+    # Доставка видео — в верхней полосе исходящих запросов (запрос обрабатывается в своей задаче)
+    set_outbound_priority(PRIORITY_HIGH)
+    task_id = None
+    claimed = False
     try:
         data = await request.json()
         logging.info(f"🎬 Sora callback received: {data}")
         
-        if data.get("code") == 200 and data["data"]["state"] == "success":
-            result_json = data["data"]["resultJson"]
-            param = data["data"].get("param", "")
-            user_id = extract_user_from_param(param)
+        task_data = data.get("data") or {}
+        task_id = task_data.get("taskId")
+        succeeded = data.get("code") == 200 and task_data.get("state") == "success"
+        
+        user_id, task_message_id, state = await resolve_sora_task(task_data)
+        if state == "done":
+            logging.info(f"ℹ️ Sora task {task_id} already processed, ignoring repeated callback")
+            return web.Response(text="OK")
+        if state == "busy":
+            # Задачу обрабатывает другой запрос: если он не справится, ответ на повтор будет уже по делу
+            logging.info(f"ℹ️ Sora task {task_id} is being processed, asking Kie.AI to retry later")
+            return web.Response(text="Busy", status=503)
+        claimed = state == "claimed"
+        
+        if succeeded:
+            result_json = task_data["resultJson"]
+            param = task_data.get("param", "")
             
             if user_id:
-                # Получаем данные пользователя для языка
-                user = await get_user(user_id)
-                user_language = user.get('language', 'en') if user else 'en'
+                # Для отправки видео нужен только язык пользователя
+                user_language = await get_user_language(user_id)
+                # Callback мог прийти на другую реплику: берём актуальную сессию
+                await sessions.load(user_id)
                 
                 video_urls = json.loads(result_json).get("resultUrls", [])
                 if video_urls:
                     # Удаляем сообщение "Задача отправлена в Sora 2!" если есть
-                    if user_id in user_task_messages:
-                        try:
-                            logging.info(f"🗑️ Deleting task message {user_task_messages[user_id]} for user {user_id}")
-                            await bot.delete_message(user_id, user_task_messages[user_id])
-                            del user_task_messages[user_id]
-                        except Exception as e:
-                            logging.warning(f"⚠️ Could not delete task message for user {user_id}: {e}")
+                    await delete_sora_task_message(user_id, task_message_id)
                     
                     # Отправляем видео пользователю
+                    video_msg = None
                     try:
                         logging.info(f"📹 Sending video to user {user_id}: {video_urls[0]}")
                         # Пробуем отправить видео напрямую по URL
@@ -1774,7 +2349,7 @@ async def sora_callback(request):
                             parse_mode="HTML"
                         )
                         # Сохраняем ID сообщения с видео
-                        user_video_messages[user_id] = video_msg.message_id
+                        sessions.session(user_id).video_message_id = video_msg.message_id
                         logging.info(f"✅ Video sent successfully to user {user_id}, message_id: {video_msg.message_id}")
                         
                         logging.info(f"✅ Video sent directly to user {user_id}: {video_urls[0]}")
@@ -1784,37 +2359,37 @@ async def sora_callback(request):
                         
                         # Пробуем скачать и отправить как файл
                         try:
-                            import aiohttp
                             import tempfile
                             import os
                             
-                            async with aiohttp.ClientSession() as session:
-                                async with session.get(video_urls[0]) as response:
-                                    if response.status == 200:
-                                        # Создаем временный файл
-                                        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_file:
-                                            temp_file.write(await response.read())
-                                            temp_file_path = temp_file.name
-                                        
-                                        # Отправляем как видео-файл
-                                        with open(temp_file_path, 'rb') as video_file:
-                                            video_msg = await bot.send_video(
-                                                user_id,
-                                                video=video_file,
-                                                caption="✨ Видео готово! Чтобы создать новое — просто отправьте запрос в чат.",
-                                                reply_markup=video_ready_keyboard(user_language),
-                                                parse_mode="HTML"
-                                            )
-                                            # Сохраняем ID сообщения с видео
-                                            user_video_messages[user_id] = video_msg.message_id
-                                        
-                                        # Удаляем временный файл
-                                        os.unlink(temp_file_path)
-                                        
-                                        logging.info(f"✅ Video downloaded and sent to user {user_id}")
-                                    else:
-                                        raise Exception(f"Failed to download video: HTTP {response.status}")
-                                        
+                            session = http_client.get_session()
+                            async with session.get(video_urls[0], timeout=http_client.timeout_for("download")) as response:
+                                if response.status == 200:
+                                    # Создаем временный файл и пишем видео частями, не держа его целиком в памяти
+                                    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as temp_file:
+                                        async for chunk in response.content.iter_chunked(64 * 1024):
+                                            temp_file.write(chunk)
+                                        temp_file_path = temp_file.name
+                                    
+                                    # Отправляем как видео-файл
+                                    with open(temp_file_path, 'rb') as video_file:
+                                        video_msg = await bot.send_video(
+                                            user_id,
+                                            video=video_file,
+                                            caption="✨ Видео готово! Чтобы создать новое — просто отправьте запрос в чат.",
+                                            reply_markup=video_ready_keyboard(user_language),
+                                            parse_mode="HTML"
+                                        )
+                                        # Сохраняем ID сообщения с видео
+                                        sessions.session(user_id).video_message_id = video_msg.message_id
+                                    
+                                    # Удаляем временный файл
+                                    os.unlink(temp_file_path)
+                                    
+                                    logging.info(f"✅ Video downloaded and sent to user {user_id}")
+                                else:
+                                    raise Exception(f"Failed to download video: HTTP {response.status}")
+                                    
                         except Exception as download_error:
                             logging.error(f"❌ Video download failed for user {user_id}: {download_error}")
                             
@@ -1827,36 +2402,30 @@ async def sora_callback(request):
                                     parse_mode="HTML"
                                 )
                                 # Сохраняем ID сообщения с видео
-                                user_video_messages[user_id] = video_msg.message_id
+                                sessions.session(user_id).video_message_id = video_msg.message_id
                                 logging.info(f"✅ Fallback link sent to user {user_id}")
                             except Exception as fallback_error:
                                 logging.error(f"❌ Fallback error: {fallback_error}")
                     
+                    if not video_msg:
+                        # Задача вернётся в pending, и повторный callback попробует доставить видео снова
+                        raise RuntimeError(f"video was not delivered to user {user_id}")
+                    if task_id:
+                        await set_sora_task_video_message(task_id, video_msg.message_id)
+                    await sessions.flush(user_id)
+                    
                     # Отправляем инструкцию и кнопку смены ориентации
                     try:
-                        # Получаем данные пользователя для показа остатка видео
-                        user = await get_user(user_id)
-                        user_language = user.get('language', 'en') if user else 'en'
-                        videos_left = user.get('videos_left', 0) if user else 0
-                        
                         # Получаем ориентацию пользователя
-                        orientation = user_waiting_for_video_orientation.get(user_id, 'vertical')
+                        user_session = sessions.get(user_id)
+                        orientation = user_session.orientation if user_session and user_session.orientation else 'vertical'
                         
                         # Сообщение с промптом для создания нового видео
                         orientation_name = get_text(user_language, f"orientation_{orientation}_name")
-                        instruction_text = get_text(user_language, "orientation_selected").format(orientation=orientation_name)
+                        instruction_text = get_text(user_language, "orientation_selected", orientation=orientation_name)
                         
                         # Кнопка смены ориентации (с переводом)
-                        orientation_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                            [InlineKeyboardButton(
-                                text=get_text(user_language, 'btn_change_orientation'),
-                                callback_data="change_orientation"
-                            )],
-                            [InlineKeyboardButton(
-                                text=get_text(user_language, "btn_main_menu"),
-                                callback_data="main_menu"
-                            )]
-                        ])
+                        orientation_keyboard = change_orientation_keyboard(user_language)
                         
                         await bot.send_message(
                             user_id,
@@ -1873,54 +2442,47 @@ async def sora_callback(request):
                     logging.error(f"❌ No video URLs in result: {result_json}")
             else:
                 logging.error(f"❌ Could not extract user_id from param: {param}")
+            
+            if claimed:
+                await finish_sora_task(task_id, "success")
         else:
             # Обработка ошибок от Sora 2
             logging.warning(f"🎬 Sora callback error: {data}")
             
-            # Пытаемся извлечь user_id из param
-            param = data.get("data", {}).get("param", "")
-            user_id = extract_user_from_param(param)
-            
             if user_id:
                 # Возвращаем видео на баланс
-                try:
-                    user = await get_user(user_id)
-                    if user:
-                        current_videos = user.get('videos_left', 0)
-                        await add_user_videos(user_id, 1)  # Возвращаем 1 видео
-                        user_language = user.get('language', 'en')
-                        videos_left = current_videos + 1
-                        
-                        # Удаляем сообщение "Задача отправлена в Sora 2!" если есть
-                        if user_id in user_task_messages:
-                            try:
-                                await bot.delete_message(user_id, user_task_messages[user_id])
-                                del user_task_messages[user_id]
-                            except Exception as e:
-                                logging.warning(f"⚠️ Could not delete task message for user {user_id}: {e}")
-                        
-                        # Отправляем сообщение об ошибке (с переводами)
-                        error_message = (
-                            f"{get_text(user_language, 'sora_error_title')}\n\n"
-                            f"{get_text(user_language, 'sora_error_rules')}\n\n"
-                            f"{get_text(user_language, 'sora_error_refund', videos_left=videos_left)}"
-                        )
-                        
-                        await bot.send_message(
-                            user_id,
-                            error_message,
-                            parse_mode="HTML",
-                            disable_web_page_preview=True
-                        )
-                        
-                        logging.info(f"✅ Error message sent to user {user_id}, video returned to balance")
-                except Exception as e:
-                    logging.error(f"❌ Error handling Sora error for user {user_id}: {e}")
+                user = await get_user(user_id)
+                if not user:
+                    raise RuntimeError(f"user {user_id} not found, video was not refunded")
+                user_language = user.get('language', 'en')
+                
+                # Сообщение об ошибке (с переводами) с актуальным балансом после возврата
+                def render_error_message(videos_left):
+                    return (
+                        f"{get_text(user_language, 'sora_error_title')}\n\n"
+                        f"{get_text(user_language, 'sora_error_rules')}\n\n"
+                        f"{get_text(user_language, 'sora_error_refund', videos_left=videos_left)}"
+                    )
+                
+                # Возвращаем 1 видео; уведомление и статус failed пишутся в той же транзакции
+                refunded = await refund_video_with_notice(
+                    user_id, render_error_message, task_id=task_id if claimed else None
+                )
+                if refunded is None:
+                    # Без возврата не сообщаем о нём: Kie.AI повторит callback
+                    raise RuntimeError(f"video refund for user {user_id} failed")
+                
+                # Удаляем сообщение "Задача отправлена в Sora 2!" если есть
+                await delete_sora_task_message(user_id, task_message_id)
+                
+                logging.info(f"✅ Error notice queued for user {user_id}, video returned to balance")
             
         return web.Response(text="OK")
         
     except Exception as e:
         logging.error(f"❌ Error in sora_callback: {e}")
+        if claimed:
+            await release_sora_task(task_id)
         return web.Response(text="Error", status=500)
 
 # === WEB APPLICATION ===
@@ -1937,102 +2499,109 @@ def create_app():
     app.router.add_post("/webhook/tribute", tribute_subscription_webhook)  # Альтернативный маршрут для Tribute
     app.router.add_post("/sora_callback", sora_callback)  # Callback от Kie.AI Sora-2
     app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics)
     
     return app
 
 # === EXAMPLES SYSTEM FUNCTIONS ===
 
-def build_categories_keyboard(page: int = 0, language: str = 'ru'):
-    """Создает клавиатуру с пагинацией разделов (6+6+6+2)"""
-    categories = get_categories()
-    categories_per_page = [6, 6, 6, 2]  # 6+6+6+2 = 20 кнопок
-    total_pages = len(categories_per_page)
-    
-    # Определяем текущую страницу
-    if page >= total_pages:
-        page = 0
-    
-    # Создаем кнопки для текущей страницы
-    start_idx = sum(categories_per_page[:page])
-    end_idx = start_idx + categories_per_page[page]
-    page_categories = categories[start_idx:end_idx]
-    
-    keyboard = []
-    for category_key in page_categories:
-        category_name = get_category_name(category_key)
-        keyboard.append([InlineKeyboardButton(text=category_name, callback_data=f"category_{category_key}")])
-    
-    # Добавляем навигационные кнопки
-    nav_buttons = []
-    if page > 0 and page < total_pages - 1:
-        # Средние страницы: Назад + Еще
-        nav_buttons.append(InlineKeyboardButton(text="⏪ Назад", callback_data=f"catpage_{page-1}"))
-        nav_buttons.append(InlineKeyboardButton(text="⏩ Еще", callback_data=f"catpage_{page+1}"))
-    elif page > 0:
-        # Последняя страница: только Назад
-        nav_buttons.append(InlineKeyboardButton(text="⏪ Назад", callback_data=f"catpage_{page-1}"))
-    elif page < total_pages - 1:
-        # Первая страница: только Еще примеры
-        nav_buttons.append(InlineKeyboardButton(text="⏩ Еще примеры", callback_data=f"catpage_{page+1}"))
-    
-    if nav_buttons:
-        keyboard.append(nav_buttons)
-    
-    # Добавляем кнопку "Главное меню"
-    keyboard.append([InlineKeyboardButton(
-        text=get_text(language, "btn_main_menu"),
-        callback_data="main_menu"
-    )])
-    
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+# Страницы разделов и карточки примеров строятся один раз
+examples_view = ExamplesView(get_examples(), LANG)
+
+# Поисковый индекс по примерам для /search
+examples_search = ExamplesSearch(get_examples())
 
-async def show_categories(callback: types.CallbackQuery, page: int = 0):
+# Готовые inline-результаты для @bot <запрос>
+examples_inline = ExamplesInline(get_examples(), examples_search, page_size=INLINE_PAGE_SIZE, cache_ttl=INLINE_CACHE_TIME)
+
+@on_translations_reload
+def _rebuild_examples_view():
+    examples_view.build(get_examples())
+
+@on_examples_reload
+def _rebuild_examples_indexes(catalog: dict):
+    """Новый каталог: страницы, поисковый индекс и inline-результаты строятся заново"""
+    examples_view.build(catalog)
+    examples_search.build(catalog)
+    examples_inline.build(catalog)
+
+async def show_categories(callback: types.CallbackQuery, user_ctx: UserContext, page: int = 0):
     """Показать категории примеров с пагинацией"""
-    user = await get_user(callback.from_user.id)
-    user_language = user.get('language', 'ru') if user else 'ru'
-    markup = build_categories_keyboard(page, user_language)
-    text = "🎬 <b>Готовые идеи для создания вирусных видео!</b>\n\n<b>Как использовать:</b>\n1️⃣ Выбери понравившийся пример\n2️⃣ Скопируй текст\n3️⃣ Вставь в бот и создай видео!\nИли измени под свою идею 💡\n\n<b>Кнопки с разделами и примерами 👇</b>"
-    await callback.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
+    user_language = await user_ctx.language('ru')
+    markup = examples_view.categories_page(page, user_language)
+    await callback.message.edit_text(EXAMPLES_INTRO_TEXT, reply_markup=markup, parse_mode="HTML")
 
-async def show_example(callback: types.CallbackQuery, category_key: str, index: int):
+async def show_example(callback: types.CallbackQuery, user_ctx: UserContext, category_key: str, index: int):
     """Показать конкретный пример с навигацией"""
-    examples = get_examples_from_category(category_key)
-    if not examples:
-        await callback.message.edit_text("❌ В этом разделе пока нет примеров")
-        return
-        
-    # Проверяем индекс
-    if index >= len(examples) or index < 0:
-        index = 0
-        
-    example = examples[index]
-    category_name = get_category_name(category_key)
-    
     # Получаем язык пользователя
-    user = await get_user(callback.from_user.id)
-    user_language = user.get('language', 'ru') if user else 'ru'
-    
-    # Создаем навигационные кнопки
-    keyboard = [
-        [
-            InlineKeyboardButton(text="⏪ Назад", callback_data="example_prev"),
-            InlineKeyboardButton(text="▶️ Создать", callback_data="example_create_video"),
-            InlineKeyboardButton(text="⏩ Далее", callback_data="example_next")
-        ],
-        [InlineKeyboardButton(text="⏹️ Другой раздел", callback_data="example_back_to_categories")],
-        [InlineKeyboardButton(
-            text=get_text(user_language, "btn_main_menu"),
-            callback_data="main_menu"
-        )]
-    ]
+    user_language = await user_ctx.language('ru')
     
-    markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
-    
-    text = f"📚 <b>{category_name}</b>\n\n<b>{example['title']}</b>\n\n<code>{example['description']}</code>\n\n<i>{index + 1} из {len(examples)}</i>"
+    card = examples_view.card(category_key, index, user_language)
+    if card is None:
+        await callback.message.edit_text("❌ В этом разделе пока нет примеров")
+        return
     
+    text, markup, _ = card
     await callback.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
 
 # === MAIN FUNCTION ===
+def reload_content():
+    """SIGHUP: перечитать каталог примеров и переводы без перезапуска"""
+    logging.info("🔄 SIGHUP received, reloading content")
+    reload_examples()
+    try:
+        reload_translations()
+    except Exception as e:
+        logging.error(f"❌ Translations reload failed, keeping previous version: {e}")
+
+examples_watcher = None
+
+async def start_services():
+    """Запуск фоновых сервисов"""
+    global examples_watcher
+    # Клавиатуры для всех языков строим заранее
+    warm_keyboards()
+    # Общая HTTP-сессия для Kie.AI / Sora API
+    await http_client.start()
+    # Очередь отправки задач в KIE.AI
+    sora_scheduler.start()
+    # Воркеры апдейтов из вебхука
+    if TELEGRAM_MODE == "webhook" and WEBHOOK_ASYNC:
+        update_pool.start()
+    # Фоновая обработка платёжных событий из payment_inbox
+    payment_worker.start()
+    # Доставка уведомлений из outbox
+    outbox_sender.start()
+    # Массовые рассылки (в том числе прерванные перезапуском)
+    broadcast_runner.start()
+    # Сброс кэша пользователей по записям других реплик
+    if user_cache_bus and db_pool:
+        user_cache_bus.start()
+    # Горячая перезагрузка каталога примеров
+    if EXAMPLES_RELOAD_INTERVAL > 0:
+        examples_watcher = asyncio.create_task(watch_examples(EXAMPLES_RELOAD_INTERVAL))
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_content)
+    except (NotImplementedError, AttributeError, RuntimeError):
+        logging.warning("⚠️ SIGHUP reload is not supported on this platform")
+
+async def stop_services():
+    """Остановка фоновых сервисов и закрытие соединений"""
+    # Сначала дообрабатываем принятые апдейты: им ещё нужны БД и HTTP-сессия
+    await update_pool.stop()
+    if examples_watcher:
+        examples_watcher.cancel()
+    await payment_worker.stop()
+    await outbox_sender.stop()
+    await broadcast_runner.stop()
+    if user_cache_bus:
+        await user_cache_bus.stop()
+    await sora_scheduler.stop()
+    await outbound.stop()
+    await http_client.close()
+    if db_pool:
+        await db_pool.close()
+
 async def start_bot():
     """Запуск бота в webhook или polling режиме"""
     try:
@@ -2046,6 +2615,8 @@ async def start_bot():
         db_ready = await init_database()
         if not db_ready:
             logging.warning("⚠️ Database initialization failed, bot will continue with limited functionality")
+        
+        await start_services()
     except Exception as e:
         logging.error(f"❌ Error in start_bot initialization: {e}")
         raise
@@ -2054,7 +2625,11 @@ async def start_bot():
         if TELEGRAM_MODE == "webhook":
             # Webhook режим для Railway
             logging.info(f"🌐 Setting up webhook: {PUBLIC_URL}/webhook")
-            await bot.set_webhook(f"{PUBLIC_URL}/webhook")
+            await bot.set_webhook(
+                f"{PUBLIC_URL}/webhook",
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=dp.resolve_used_update_types()
+            )
             logging.info("✅ Webhook установлен")
             
             # Создаем веб-приложение
@@ -2073,21 +2648,19 @@ async def start_bot():
             try:
                 while True:
                     await asyncio.sleep(1)
-            except KeyboardInterrupt:
+            finally:
                 logging.info("🛑 Stopping bot...")
                 await runner.cleanup()
-                if db_pool:
-                    await db_pool.close()
+                await stop_services()
         else:
             # Polling режим для локальной разработки
             logging.info("🔄 Starting bot in polling mode")
             
             try:
                 await dp.start_polling(bot)
-            except KeyboardInterrupt:
+            finally:
                 logging.info("🛑 Stopping bot...")
-                if db_pool:
-                    await db_pool.close()
+                await stop_services()
     except Exception as e:
         logging.error(f"❌ Critical error in start_bot: {e}")
         logging.error(f"❌ Error type: {type(e).__name__}")
@@ -2096,25 +2669,32 @@ async def start_bot():
         raise
 
 
-async def handle_video_description_from_example(callback: types.CallbackQuery, description: str):
+async def handle_video_description_from_example(callback: types.CallbackQuery, description: str, user_ctx: UserContext):
     """Создать видео из примера"""
     user_id = callback.from_user.id
     
     # Проверяем пользователя и его видео
-    user = await get_user(user_id)
+    user = await user_ctx.get()
     if not user:
         await callback.message.edit_text("❌ Ошибка получения данных пользователя")
         return
     
     user_language = user.get('language', 'en')
     
-    # Проверяем количество видео
-    if user['videos_left'] <= 0:
+    # Провайдер недоступен (breaker разомкнут) — отказываем до списания видео
+    if not is_kie_available():
+        await callback.message.edit_text(get_text(user_language, "sora_unavailable", retry_after=kie_retry_after()))
+        return
+    
+    # Проверяем количество видео и сразу списываем одно (атомарно)
+    videos_left = await reserve_video(user_id)
+    if videos_left is None:
         await callback.message.edit_text(get_text(user_language, "no_videos_left"), reply_markup=tariff_selection(user_language))
         return
     
     # Устанавливаем ориентацию и создаем видео
-    orientation = user_waiting_for_video_orientation.get(user_id, "vertical")
+    session = sessions.get(user_id)
+    orientation = session.orientation if session and session.orientation else "vertical"
     
     try:
         # Показываем сообщение о создании
@@ -2122,22 +2702,42 @@ async def handle_video_description_from_example(callback: types.CallbackQuery, d
             get_text(user_language, "video_creating")
         )
         
-        # Списываем видео
-        await update_user_videos(user_id, user['videos_left'] - 1)
-        
         # Преобразуем ориентацию в aspect_ratio для Sora API
         aspect_ratio = "portrait" if orientation == "vertical" else "landscape"
         
-        # Создаем задачу в Sora
-        task_id, status = await create_sora_task(description, aspect_ratio, user_id=user_id)
+        # Ставим задачу в очередь отправки в Sora
+        ticket = sora_scheduler.submit(prompt=description, aspect_ratio=aspect_ratio, user_id=user_id)
+        
+        if ticket.queued:
+            # Очередь занята: показываем позицию и дожидаемся отправки в фоне
+            await creating_msg.edit_text(
+                get_text(user_language, "video_queued", position=ticket.position, eta=ticket.eta)
+            )
+            spawn_background(finish_example_submission(callback, ticket, creating_msg, description, user_language, videos_left))
+            return
+    except Exception as e:
+        await fail_example_submission(callback, e)
+        return
+    
+    await finish_example_submission(callback, ticket, creating_msg, description, user_language, videos_left)
+
+async def finish_example_submission(callback: types.CallbackQuery, ticket, creating_msg: types.Message, description: str, user_language: str, videos_left: int):
+    """Дождаться ответа Sora по заявке из примера и сообщить пользователю"""
+    user_id = callback.from_user.id
+    
+    try:
+        task_id, status = await ticket.result()
         
         if task_id and status == "success":
+            # Сохраняем задачу: callback найдёт пользователя по task_id
+            await save_sora_task(task_id, user_id, description, ticket.kwargs["aspect_ratio"])
+            
             # Показываем успешное создание задачи с промптом
             task_msg = await creating_msg.edit_text(
                 f"✅ <b>Задача отправлена в Sora 2!</b>\n\n🎬 <b>Описание:</b> <i>{description}</i>\n\n🆔 <b>ID задачи:</b> <code>{task_id}</code>\n\n⏳ Ожидайте уведомление когда видео будет готово"
             )
             # Сохраняем ID сообщения для последующего удаления
-            user_task_messages[user_id] = task_msg.message_id
+            await set_sora_task_message(task_id, task_msg.message_id)
             
             # Информируем о том, что видео будет отправлено
             await callback.message.answer(
@@ -2145,20 +2745,26 @@ async def handle_video_description_from_example(callback: types.CallbackQuery, d
             )
         else:
             # Ошибка создания - возвращаем видео обратно
-            await update_user_videos(user_id, user['videos_left'])
+            refunded = await refund_video(user_id)
+            if refunded is not None:
+                videos_left = refunded
             
-            error_text = get_text(user_language, "video_error", videos_left=user['videos_left'])
+            error_text = get_text(user_language, "video_error", videos_left=videos_left)
             await creating_msg.edit_text(error_text)
             
             # Меню уже показано в предыдущем сообщении
             
     except Exception as e:
-        logging.error(f"❌ Error creating video from example: {e}")
-        
-        # Возвращаем видео обратно при любой ошибке
-        await update_user_videos(user_id, user['videos_left'])
-        
-        await callback.message.edit_text("❌ Произошла ошибка при создании видео. Попробуйте позже.")
+        await fail_example_submission(callback, e)
+
+async def fail_example_submission(callback: types.CallbackQuery, error: Exception):
+    """Возврат видео при сбое создания из примера"""
+    logging.error(f"❌ Error creating video from example: {error}")
+    
+    # Возвращаем видео обратно при любой ошибке
+    await refund_video(callback.from_user.id)
+    
+    await callback.message.edit_text("❌ Произошла ошибка при создании видео. Попробуйте позже.")
 
 if __name__ == "__main__":
     asyncio.run(start_bot())
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""
+🗃 Версионированные миграции схемы БД для SORA 2
+Каждая миграция выполняется один раз, номер применённой версии хранится в schema_version
+"""
+
+import logging
+
+import asyncpg
+
+# Ключ advisory lock: несколько реплик не должны мигрировать одновременно
+MIGRATIONS_LOCK_ID = 2_025_100_401
+
+# (версия, описание, список SQL-запросов). Новые миграции добавляются только в конец
+MIGRATIONS = [
+    (1, "create users table", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT UNIQUE,
+            username TEXT,
+            first_name TEXT,
+            plan_name TEXT DEFAULT 'Без тарифа',
+            videos_left INT DEFAULT 0,
+            total_payments INT DEFAULT 0,
+            language TEXT DEFAULT 'en',
+            created_at TIMESTAMP DEFAULT NOW()
+        )
+        ''',
+    ]),
+    (2, "users.language column and new defaults", [
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS language TEXT DEFAULT 'en'",
+        "ALTER TABLE users ALTER COLUMN plan_name SET DEFAULT 'Без тарифа'",
+        "ALTER TABLE users ALTER COLUMN videos_left SET DEFAULT 0",
+    ]),
+    (3, "move legacy trial users to 'Без тарифа'", [
+        "UPDATE users SET plan_name = 'Без тарифа', videos_left = 0 WHERE plan_name = 'trial'",
+    ]),
+    (4, "drop idx_users_user_id duplicating the UNIQUE index", [
+        "DROP INDEX IF EXISTS idx_users_user_id",
+    ]),
+    (5, "sora_tasks table", [
+        '''
+        CREATE TABLE IF NOT EXISTS sora_tasks (
+            task_id TEXT PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            prompt_hash TEXT,
+            aspect_ratio TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            task_message_id BIGINT,
+            video_message_id BIGINT,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW(),
+            completed_at TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_sora_tasks_status ON sora_tasks(status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_sora_tasks_user_id ON sora_tasks(user_id, created_at DESC)",
+    ]),
+    (6, "payment_inbox table", [
+        '''
+        CREATE TABLE IF NOT EXISTS payment_inbox (
+            id BIGSERIAL PRIMARY KEY,
+            provider TEXT NOT NULL,
+            event_id TEXT NOT NULL,
+            event_type TEXT,
+            payload JSONB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INT NOT NULL DEFAULT 0,
+            last_error TEXT,
+            next_attempt_at TIMESTAMP DEFAULT NOW(),
+            received_at TIMESTAMP DEFAULT NOW(),
+            processed_at TIMESTAMP,
+            UNIQUE (provider, event_id)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_payment_inbox_pending ON payment_inbox(next_attempt_at) WHERE status = 'pending'",
+    ]),
+    (7, "user_sessions table", [
+        '''
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            user_id BIGINT PRIMARY KEY,
+            data JSONB NOT NULL,
+            version INT NOT NULL DEFAULT 1,
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_user_sessions_updated_at ON user_sessions(updated_at)",
+    ]),
+    (8, "outbox table", [
+        '''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id BIGSERIAL PRIMARY KEY,
+            chat_id BIGINT NOT NULL,
+            text TEXT NOT NULL,
+            kind TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INT NOT NULL DEFAULT 0,
+            last_error TEXT,
+            next_attempt_at TIMESTAMP DEFAULT NOW(),
+            created_at TIMESTAMP DEFAULT NOW(),
+            sent_at TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox(next_attempt_at) WHERE status = 'pending'",
+    ]),
+    (9, "broadcasts table and users.is_blocked", [
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS is_blocked BOOLEAN NOT NULL DEFAULT FALSE",
+        '''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id BIGSERIAL PRIMARY KEY,
+            text TEXT NOT NULL,
+            language TEXT,
+            plan_name TEXT,
+            status TEXT NOT NULL DEFAULT 'running',
+            last_user_id BIGINT NOT NULL DEFAULT 0,
+            sent INT NOT NULL DEFAULT 0,
+            failed INT NOT NULL DEFAULT 0,
+            blocked INT NOT NULL DEFAULT 0,
+            created_by BIGINT,
+            lease_until TIMESTAMP,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW(),
+            finished_at TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_broadcasts_running ON broadcasts(id) WHERE status = 'running'",
+    ]),
+    (10, "broadcasts.lease_token", [
+        "ALTER TABLE broadcasts ADD COLUMN IF NOT EXISTS lease_token BIGINT NOT NULL DEFAULT 0",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+async def get_schema_version(conn) -> int:
+    """Текущая версия схемы (0, если миграции ещё не запускались)"""
+    try:
+        return await conn.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    except asyncpg.UndefinedTableError:
+        return 0
+
+
+async def run_migrations(conn) -> int:
+    """Применить недостающие миграции. Возвращает итоговую версию схемы"""
+    version = await get_schema_version(conn)
+    if version >= LATEST_VERSION:
+        logging.info(f"✅ Database schema is up to date (version {version})")
+        return version
+
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATIONS_LOCK_ID)
+    try:
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP DEFAULT NOW()
+            )
+        ''')
+        # Пока ждали lock, другая реплика могла уже всё применить
+        version = await get_schema_version(conn)
+
+        for number, description, statements in MIGRATIONS:
+            if number <= version:
+                continue
+            logging.info(f"📋 Applying migration {number}: {description}")
+            async with conn.transaction():
+                for statement in statements:
+                    await conn.execute(statement)
+                await conn.execute(
+                    "INSERT INTO schema_version (version, description) VALUES ($1, $2)",
+                    number, description
+                )
+            version = number
+
+        logging.info(f"✅ Database schema migrated to version {version}")
+        return version
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATIONS_LOCK_ID)
@@ -0,0 +1,152 @@
+"""
+📮 Outbox уведомлений пользователям (платежи, возвраты)
+Уведомление записывается в таблицу outbox в той же транзакции, что и изменение баланса,
+поэтому не теряется при ошибке Bot API или перезапуске. Фоновый отправитель забирает
+пачку, отправляет, ошибки повторяет с экспоненциальной задержкой, а безнадёжные
+(бот заблокирован, чат не найден, исчерпаны попытки) помечает как dead
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Iterable, Tuple
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+import queries
+
+# Ошибки, которые не исправятся повтором
+PERMANENT_ERRORS = (TelegramForbiddenError, TelegramBadRequest)
+
+
+async def enqueue(conn, notifications: Iterable[Tuple[int, str]], kind: str) -> int:
+    """Записать уведомления [(chat_id, text)] в outbox на соединении текущей транзакции"""
+    rows = [(chat_id, text, kind) for chat_id, text in notifications]
+    if rows:
+        await queries.executemany(conn, "enqueue_notification", rows)
+    return len(rows)
+
+
+class OutboxSender:
+    """Фоновая доставка уведомлений из outbox"""
+
+    # Отправленные записи хранятся неделю, затем удаляются попутно
+    PURGE_INTERVAL = 3600.0
+
+    def __init__(
+        self,
+        get_pool: Callable,
+        send: Callable[[int, str], Awaitable[object]],
+        batch_size: int = 20,
+        poll_interval: float = 5.0,
+        max_attempts: int = 8,
+        retry_delay: float = 5.0,
+        lease: float = 120.0,
+    ):
+        self.get_pool = get_pool
+        self.send = send
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._purged_at = time.monotonic()
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+
+    def wake(self):
+        """Разбудить отправителя после записи новых уведомлений"""
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        logging.info("📮 Outbox sender started")
+        while True:
+            try:
+                while await self.send_batch():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"❌ Outbox sender error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def send_batch(self) -> bool:
+        """Отправить одну пачку. Возвращает False, если отправлять нечего"""
+        pool = self.get_pool()
+        if pool is None:
+            return False
+
+        # Забираем пачку на время lease: упавшая реплика не держит уведомления навсегда
+        async with pool.acquire() as conn:
+            batch = await queries.fetch(conn, "claim_notifications", self.batch_size, self.lease)
+        if not batch:
+            return False
+
+        results = await asyncio.gather(
+            *(self.send(row["chat_id"], row["text"]) for row in batch),
+            return_exceptions=True
+        )
+
+        sent_ids = []
+        retries = []
+        for row, result in zip(batch, results):
+            if not isinstance(result, BaseException):
+                sent_ids.append(row["id"])
+                continue
+            attempts = row["attempts"] + 1
+            permanent = isinstance(result, PERMANENT_ERRORS)
+            status = "dead" if permanent or attempts >= self.max_attempts else "pending"
+            delay = self.retry_delay * (2 ** (attempts - 1))
+            retries.append((row["id"], status, str(result)[:500], delay))
+            if status == "dead":
+                self.dead += 1
+                logging.error(f"❌ Outbox notification {row['id']} for chat {row['chat_id']} dead after {attempts} attempts: {result}")
+            else:
+                self.retried += 1
+                logging.warning(f"⚠️ Outbox notification {row['id']} for chat {row['chat_id']} failed ({attempts}/{self.max_attempts}), retry in {delay:.0f}s: {result}")
+
+        async with pool.acquire() as conn:
+            if sent_ids:
+                await queries.execute(conn, "finish_notifications", sent_ids)
+            if retries:
+                await queries.executemany(conn, "retry_notification", retries)
+            if time.monotonic() - self._purged_at > self.PURGE_INTERVAL:
+                self._purged_at = time.monotonic()
+                await queries.execute(conn, "purge_notifications")
+        self.sent += len(sent_ids)
+        return True
+
+    async def stats(self) -> dict:
+        """Счётчики отправителя и размер очереди"""
+        result = {"sent": self.sent, "retried": self.retried, "dead": self.dead}
+        pool = self.get_pool()
+        if pool is None:
+            return result
+        try:
+            async with pool.acquire() as conn:
+                rows = await queries.fetch(conn, "outbox_stats")
+            result.update({f"{row['status']}_notifications": row["notifications"] for row in rows})
+        except Exception as e:
+            logging.error(f"❌ Error getting outbox stats: {e}")
+        return result
@@ -0,0 +1,145 @@
+"""
+💳 Идемпотентный inbox платёжных вебхуков (YooKassa, Tribute)
+Вебхук только сохраняет событие (INSERT ... ON CONFLICT DO NOTHING) и сразу отвечает 200.
+Фоновый воркер применяет событие ровно один раз: зачисление, уведомления в outbox
+и отметка "processed" выполняются в одной транзакции
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import outbox
+import queries
+
+# Обработчик события: (conn, payload) -> список уведомлений [(chat_id, text)] для outbox
+EventHandler = Callable[..., Awaitable[List[Tuple[int, str]]]]
+
+
+def payload_event_id(raw_body: str) -> str:
+    """ID события по хэшу тела запроса: повтор доставки приходит с тем же телом"""
+    return hashlib.sha256(raw_body.encode("utf-8")).hexdigest()
+
+
+async def store_event(pool, provider: str, event_id: str, event_type: str, payload: dict) -> bool:
+    """Сохранить событие. Возвращает False, если такое событие уже было"""
+    async with pool.acquire() as conn:
+        inserted = await queries.fetchval(
+            conn, "store_payment_event",
+            provider, event_id, event_type, json.dumps(payload, ensure_ascii=False)
+        )
+    return inserted is not None
+
+
+class PaymentInboxWorker:
+    """Фоновый обработчик событий из payment_inbox"""
+
+    def __init__(
+        self,
+        get_pool: Callable,
+        handlers: Dict[str, EventHandler],
+        notify: Callable[[List[Tuple[int, str]]], Awaitable[None]],
+        poll_interval: float = 5.0,
+        max_attempts: int = 5,
+        retry_delay: float = 30.0,
+    ):
+        self.get_pool = get_pool
+        self.handlers = handlers
+        self.notify = notify
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.processed = 0
+        self.failed = 0
+
+    def wake(self):
+        """Разбудить воркер после записи нового события"""
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        logging.info("💳 Payment inbox worker started")
+        while True:
+            try:
+                while await self.process_next():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"❌ Payment inbox worker error: {e}")
+
+            # Ждём нового события или периодически опрашиваем (события других реплик, ретраи)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def process_next(self) -> bool:
+        """Обработать одно событие. Возвращает False, если очередь пуста"""
+        pool = self.get_pool()
+        if pool is None:
+            return False
+
+        notifications = []
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                event = await queries.fetchrow(conn, "claim_payment_event")
+                if event is None:
+                    return False
+
+                handler = self.handlers.get(event["provider"])
+                try:
+                    if handler is None:
+                        raise ValueError(f"No handler for provider {event['provider']}")
+                    # Savepoint: при ошибке откатываем только изменения обработчика
+                    async with conn.transaction():
+                        notifications = await handler(conn, json.loads(event["payload"]))
+                        # Уведомления фиксируются вместе с зачислением, отправляет их outbox
+                        await outbox.enqueue(conn, notifications, kind=f"payment:{event['provider']}")
+                    await queries.execute(conn, "finish_payment_event", event["id"])
+                    self.processed += 1
+                    logging.info(f"✅ Payment event {event['provider']}:{event['event_id']} processed")
+                except Exception as e:
+                    attempts = event["attempts"] + 1
+                    status = "failed" if attempts >= self.max_attempts else "pending"
+                    delay = self.retry_delay * (2 ** (attempts - 1))
+                    await queries.execute(conn, "retry_payment_event", event["id"], status, str(e), delay)
+                    self.failed += 1
+                    notifications = []
+                    logging.error(f"❌ Payment event {event['provider']}:{event['event_id']} failed ({attempts}/{self.max_attempts}): {e}")
+
+        # После коммита: сброс кэшей и пробуждение отправителя outbox
+        if notifications:
+            await self.notify(notifications)
+        return True
+
+    async def stats(self) -> dict:
+        """Счётчики воркера и размер очереди"""
+        result = {"processed": self.processed, "failed": self.failed}
+        pool = self.get_pool()
+        if pool is None:
+            return result
+        try:
+            async with pool.acquire() as conn:
+                rows = await queries.fetch(conn, "payment_inbox_stats")
+            result.update({f"{row['status']}_events": row["events"] for row in rows})
+        except Exception as e:
+            logging.error(f"❌ Error getting payment inbox stats: {e}")
+        return result
@@ -0,0 +1,339 @@
+"""
+🗂 Реестр SQL-запросов бота
+Все запросы подготавливаются на каждом новом соединении пула (хук init), и помощники
+execute/fetch* выполняют эти подготовленные выражения напрямую: первый вызов запроса
+не платит за parse/plan, а ошибка в SQL видна сразу при старте
+"""
+
+import logging
+from typing import Optional
+
+import asyncpg
+
+# Колонки users, которые нужны хендлерам (без служебного id)
+USER_COLUMNS = "user_id, username, first_name, plan_name, videos_left, total_payments, language, created_at"
+
+QUERIES = {
+    "get_user": f"SELECT {USER_COLUMNS} FROM users WHERE user_id = $1",
+    "get_user_language": "SELECT language FROM users WHERE user_id = $1",
+    "create_user": '''
+        INSERT INTO users (user_id, username, first_name)
+        VALUES ($1, $2, $3)
+        ON CONFLICT (user_id) DO NOTHING
+        RETURNING user_id
+    ''',
+    "set_user_videos": '''
+        UPDATE users SET videos_left = $2 WHERE user_id = $1
+        RETURNING videos_left
+    ''',
+    "reserve_video": '''
+        UPDATE users SET videos_left = videos_left - 1
+        WHERE user_id = $1 AND videos_left > 0
+        RETURNING videos_left
+    ''',
+    "credit_videos": '''
+        UPDATE users SET videos_left = videos_left + $2
+        WHERE user_id = $1
+        RETURNING videos_left
+    ''',
+    "set_user_language": '''
+        UPDATE users SET language = $2 WHERE user_id = $1
+        RETURNING language
+    ''',
+    "apply_tariff": '''
+        UPDATE users SET
+            plan_name = $2,
+            videos_left = videos_left + $3,
+            total_payments = total_payments + $4
+        WHERE user_id = $1
+        RETURNING videos_left, total_payments
+    ''',
+    "create_sora_task": '''
+        INSERT INTO sora_tasks (task_id, user_id, prompt_hash, aspect_ratio)
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT (task_id) DO NOTHING
+    ''',
+    "get_sora_task": '''
+        SELECT task_id, user_id, aspect_ratio, status, task_message_id, video_message_id, created_at, completed_at
+        FROM sora_tasks WHERE task_id = $1
+    ''',
+    "set_sora_task_message": '''
+        UPDATE sora_tasks SET task_message_id = $2, updated_at = NOW()
+        WHERE task_id = $1
+    ''',
+    "claim_sora_task": '''
+        UPDATE sora_tasks SET status = 'processing', updated_at = NOW()
+        WHERE task_id = $1
+          AND (status = 'pending'
+               OR (status = 'processing' AND updated_at < NOW() - make_interval(secs => $2)))
+        RETURNING user_id, task_message_id, aspect_ratio
+    ''',
+    "finish_sora_task": '''
+        UPDATE sora_tasks SET status = $2, updated_at = NOW(), completed_at = NOW()
+        WHERE task_id = $1 AND status = 'processing'
+        RETURNING task_id
+    ''',
+    "release_sora_task": '''
+        UPDATE sora_tasks SET status = 'pending', updated_at = NOW()
+        WHERE task_id = $1 AND status = 'processing'
+    ''',
+    "set_sora_task_video_message": '''
+        UPDATE sora_tasks SET video_message_id = $2, updated_at = NOW()
+        WHERE task_id = $1
+    ''',
+    "sora_task_stats": '''
+        SELECT status,
+               COUNT(*) AS tasks,
+               AVG(EXTRACT(EPOCH FROM (completed_at - created_at))) AS avg_seconds,
+               MAX(EXTRACT(EPOCH FROM (completed_at - created_at))) AS max_seconds
+        FROM sora_tasks
+        WHERE created_at > NOW() - INTERVAL '24 hours'
+        GROUP BY status
+    ''',
+    "store_payment_event": '''
+        INSERT INTO payment_inbox (provider, event_id, event_type, payload)
+        VALUES ($1, $2, $3, $4::jsonb)
+        ON CONFLICT (provider, event_id) DO NOTHING
+        RETURNING id
+    ''',
+    "claim_payment_event": '''
+        SELECT id, provider, event_id, event_type, payload::text AS payload, attempts
+        FROM payment_inbox
+        WHERE status = 'pending' AND next_attempt_at <= NOW()
+        ORDER BY next_attempt_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    ''',
+    "finish_payment_event": '''
+        UPDATE payment_inbox SET status = 'processed', attempts = attempts + 1, processed_at = NOW()
+        WHERE id = $1
+    ''',
+    "retry_payment_event": '''
+        UPDATE payment_inbox SET
+            status = $2,
+            attempts = attempts + 1,
+            last_error = $3,
+            next_attempt_at = NOW() + make_interval(secs => $4)
+        WHERE id = $1
+    ''',
+    "payment_inbox_stats": '''
+        SELECT status, COUNT(*) AS events FROM payment_inbox
+        WHERE status IN ('pending', 'failed')
+        GROUP BY status
+    ''',
+    "load_session": '''
+        SELECT data::text AS data, version FROM user_sessions
+        WHERE user_id = $1 AND updated_at > NOW() - make_interval(secs => $2)
+    ''',
+    "save_session": '''
+        INSERT INTO user_sessions (user_id, data, version)
+        VALUES ($1, $2::jsonb, 1)
+        ON CONFLICT (user_id) DO UPDATE SET
+            data = EXCLUDED.data,
+            version = user_sessions.version + 1,
+            updated_at = NOW()
+        WHERE user_sessions.version = $3
+           OR user_sessions.updated_at <= NOW() - make_interval(secs => $4)
+        RETURNING version
+    ''',
+    "purge_sessions": '''
+        DELETE FROM user_sessions WHERE updated_at <= NOW() - make_interval(secs => $1)
+    ''',
+    "enqueue_notification": '''
+        INSERT INTO outbox (chat_id, text, kind) VALUES ($1, $2, $3)
+    ''',
+    "claim_notifications": '''
+        UPDATE outbox SET next_attempt_at = NOW() + make_interval(secs => $2)
+        WHERE id IN (
+            SELECT id FROM outbox
+            WHERE status = 'pending' AND next_attempt_at <= NOW()
+            ORDER BY next_attempt_at
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, chat_id, text, attempts
+    ''',
+    "finish_notifications": '''
+        UPDATE outbox SET status = 'sent', attempts = attempts + 1, sent_at = NOW()
+        WHERE id = ANY($1::bigint[])
+    ''',
+    "retry_notification": '''
+        UPDATE outbox SET
+            status = $2,
+            attempts = attempts + 1,
+            last_error = $3,
+            next_attempt_at = NOW() + make_interval(secs => $4)
+        WHERE id = $1
+    ''',
+    "purge_notifications": '''
+        DELETE FROM outbox WHERE status = 'sent' AND sent_at < NOW() - INTERVAL '7 days'
+    ''',
+    "outbox_stats": '''
+        SELECT status, COUNT(*) AS notifications FROM outbox
+        WHERE status IN ('pending', 'dead')
+        GROUP BY status
+    ''',
+    "unblock_user": '''
+        UPDATE users SET is_blocked = FALSE WHERE user_id = $1 AND is_blocked
+    ''',
+    "mark_users_blocked": '''
+        UPDATE users SET is_blocked = TRUE WHERE user_id = ANY($1::bigint[])
+    ''',
+    "create_broadcast": '''
+        INSERT INTO broadcasts (text, language, plan_name, created_by)
+        VALUES ($1, $2, $3, $4)
+        RETURNING id
+    ''',
+    "claim_broadcast": '''
+        UPDATE broadcasts SET
+            lease_token = lease_token + 1,
+            lease_until = NOW() + make_interval(secs => $1),
+            updated_at = NOW()
+        WHERE id = (
+            SELECT id FROM broadcasts
+            WHERE status = 'running' AND (lease_until IS NULL OR lease_until < NOW())
+            ORDER BY id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, text, language, plan_name, last_user_id, sent, failed, blocked, created_by, lease_token
+    ''',
+    "broadcast_recipients": '''
+        SELECT user_id FROM users
+        WHERE user_id > $1
+          AND NOT is_blocked
+          AND ($2::text IS NULL OR language = $2)
+          AND ($3::text IS NULL OR plan_name = $3)
+        ORDER BY user_id
+    ''',
+    "save_broadcast_progress": '''
+        UPDATE broadcasts SET
+            last_user_id = $2,
+            sent = sent + $3,
+            failed = failed + $4,
+            blocked = blocked + $5,
+            lease_until = NOW() + make_interval(secs => $6),
+            updated_at = NOW()
+        WHERE id = $1 AND lease_token = $7
+        RETURNING status
+    ''',
+    "renew_broadcast_lease": '''
+        UPDATE broadcasts SET lease_until = NOW() + make_interval(secs => $3), updated_at = NOW()
+        WHERE id = $1 AND lease_token = $2
+        RETURNING status
+    ''',
+    "release_broadcast": '''
+        UPDATE broadcasts SET lease_until = NULL, updated_at = NOW()
+        WHERE id = $1 AND lease_token = $2
+    ''',
+    "finish_broadcast": '''
+        UPDATE broadcasts SET status = 'done', lease_until = NULL, updated_at = NOW(), finished_at = NOW()
+        WHERE id = $1 AND lease_token = $2 AND status = 'running'
+    ''',
+    "cancel_broadcast": '''
+        UPDATE broadcasts SET status = 'cancelled', updated_at = NOW()
+        WHERE id = $1 AND status = 'running'
+        RETURNING id
+    ''',
+    "resume_broadcast": '''
+        UPDATE broadcasts SET status = 'running', updated_at = NOW()
+        WHERE id = $1 AND status = 'cancelled'
+        RETURNING id
+    ''',
+    "recent_broadcasts": '''
+        SELECT id, status, language, plan_name, sent, failed, blocked, last_user_id, created_at, finished_at
+        FROM broadcasts ORDER BY id DESC LIMIT $1
+    ''',
+    "notify_cache": "SELECT pg_notify($1, payload) FROM unnest($2::text[]) AS payload",
+}
+
+
+# Подготовленные выражения соединений пула: {pid серверного процесса: {имя: PreparedStatement}}.
+# Ключ — pid, потому что хук init получает само соединение, а хендлеры — прокси пула
+_prepared = {}
+
+
+async def prepare_connection(conn):
+    """Хук init пула: подготавливает все запросы реестра на новом соединении"""
+    statements = {}
+    for name, query in QUERIES.items():
+        try:
+            statements[name] = await conn.prepare(query)
+        except Exception as e:
+            raise RuntimeError(f"query {name!r} failed to prepare: {e}") from e
+    pid = conn.get_server_pid()
+    _prepared[pid] = statements
+
+    def forget(_conn):
+        # pid может уже принадлежать новому соединению
+        if _prepared.get(pid) is statements:
+            del _prepared[pid]
+
+    conn.add_termination_listener(forget)
+    logging.info(f"✅ Prepared {len(QUERIES)} statements on new DB connection")
+
+
+def _statements(conn) -> dict:
+    return _prepared.get(conn.get_server_pid()) or {}
+
+
+async def _run(conn, name: str, method: str, *args):
+    """Выполнить подготовленное выражение соединения; без него (соединение не из пула) — через кэш asyncpg"""
+    statements = _statements(conn)
+    statement = statements.get(name)
+    if statement is not None:
+        try:
+            if method == "execute":
+                # У PreparedStatement нет execute: статус команды берём после выполнения
+                await statement.fetch(*args)
+                return statement.get_statusmsg()
+            return await getattr(statement, method)(*args)
+        except asyncpg.exceptions.InvalidCachedStatementError:
+            # Схему изменила миграция другой реплики: дальше этот запрос идёт через кэш asyncpg,
+            # который переподготавливает выражения сам. В транзакции повтор невозможен
+            statements.pop(name, None)
+            if conn.is_in_transaction():
+                raise
+    return await getattr(conn, method)(QUERIES[name], *args)
+
+
+async def execute(conn, name: str, *args):
+    return await _run(conn, name, "execute", *args)
+
+
+async def fetch(conn, name: str, *args):
+    return await _run(conn, name, "fetch", *args)
+
+
+async def fetchrow(conn, name: str, *args):
+    return await _run(conn, name, "fetchrow", *args)
+
+
+async def fetchval(conn, name: str, *args):
+    return await _run(conn, name, "fetchval", *args)
+
+
+async def executemany(conn, name: str, args):
+    return await _run(conn, name, "executemany", args)
+
+
+def cursor(conn, name: str, *args, prefetch: int = None):
+    """Серверный курсор (только внутри транзакции): await queries.cursor(...) или async for"""
+    statement = _statements(conn).get(name)
+    if statement is not None:
+        return statement.cursor(*args, prefetch=prefetch)
+    return conn.cursor(QUERIES[name], *args, prefetch=prefetch)
+
+
+# === Типизированные помощники ===
+
+async def fetch_user(conn, user_id: int) -> Optional[dict]:
+    """Строка пользователя в виде dict"""
+    row = await fetchrow(conn, "get_user", user_id)
+    return dict(row) if row is not None else None
+
+
+async def fetch_user_language(conn, user_id: int) -> Optional[str]:
+    """Только язык пользователя"""
+    return await fetchval(conn, "get_user_language", user_id)
+
@@ -1,18 +1,116 @@
 # app/services/sora_client.py
 import aiohttp
+import asyncio
 import os
 import logging
 import json
+import time
+
+import http_client
+from utils.resilience import HALF_OPEN, CircuitBreaker, LatencyTracker, backoff_delay
 
 KIE_API_URL = os.getenv("KIE_API_URL", "https://api.kie.ai/api/v1/jobs/createTask")
 KIE_API_KEY = os.getenv("KIE_API_KEY")
 PUBLIC_URL = os.getenv("PUBLIC_URL")
 
+# Устойчивость к сбоям Kie.AI
+KIE_RETRY_ATTEMPTS = int(os.getenv("KIE_RETRY_ATTEMPTS", 3))
+KIE_BREAKER_ERROR_RATE = float(os.getenv("KIE_BREAKER_ERROR_RATE", 0.5))
+KIE_BREAKER_MIN_CALLS = int(os.getenv("KIE_BREAKER_MIN_CALLS", 10))
+KIE_BREAKER_WINDOW = float(os.getenv("KIE_BREAKER_WINDOW", 60))
+KIE_BREAKER_RESET = float(os.getenv("KIE_BREAKER_RESET", 30))
+KIE_TIMEOUT_MIN = float(os.getenv("KIE_TIMEOUT_MIN", 15))
+KIE_TIMEOUT_MAX = float(os.getenv("KIE_TIMEOUT_MAX", 90))
+
+# Статусы, при которых запрос точно не был принят и его можно безопасно повторить
+RETRYABLE_HTTP_STATUSES = {429, 502, 503, 504}
+
+kie_breaker = CircuitBreaker(
+    error_rate=KIE_BREAKER_ERROR_RATE,
+    min_calls=KIE_BREAKER_MIN_CALLS,
+    window=KIE_BREAKER_WINDOW,
+    reset_timeout=KIE_BREAKER_RESET
+)
+kie_latency = LatencyTracker(minimum=KIE_TIMEOUT_MIN, maximum=KIE_TIMEOUT_MAX)
+_retries = 0
+
+def is_kie_available() -> bool:
+    """Можно ли сейчас отправлять задачи (breaker не разомкнут)"""
+    return kie_breaker.available()
+
+def kie_retry_after() -> int:
+    """Через сколько секунд Kie.AI снова будет доступен для запросов"""
+    return kie_breaker.retry_after()
+
+def resilience_stats() -> dict:
+    return {
+        "breaker": kie_breaker.stats(),
+        "latency": kie_latency.stats(),
+        "retries": _retries,
+    }
+
+async def _post_task(headers: dict, payload: dict):
+    """
+    Одна попытка создания задачи.
+    Возвращает (task_id, status, retry_after): retry_after не None — попытку можно повторить
+    """
+    timeout = aiohttp.ClientTimeout(total=kie_latency.timeout(), connect=http_client.timeout_for("kie").connect)
+    started = time.monotonic()
+    try:
+        session = http_client.get_session()
+        async with session.post(KIE_API_URL, headers=headers, json=payload, timeout=timeout) as response:
+            response_text = await response.text()
+            logging.info(f"🎬 Sora API response status: {response.status}")
+            logging.info(f"🎬 Sora API response: {response_text}")
+            
+            if response.status == 200:
+                kie_latency.observe(time.monotonic() - started)
+                kie_breaker.record_success()
+                data = await response.json()
+                if data.get("code") == 200:
+                    task_id = data["data"]["taskId"]
+                    logging.info(f"✅ Sora task created successfully: {task_id}")
+                    return task_id, "success", None
+                else:
+                    logging.error(f"❌ Sora API error: {data}")
+                    return None, f"api_error_{data.get('code', 'unknown')}", None
+            
+            logging.error(f"❌ Sora API HTTP error: {response.status} - {response_text}")
+            if response.status in RETRYABLE_HTTP_STATUSES or response.status >= 500:
+                kie_breaker.record_failure()
+            else:
+                # 4xx — проблема запроса, а не провайдера
+                kie_breaker.record_success()
+            if response.status in RETRYABLE_HTTP_STATUSES:
+                try:
+                    retry_after = float(response.headers.get("Retry-After", 0))
+                except ValueError:
+                    retry_after = 0.0
+                return None, f"http_error_{response.status}", retry_after
+            return None, f"http_error_{response.status}", None
+    
+    except aiohttp.ClientConnectorError as e:
+        # Соединение не установлено — запрос не ушёл, повтор безопасен
+        kie_breaker.record_failure()
+        logging.error(f"❌ Connection error creating Sora task: {e}")
+        return None, "network_error", 0.0
+    except asyncio.TimeoutError:
+        # Запрос мог дойти до Kie.AI: не повторяем, чтобы не создать задачу дважды
+        kie_breaker.record_failure()
+        logging.error(f"❌ Timeout creating Sora task after {timeout.total:.0f}s")
+        return None, "timeout", None
+    except aiohttp.ClientError as e:
+        kie_breaker.record_failure()
+        logging.error(f"❌ Network error creating Sora task: {e}")
+        return None, "network_error", None
+
 async def create_sora_task(prompt: str, aspect_ratio: str = "portrait", remove_watermark: bool = True, user_id: int = None):
     """
     Создаёт задачу генерации видео через Kie.AI (Sora-2)
     Возвращает taskId или None при ошибке
     """
+    global _retries
+    
     if not KIE_API_KEY:
         logging.warning("⚠️ KIE_API_KEY not found, using demo mode")
         return None, "demo_mode"
@@ -48,29 +146,34 @@ async def create_sora_task(prompt: str, aspect_ratio: str = "portrait", remove_w
     try:
         logging.info(f"🎬 Creating Sora task for user {user_id}: {prompt[:50]}...")
         
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=90)) as session:
-            async with session.post(KIE_API_URL, headers=headers, json=payload) as response:
-                response_text = await response.text()
-                logging.info(f"🎬 Sora API response status: {response.status}")
-                logging.info(f"🎬 Sora API response: {response_text}")
-                
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get("code") == 200:
-                        task_id = data["data"]["taskId"]
-                        logging.info(f"✅ Sora task created successfully: {task_id}")
-                        return task_id, "success"
-                    else:
-                        logging.error(f"❌ Sora API error: {data}")
-                        return None, f"api_error_{data.get('code', 'unknown')}"
-                else:
-                    logging.error(f"❌ Sora API HTTP error: {response.status} - {response_text}")
-                    return None, f"http_error_{response.status}"
+        for attempt in range(1, KIE_RETRY_ATTEMPTS + 1):
+            # Провайдер лежит — отвечаем сразу, не занимая сокет на весь таймаут
+            probe = kie_breaker.state == HALF_OPEN
+            if not kie_breaker.allow():
+                logging.warning(f"⚠️ Kie.AI circuit is open, rejecting task for user {user_id}")
+                return None, "circuit_open"
+            
+            try:
+                task_id, status, retry_after = await _post_task(headers, payload)
+            except asyncio.CancelledError:
+                # Отмена (остановка вебхука, воркера) ничего не говорит о провайдере:
+                # только отпускаем пробу, иначе breaker так и останется разомкнутым
+                if probe:
+                    kie_breaker.release()
+                raise
+            if retry_after is None or attempt == KIE_RETRY_ATTEMPTS:
+                return task_id, status
+            
+            delay = max(retry_after, backoff_delay(attempt))
+            _retries += 1
+            logging.warning(f"🔁 Retrying Sora task for user {user_id} in {delay:.1f}s ({status}, attempt {attempt}/{KIE_RETRY_ATTEMPTS})")
+            await asyncio.sleep(delay)
+        
+        return None, "unknown_error"
                     
-    except aiohttp.ClientError as e:
-        logging.error(f"❌ Network error creating Sora task: {e}")
-        return None, "network_error"
     except Exception as e:
+        # Освобождаем пробу half-open breaker'а
+        kie_breaker.record_failure()
         logging.error(f"❌ Unexpected error creating Sora task: {e}")
         return None, "unknown_error"
 
@@ -0,0 +1,191 @@
+"""
+🚦 Очередь отправки задач в Kie.AI (Sora-2)
+Token bucket ограничивает частоту запросов, семафор — число одновременных запросов.
+На 429/5xx скорость снижается вдвое, на успешных ответах плавно растёт обратно (AIMD)
+"""
+
+import asyncio
+import logging
+import math
+import re
+import time
+from collections import deque
+from typing import Awaitable, Callable, Tuple
+
+from utils.rate_limit import TokenBucket
+
+# Ответы, после которых провайдер просит сбавить темп (таймауты и сетевые ошибки — тоже)
+_THROTTLE_STATUS = re.compile(r"^(http|api)_error_(429|5\d\d)$")
+
+
+def is_throttled(status: str) -> bool:
+    return status in ("network_error", "timeout") or bool(_THROTTLE_STATUS.match(status or ""))
+
+
+class SubmissionTicket:
+    """Заявка на создание задачи; result() ждёт ответа Kie.AI"""
+
+    __slots__ = ("kwargs", "future", "position", "eta", "enqueued_at")
+
+    def __init__(self, kwargs: dict, position: int, eta: int):
+        self.kwargs = kwargs
+        self.future = asyncio.get_running_loop().create_future()
+        self.position = position
+        self.eta = eta
+        self.enqueued_at = time.monotonic()
+
+    @property
+    def queued(self) -> bool:
+        """Заявка не уйдёт сразу: перед ней очередь или лимиты исчерпаны"""
+        return self.position > 0
+
+    async def result(self) -> Tuple[str, str]:
+        return await self.future
+
+
+class SubmissionScheduler:
+    """Фоновая отправка задач с лимитом частоты, параллельности и длины очереди"""
+
+    def __init__(
+        self,
+        submit: Callable[..., Awaitable[Tuple[str, str]]],
+        rate: float = 2.0,
+        burst: float = 5.0,
+        concurrency: int = 10,
+        max_queue: int = 500,
+        min_rate: float = 0.2,
+        increase_step: float = 0.05,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 5.0,
+    ):
+        self.submit_fn = submit
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.bucket = TokenBucket(rate, burst)
+        self._slots = asyncio.Semaphore(concurrency)
+        self._waiting = deque()
+        self._has_work = asyncio.Event()
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._task = None
+        self._running = set()
+        self.submitted = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+
+    def submit(self, **kwargs) -> SubmissionTicket:
+        """Поставить задачу в очередь. Не блокирует: ответ придёт в ticket.result()"""
+        ahead = len(self._waiting)
+        if ahead >= self.max_queue:
+            # Очередь переполнена: сразу отвечаем ошибкой, видео будет возвращено
+            self.rejected += 1
+            logging.warning(f"⚠️ Sora submission queue is full ({ahead}), rejecting task for user {kwargs.get('user_id')}")
+            ticket = SubmissionTicket(kwargs, 0, 0)
+            ticket.future.set_result((None, "queue_full"))
+            return ticket
+
+        busy = ahead > 0 or self._in_flight >= self.concurrency or self.bucket.available() < 1
+        position = ahead + 1 if busy else 0
+        ticket = SubmissionTicket(kwargs, position, self._estimate_wait(position))
+        self._waiting.append(ticket)
+        self._has_work.set()
+        return ticket
+
+    def _estimate_wait(self, position: int) -> int:
+        """Оценка ожидания в секундах при текущей скорости"""
+        if position <= 0:
+            return 0
+        return max(1, math.ceil(self.bucket.time_until_available(position)))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Запросы, уже отправленные в Kie.AI, дожидаемся: иначе списанные видео повиснут без задачи
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        while self._waiting:
+            ticket = self._waiting.popleft()
+            if not ticket.future.done():
+                ticket.future.set_result((None, "shutdown"))
+
+    async def _run(self):
+        logging.info("🚦 Sora submission scheduler started")
+        while True:
+            while not self._waiting:
+                await self._has_work.wait()
+                self._has_work.clear()
+
+            await self._slots.acquire()
+            try:
+                await self.bucket.acquire()
+            except asyncio.CancelledError:
+                self._slots.release()
+                raise
+
+            ticket = self._waiting.popleft()
+            self._in_flight += 1
+            task = asyncio.create_task(self._execute(ticket))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _execute(self, ticket: SubmissionTicket):
+        self.total_wait += time.monotonic() - ticket.enqueued_at
+        try:
+            result = await self.submit_fn(**ticket.kwargs)
+        except Exception as e:
+            logging.error(f"❌ Sora submission failed: {e}")
+            result = (None, "unknown_error")
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+        self.submitted += 1
+        self._adjust_rate(result[1])
+        if not ticket.future.done():
+            ticket.future.set_result(result)
+
+    def _adjust_rate(self, status: str):
+        """AIMD: мультипликативное снижение на троттлинге, аддитивный рост на успехе"""
+        rate = self.bucket.rate
+        if is_throttled(status):
+            self.throttled += 1
+            now = time.monotonic()
+            # Пачка ошибок от одного всплеска снижает скорость один раз
+            if now - self._last_decrease < self.decrease_cooldown:
+                return
+            self._last_decrease = now
+            new_rate = max(self.min_rate, rate * self.decrease_factor)
+            if new_rate < rate:
+                logging.warning(f"🚦 Kie.AI throttling ({status}), rate {rate:.2f} -> {new_rate:.2f} req/s")
+        elif status == "success":
+            new_rate = min(self.max_rate, rate + self.increase_step)
+        else:
+            return
+        self.bucket.set_rate(new_rate)
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._waiting),
+            "in_flight": self._in_flight,
+            "rate": round(self.bucket.rate, 3),
+            "max_rate": self.max_rate,
+            "submitted": self.submitted,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "avg_wait_seconds": round(self.total_wait / self.submitted, 3) if self.submitted else 0.0,
+        }
@@ -0,0 +1,127 @@
+"""
+Две реплики SessionStore над одним MemorySessionBackend — локальная замена user_sessions
+"""
+
+import asyncio
+
+from utils.sessions import MemorySessionBackend, SessionStore
+
+USER_ID = 42
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def replicas(backend):
+    return SessionStore(backend=backend), SessionStore(backend=backend)
+
+
+def test_conflict_replays_changes_on_top_of_other_replica():
+    backend = MemorySessionBackend()
+    a, b = replicas(backend)
+
+    a.session(USER_ID).orientation = "vertical"
+    run(a.flush(USER_ID))
+    run(b.load(USER_ID))
+    assert b.session(USER_ID).orientation == "vertical"
+
+    # A записывает версию 2, B ещё думает, что актуальна версия 1
+    a.session(USER_ID).orientation = "horizontal"
+    run(a.flush(USER_ID))
+    b.session(USER_ID).prompt_message_id = 10
+    run(b.flush(USER_ID))
+
+    assert b.conflicts == 1
+    data, version = run(backend.load(USER_ID))
+    assert version == 3
+    assert data["orientation"] == "horizontal"
+    assert data["prompt_message_id"] == 10
+    assert b.session(USER_ID).orientation == "horizontal"
+    assert b.session(USER_ID).version == 3
+
+    run(a.load(USER_ID))
+    assert a.session(USER_ID).prompt_message_id == 10
+
+
+def test_concurrent_updates_merge_field_by_field():
+    backend = MemorySessionBackend()
+    a, b = replicas(backend)
+    a.session(USER_ID).orientation = "vertical"
+    run(a.flush(USER_ID))
+    run(b.load(USER_ID))
+
+    # Обе реплики обрабатывают апдейты с одной и той же версии
+    a.session(USER_ID).video_request = {"description": "кот", "orientation": "vertical"}
+    a.session(USER_ID).confirmation_message_id = 5
+    b.session(USER_ID).waiting_for_support = True
+    b.session(USER_ID).confirmation_message_id = 7
+    run(a.flush(USER_ID))
+    run(b.flush(USER_ID))
+
+    data, _ = run(backend.load(USER_ID))
+    assert data["video_request"] == {"description": "кот", "orientation": "vertical"}
+    assert data["waiting_for_support"] is True
+    # Одно и то же поле: побеждает тот, кто записал последним
+    assert data["confirmation_message_id"] == 7
+    assert data["orientation"] == "vertical"
+
+
+def test_expired_row_is_overwritten_without_version_check():
+    clock = Clock()
+    backend = MemorySessionBackend(ttl=100, clock=clock)
+    a, b = replicas(backend)
+    a.session(USER_ID).orientation = "vertical"
+    run(a.flush(USER_ID))
+
+    clock.now += 200
+    run(b.load(USER_ID))
+    assert b.get(USER_ID) is None
+
+    b.session(USER_ID).waiting_for_support = True
+    run(b.flush(USER_ID))
+    assert b.conflicts == 0
+    data, version = run(backend.load(USER_ID))
+    assert version == 2
+    assert data["orientation"] is None
+
+    # У A осталась просроченная копия: она заменяется строкой B
+    run(a.load(USER_ID))
+    assert a.session(USER_ID).orientation is None
+    assert a.session(USER_ID).waiting_for_support is True
+
+
+def test_reinserted_row_with_reused_version_is_applied():
+    clock = Clock()
+    backend = MemorySessionBackend(ttl=100, clock=clock)
+    a, b = replicas(backend)
+    a.session(USER_ID).orientation = "vertical"
+    run(a.flush(USER_ID))
+    run(b.load(USER_ID))
+    assert b.session(USER_ID).version == 1
+
+    # Строка просрочена и удалена; другая реплика создаёт её заново с версии 1
+    clock.now += 200
+    backend.purge()
+    c = SessionStore(backend=backend)
+    c.session(USER_ID).orientation = "horizontal"
+    run(c.flush(USER_ID))
+    assert run(backend.load(USER_ID))[1] == 1
+
+    run(b.load(USER_ID))
+    assert b.session(USER_ID).orientation == "horizontal"
+
+    b.session(USER_ID).prompt_message_id = 3
+    run(b.flush(USER_ID))
+    data, version = run(backend.load(USER_ID))
+    assert version == 2
+    assert data["orientation"] == "horizontal"
+    assert data["prompt_message_id"] == 3
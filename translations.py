@@ -3,6 +3,10 @@
 Поддержка 5 языков: Русский, Английский, Испанский, Арабский, Хинди
 """
 
+import importlib.util
+import logging
+import string
+
 LANG = {
     "ru": {
         # Основные сообщения
@@ -36,6 +40,12 @@ LANG = {
                 "create_video": "🎬 <b>Создание видео</b>\n\n📐 Ориентация: <b>{orientation}</b>\n🎞 Осталось видео: <b>{videos_left}</b>\n\n✏️ <b>Опиши сцену простыми словами:</b>\nКто в кадре, где происходит действие, что они делают, какая атмосфера и погода.\nДобавь, если нужно, детали: одежду, эмоции, свет, фон.\n\n📸 <b>Пример:</b>\n<code>Рыбаки поймали в лодку русалкоподобное чудище, рыбак в тельняшке и камуфляжных штанах, тянут ее сетью, чудище женоподобное, вырывается и шипит, съёмка на телефон, грудь покрыта плотной чешуей, склизкая, вся в тине.</code>",
                 "video_accepted": "🎬 <b>Принято описание!</b>\n\n📝 <b>Описание:</b> {description}\n📐 <b>Ориентация:</b> {orientation}\n🎞 <b>Осталось видео:</b> {videos_left}\n\n⏳ <b>Ваше видео отправлено в очередь на создание...</b>",
                 "video_ready": "🎉 <b>Ваше видео готово!</b>\n\n🎬 Видео успешно создано через Sora 2\n📹 <b>Видео отправлено в чат выше</b>\n🎞 Осталось видео: <b>{videos_left}</b>\n\n💡 Для продолжения создания пришлите новое описание!",
+                "sora_unavailable": "⚠️ <b>Sora 2 временно недоступна</b>\n\n🔧 Провайдер генерации видео сейчас не отвечает\n🕐 Попробуйте снова примерно через <b>{retry_after}</b> сек.\n\n🎞 Видео с баланса не списано",
+                "search_usage": "🔎 <b>Поиск по примерам</b>\n\nНапишите слова после команды, например:\n<code>/search бабка динозавр</code>",
+                "search_no_results": "😔 По запросу <b>{query}</b> ничего не найдено\n\n💡 Попробуйте другие слова или откройте /examples",
+                "search_results": "🔎 <b>Результаты по запросу:</b> {query}\n\n📚 Найдено примеров: <b>{count}</b>\n👇 Выберите пример:",
+                "inline_subscription_required": "🔒 Примеры доступны с тарифом — открыть бота",
+                "video_queued": "⏳ <b>Вы в очереди на создание видео</b>\n\n📍 Позиция в очереди: <b>{position}</b>\n🕐 Примерное ожидание: <b>{eta}</b> сек.\n\n📹 Задача будет отправлена в Sora 2 автоматически — можно ничего не нажимать!",
                 "video_creating": "🎬 <b>Создание видео...</b>\n\n⏳ Обрабатываем ваше описание через Sora 2\n🔄 Это может занять 2-3 минуты\n\n📹 Видео будет отправлено в этот чат как только будет готово!",
                 "video_error": "❌ <b>Ошибка создания видео</b>\n\n⚠️ Не удалось создать видео по вашему описанию\n🔄 Попробуйте изменить описание или обратитесь в поддержку\n\n🎞 Осталось видео: <b>{videos_left}</b>",
                 "no_videos_left": "😢 <b>Ой-ой! У тебя закончились видео!</b>\n\n💔 Больше не можешь создавать крутые ролики...\n🎬 Но не расстраивайся!\n\n💎 <b>Выбери тариф и продолжай творить:</b>\n🌱 <b>Пробный</b> — 3 видео за ₽390\n✨ <b>Базовый</b> — 10 видео за ₽990\n💎 <b>Максимум</b> — 30 видео за ₽2,190\n\n🔥 <b>Создавай вирусные видео и радуй друзей!</b>",
@@ -122,6 +132,12 @@ LANG = {
                 "create_video": "🎬 <b>Creating Video</b>\n\n📐 Orientation: <b>{orientation}</b>\n🎞 Videos left: <b>{videos_left}</b>\n\n✏️ <b>Describe the scene in simple words:</b>\nWho is in the frame, where the action takes place, what they are doing, atmosphere and weather.\nAdd details if needed: clothing, emotions, lighting, background.\n\n📸 <b>Example:</b>\n<code>Fishermen caught a mermaid-like creature in a boat, fisherman in striped shirt and camo pants pulls the net, creature is feminine, struggles and hisses, phone recording, chest covered with dense scales, slimy, covered in mud.</code>",
                 "video_accepted": "🎬 <b>Description accepted!</b>\n\n📝 <b>Description:</b> {description}\n📐 <b>Orientation:</b> {orientation}\n🎞 <b>Videos left:</b> {videos_left}\n\n⏳ <b>Your video has been queued for creation...</b>",
                 "video_ready": "🎉 <b>Your video is ready!</b>\n\n🎬 Video successfully created via Sora 2\n📹 <b>Video sent to chat above</b>\n🎞 Videos left: <b>{videos_left}</b>\n\n💡 To continue creating, send a new description!",
+                "sora_unavailable": "⚠️ <b>Sora 2 is temporarily unavailable</b>\n\n🔧 The video generation provider is not responding right now\n🕐 Please try again in about <b>{retry_after}</b> sec.\n\n🎞 No video was charged from your balance",
+                "search_usage": "🔎 <b>Search examples</b>\n\nType words after the command, for example:\n<code>/search grandma dinosaur</code>",
+                "search_no_results": "😔 Nothing found for <b>{query}</b>\n\n💡 Try other words or open /examples",
+                "search_results": "🔎 <b>Results for:</b> {query}\n\n📚 Examples found: <b>{count}</b>\n👇 Choose an example:",
+                "inline_subscription_required": "🔒 Examples require a plan — open the bot",
+                "video_queued": "⏳ <b>You are in the video creation queue</b>\n\n📍 Position in queue: <b>{position}</b>\n🕐 Estimated wait: <b>{eta}</b> sec.\n\n📹 The task will be sent to Sora 2 automatically — no need to press anything!",
                 "video_creating": "🎬 <b>Creating video...</b>\n\n⏳ Processing your description through Sora 2\n🔄 This may take 2-3 minutes\n\n📹 Video will be sent to this chat once ready!",
                 "video_error": "❌ <b>Video creation error</b>\n\n⚠️ Could not create video from your description\n🔄 Try changing the description or contact support\n\n🎞 Videos left: <b>{videos_left}</b>",
                 "no_videos_left": "😢 <b>Oops! You're out of videos!</b>\n\n💔 Can't create cool videos anymore...\n🎬 But don't worry!\n\n💎 <b>Choose a tariff and keep creating:</b>\n🌱 <b>Trial</b> — 3 videos for ₽390\n✨ <b>Basic</b> — 10 videos for ₽990\n💎 <b>Maximum</b> — 30 videos for ₽2,190\n\n🔥 <b>Create viral videos and delight your friends!</b>",
@@ -247,6 +263,12 @@ LANG = {
         # Дополнительные ключи
         "btn_buy_tariff": "💳 Comprar tarifa",
         "tariff_selection": "💳 <b>Elige tarifa para comprar:</b>",
+        "sora_unavailable": "⚠️ <b>Sora 2 no está disponible temporalmente</b>\n\n🔧 El proveedor de generación de video no responde en este momento\n🕐 Inténtalo de nuevo en unos <b>{retry_after}</b> seg.\n\n🎞 No se descontó ningún video de tu saldo",
+        "search_usage": "🔎 <b>Buscar ejemplos</b>\n\nEscribe palabras después del comando, por ejemplo:\n<code>/search abuela dinosaurio</code>",
+        "search_no_results": "😔 No se encontró nada para <b>{query}</b>\n\n💡 Prueba otras palabras o abre /examples",
+        "search_results": "🔎 <b>Resultados para:</b> {query}\n\n📚 Ejemplos encontrados: <b>{count}</b>\n👇 Elige un ejemplo:",
+        "inline_subscription_required": "🔒 Ejemplos disponibles con tarifa — abrir el bot",
+        "video_queued": "⏳ <b>Estás en la cola de creación de video</b>\n\n📍 Posición en la cola: <b>{position}</b>\n🕐 Espera estimada: <b>{eta}</b> seg.\n\n📹 La tarea se enviará a Sora 2 automáticamente, ¡no necesitas pulsar nada!",
         "video_creating": "🎬 <b>Creando video...</b>\n\n⏳ Procesando tu descripción a través de Sora 2\n🔄 Esto puede tomar 2-3 minutos\n\n📹 El video se enviará a este chat cuando esté listo!",
         "video_error": "❌ <b>Error al crear video</b>\n\n⚠️ No se pudo crear el video con tu descripción\n🔄 Intenta cambiar la descripción o contacta soporte\n\n🎞 Videos restantes: <b>{videos_left}</b>",
         "video_ready": "🎉 <b>¡Tu video está listo!</b>\n\n🎬 Video creado exitosamente a través de Sora 2\n📹 <b>Video enviado al chat de arriba</b>\n🎞 Videos restantes: <b>{videos_left}</b>\n\n💡 ¡Para continuar creando, envía una nueva descripción!",
@@ -333,6 +355,12 @@ LANG = {
         # مفاتيح إضافية
         "btn_buy_tariff": "💳 شراء خطة",
         "tariff_selection": "💳 <b>اختر خطة للشراء:</b>",
+        "sora_unavailable": "⚠️ <b>Sora 2 غير متاح مؤقتاً</b>\n\n🔧 مزود إنشاء الفيديو لا يستجيب حالياً\n🕐 حاول مرة أخرى بعد حوالي <b>{retry_after}</b> ثانية\n\n🎞 لم يتم خصم أي فيديو من رصيدك",
+        "search_usage": "🔎 <b>البحث في الأمثلة</b>\n\nاكتب الكلمات بعد الأمر، على سبيل المثال:\n<code>/search جدة ديناصور</code>",
+        "search_no_results": "😔 لم يتم العثور على شيء لـ <b>{query}</b>\n\n💡 جرب كلمات أخرى أو افتح /examples",
+        "search_results": "🔎 <b>نتائج البحث عن:</b> {query}\n\n📚 الأمثلة الموجودة: <b>{count}</b>\n👇 اختر مثالاً:",
+        "inline_subscription_required": "🔒 الأمثلة متاحة مع الاشتراك — افتح البوت",
+        "video_queued": "⏳ <b>أنت في قائمة انتظار إنشاء الفيديو</b>\n\n📍 موقعك في القائمة: <b>{position}</b>\n🕐 وقت الانتظار المتوقع: <b>{eta}</b> ثانية\n\n📹 سيتم إرسال المهمة إلى Sora 2 تلقائياً — لا حاجة للضغط على أي شيء!",
         "video_creating": "🎬 <b>إنشاء فيديو...</b>\n\n⏳ معالجة وصفك من خلال Sora 2\n🔄 قد يستغرق هذا 2-3 دقائق\n\n📹 سيتم إرسال الفيديو إلى هذه المحادثة عندما يكون جاهزاً!",
         "video_error": "❌ <b>خطأ في إنشاء الفيديو</b>\n\n⚠️ لا يمكن إنشاء الفيديو من وصفك\n🔄 حاول تغيير الوصف أو اتصل بالدعم\n\n🎞 الفيديوهات المتبقية: <b>{videos_left}</b>",
         "video_ready": "🎉 <b>فيديوك جاهز!</b>\n\n🎬 تم إنشاء الفيديو بنجاح من خلال Sora 2\n📹 <b>تم إرسال الفيديو إلى المحادثة أعلاه</b>\n🎞 الفيديوهات المتبقية: <b>{videos_left}</b>\n\n💡 للمتابعة في الإنشاء، أرسل وصفاً جديداً!",
@@ -419,6 +447,12 @@ LANG = {
         # अतिरिक्त कुंजियां
         "btn_buy_tariff": "💳 योजना खरीदें",
         "tariff_selection": "💳 <b>खरीदने के लिए योजना चुनें:</b>",
+        "sora_unavailable": "⚠️ <b>Sora 2 अस्थायी रूप से अनुपलब्ध है</b>\n\n🔧 वीडियो निर्माण प्रदाता अभी जवाब नहीं दे रहा है\n🕐 लगभग <b>{retry_after}</b> सेकंड बाद फिर से प्रयास करें\n\n🎞 आपके बैलेंस से कोई वीडियो नहीं काटा गया",
+        "search_usage": "🔎 <b>उदाहरण खोजें</b>\n\nकमांड के बाद शब्द लिखें, उदाहरण के लिए:\n<code>/search दादी डायनासोर</code>",
+        "search_no_results": "😔 <b>{query}</b> के लिए कुछ नहीं मिला\n\n💡 अन्य शब्द आज़माएं या /examples खोलें",
+        "search_results": "🔎 <b>खोज परिणाम:</b> {query}\n\n📚 मिले उदाहरण: <b>{count}</b>\n👇 एक उदाहरण चुनें:",
+        "inline_subscription_required": "🔒 उदाहरण टैरिफ के साथ उपलब्ध — बॉट खोलें",
+        "video_queued": "⏳ <b>आप वीडियो निर्माण कतार में हैं</b>\n\n📍 कतार में स्थान: <b>{position}</b>\n🕐 अनुमानित प्रतीक्षा: <b>{eta}</b> सेकंड\n\n📹 कार्य स्वचालित रूप से Sora 2 को भेजा जाएगा — कुछ भी दबाने की आवश्यकता नहीं!",
         "video_creating": "🎬 <b>वीडियो बनाया जा रहा है...</b>\n\n⏳ Sora 2 के माध्यम से आपके विवरण को संसाधित कर रहे हैं\n🔄 इसमें 2-3 मिनट लग सकते हैं\n\n📹 वीडियो इस चैट में भेजा जाएगा जब तैयार हो जाएगा!",
         "video_error": "❌ <b>वीडियो बनाने में त्रुटि</b>\n\n⚠️ आपके विवरण से वीडियो नहीं बना सके\n🔄 विवरण बदलने का प्रयास करें या सहायता से संपर्क करें\n\n🎞 बचे वीडियो: <b>{videos_left}</b>",
         "video_ready": "🎉 <b>आपका वीडियो तैयार है!</b>\n\n🎬 Sora 2 के माध्यम से वीडियो सफलतापूर्वक बनाया गया\n📹 <b>वीडियो ऊपर चैट में भेजा गया</b>\n🎞 बचे वीडियो: <b>{videos_left}</b>\n\n💡 निर्माण जारी रखने के लिए, एक नया विवरण भेजें!",
@@ -447,19 +481,133 @@ LANGUAGE_BUTTONS = {
     "hi": "🇮🇳 हिन्दी"
 }
 
+# === Скомпилированные таблицы переводов ===
+
+_formatter = string.Formatter()
+
+
+class _Template:
+    """Текст с подстановками; список полей известен заранее"""
+
+    __slots__ = ("text", "fields")
+
+    def __init__(self, text: str, fields: frozenset):
+        self.text = text
+        self.fields = fields
+
+    def render(self, kwargs: dict) -> str:
+        return self.text.format(**kwargs)
+
+
+def _placeholders(text: str) -> frozenset:
+    """Имена подстановок шаблона; некорректные скобки — ValueError"""
+    return frozenset(
+        field.split(".")[0].split("[")[0]
+        for _, field, _, _ in _formatter.parse(text)
+        if field is not None
+    )
+
+def compile_translations(source: dict) -> dict:
+    """
+    Таблицы {язык: {ключ: текст}} с уже подставленным английским fallback.
+    Тексты без подстановок хранятся готовыми строками, шаблоны — как _Template.
+    Расхождение подстановок с английским текстом — ошибка при загрузке, а не при ответе пользователю
+    """
+    english = source["en"]
+    english_fields = {key: _placeholders(text) for key, text in english.items()}
+    tables = {}
+    for language, texts in source.items():
+        table = {}
+        for key, text in {**english, **texts}.items():
+            fields = _placeholders(text)
+            expected = english_fields.get(key)
+            if expected is not None and fields != expected:
+                raise ValueError(
+                    f"Translation {language}.{key} has placeholders {sorted(fields)}, expected {sorted(expected)}"
+                )
+            table[key] = _Template(text, fields) if fields else text.format()
+        tables[language] = table
+    return tables
+
+_tables = {}
+_reload_hooks = []
+
+def on_translations_reload(hook):
+    """Зарегистрировать функцию, пересобирающую производные данные после перезагрузки переводов"""
+    _reload_hooks.append(hook)
+    return hook
+
+def reload_translations():
+    """Перечитать переводы из файла без перезапуска бота"""
+    spec = importlib.util.spec_from_file_location("_translations_reload", __file__)
+    fresh = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(fresh)
+    # Проверяем новые переводы до подмены: ошибка в шаблоне не ломает работающий бот
+    compile_translations(fresh.LANG)
+    # Обновляем словари на месте: ссылки из других модулей остаются рабочими
+    LANG.clear()
+    LANG.update(fresh.LANG)
+    LANGUAGE_BUTTONS.clear()
+    LANGUAGE_BUTTONS.update(fresh.LANGUAGE_BUTTONS)
+    for hook in _reload_hooks:
+        hook()
+    logging.info(f"🌍 Translations reloaded: {len(LANG)} languages")
+
+@on_translations_reload
+def _recompile():
+    global _tables
+    _tables = compile_translations(LANG)
+
+_recompile()
+
 def get_text(language: str, key: str, **kwargs) -> str:
     """Получение переведенного текста"""
-    if language not in LANG:
-        language = "en"
-    
-    if key not in LANG[language]:
-        # Fallback на английский
-        if key in LANG["en"]:
-            return LANG["en"][key].format(**kwargs)
+    table = _tables.get(language) or _tables["en"]
+    entry = table.get(key)
+    if entry is None:
         return key
-    
-    return LANG[language][key].format(**kwargs)
+    if entry.__class__ is str:
+        return entry
+    return entry.render(kwargs)
 
 def is_rtl_language(language: str) -> bool:
     """Проверка, является ли язык RTL (справа налево)"""
     return language == "ar"
+
+# === Обратный индекс текстов старых reply-кнопок ===
+
+# Ключи текстов кнопок, которые пользователи ещё могут прислать со старой reply-клавиатуры
+LEGACY_BUTTON_KEYS = (
+    "btn_create_video",
+    "btn_examples",
+    "btn_profile",
+    "btn_help",
+    "btn_language",
+    "btn_buy_foreign",
+    "btn_buy_tariff",
+)
+
+_button_actions = {}  # {текст кнопки на любом языке: ключ кнопки}
+
+def build_button_index() -> dict:
+    """Собрать индекс текст -> ключ кнопки по всем языкам"""
+    index = {}
+    for key in LEGACY_BUTTON_KEYS:
+        for language in LANG:
+            label = get_text(language, key)
+            if index.get(label, key) != key:
+                logging.warning(f"⚠️ Button label {label!r} is used for both {index[label]} and {key}")
+                continue
+            index[label] = key
+    return index
+
+def button_action(text: str):
+    """Ключ старой кнопки по её тексту (одна проверка по словарю) или None"""
+    return _button_actions.get(text)
+
+@on_translations_reload
+def _rebuild_button_index():
+    global _button_actions
+    _button_actions = build_button_index()
+
+_rebuild_button_index()
@@ -0,0 +1,122 @@
+"""
+📡 Сброс локальных кэшей на всех репликах через Postgres LISTEN/NOTIFY
+Реплика, изменившая строку, публикует ключ в канал после записи; остальные реплики
+удаляют его из своего кэша. Пока слушающее соединение потеряно, уведомления могли
+пропасть, поэтому после переподключения кэш очищается целиком
+"""
+
+import asyncio
+import logging
+import uuid
+from typing import Callable, Hashable
+
+import asyncpg
+
+import queries
+
+
+class CacheInvalidationBus:
+    """Публикация и приём сбросов ключей кэша между репликами"""
+
+    def __init__(
+        self,
+        dsn: str,
+        get_pool: Callable,
+        channel: str,
+        on_invalidate: Callable[[str], None],
+        on_reset: Callable[[], None],
+        reconnect_interval: float = 5.0,
+    ):
+        self.dsn = dsn
+        self.get_pool = get_pool
+        self.channel = channel
+        self.on_invalidate = on_invalidate
+        self.on_reset = on_reset
+        self.reconnect_interval = reconnect_interval
+        # Свои уведомления узнаём по префиксу и пропускаем: локальный кэш уже обновлён
+        self.replica_id = uuid.uuid4().hex[:8]
+        self._pending = set()  # ключи, ждущие публикации
+        self._publisher = None
+        self._listener = None
+        self._conn = None
+        self.published = 0
+        self.received = 0
+        self.resets = 0
+        self.errors = 0
+
+    def publish(self, key: Hashable):
+        """Сообщить другим репликам об изменении ключа (пачкой, без ожидания)"""
+        self._pending.add(str(key))
+        if self._publisher is None or self._publisher.done():
+            self._publisher = asyncio.create_task(self._publish_pending())
+
+    async def _publish_pending(self):
+        # Ключи, изменённые в одном шаге event loop, уходят одним запросом;
+        # накопившиеся за время запроса — следующим
+        await asyncio.sleep(0)
+        while self._pending:
+            keys, self._pending = self._pending, set()
+            pool = self.get_pool()
+            if pool is None:
+                return
+            payloads = [f"{self.replica_id}:{key}" for key in keys]
+            try:
+                async with pool.acquire() as conn:
+                    await queries.execute(conn, "notify_cache", self.channel, payloads)
+                self.published += len(payloads)
+            except Exception as e:
+                self.errors += 1
+                logging.warning(f"⚠️ Cache invalidation publish failed ({len(payloads)} keys): {e}")
+
+    def _on_notification(self, conn, pid, channel, payload: str):
+        replica_id, _, key = payload.partition(":")
+        if replica_id == self.replica_id:
+            return
+        self.received += 1
+        self.on_invalidate(key)
+
+    def start(self):
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        logging.info(f"📡 Cache invalidation listener started on channel {self.channel}")
+        while True:
+            try:
+                self._conn = await asyncpg.connect(self.dsn, timeout=10)
+                await self._conn.add_listener(self.channel, self._on_notification)
+                # Всё, что изменилось, пока не слушали, могло остаться в кэше
+                self.on_reset()
+                self.resets += 1
+                while not self._conn.is_closed():
+                    await asyncio.sleep(self.reconnect_interval)
+                logging.warning("⚠️ Cache invalidation listener connection lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logging.warning(f"⚠️ Cache invalidation listener error: {e}")
+            finally:
+                if self._conn is not None and not self._conn.is_closed():
+                    await self._conn.close()
+                self._conn = None
+            await asyncio.sleep(self.reconnect_interval)
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._publisher is not None:
+            await asyncio.gather(self._publisher, return_exceptions=True)
+            self._publisher = None
+
+    def stats(self) -> dict:
+        return {
+            "channel": self.channel,
+            "listening": self._conn is not None and not self._conn.is_closed(),
+            "published": self.published,
+            "received": self.received,
+            "resets": self.resets,
+            "errors": self.errors,
+        }
@@ -0,0 +1,101 @@
+"""
+🎛 Табличная маршрутизация inline-кнопок
+Точные значения callback_data ищутся в словаре, параметризованные (lang_ru, catpage_2, ...)
+разбираются типизированными CallbackData по префиксу — тоже одним обращением к словарю.
+Для каждого действия считается число вызовов, ошибок и время обработки
+"""
+
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery
+
+Handler = Callable[..., Awaitable[Any]]
+
+
+class CallbackDispatcher:
+    """Реестр обработчиков callback_data"""
+
+    def __init__(self, sep: str = "_"):
+        self.sep = sep
+        self._exact: Dict[str, Handler] = {}
+        self._typed: Dict[str, Tuple[Type[CallbackData], Handler]] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self.unknown = 0
+
+    def action(self, *names: str):
+        """Обработчик для точных значений callback_data"""
+        def decorator(handler: Handler) -> Handler:
+            for name in names:
+                if name in self._exact:
+                    raise ValueError(f"Callback action {name!r} is already registered")
+                self._exact[name] = handler
+            return handler
+        return decorator
+
+    def payload(self, factory: Type[CallbackData]):
+        """Обработчик для CallbackData с префиксом; разобранные данные передаются как payload"""
+        prefix = factory.__prefix__
+        if factory.__separator__ != self.sep:
+            raise ValueError(f"{factory.__name__} must use separator {self.sep!r}")
+
+        def decorator(handler: Handler) -> Handler:
+            if prefix in self._typed:
+                raise ValueError(f"Callback prefix {prefix!r} is already registered")
+            self._typed[prefix] = (factory, handler)
+            return handler
+        return decorator
+
+    def resolve(self, data: str) -> Optional[Tuple[str, Handler, Dict[str, Any]]]:
+        """(имя действия, обработчик, доп. аргументы) или None"""
+        handler = self._exact.get(data)
+        if handler is not None:
+            return data, handler, {}
+
+        prefix = data.partition(self.sep)[0]
+        entry = self._typed.get(prefix)
+        if entry is None:
+            return None
+        factory, handler = entry
+        try:
+            payload = factory.unpack(data)
+        except (TypeError, ValueError):
+            return None
+        return prefix, handler, {"payload": payload}
+
+    async def dispatch(self, callback: CallbackQuery, **kwargs) -> bool:
+        """Вызвать обработчик. False — для callback_data нет обработчика"""
+        resolved = self.resolve(callback.data or "")
+        if resolved is None:
+            self.unknown += 1
+            return False
+
+        name, handler, extra = resolved
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+        started = time.perf_counter()
+        try:
+            await handler(callback, **kwargs, **extra)
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            stats["calls"] += 1
+            stats["total_ms"] += elapsed
+            stats["max_ms"] = max(stats["max_ms"], elapsed)
+        return True
+
+    def stats(self) -> dict:
+        actions = {
+            name: {
+                "calls": s["calls"],
+                "errors": s["errors"],
+                "avg_ms": round(s["total_ms"] / s["calls"], 2) if s["calls"] else 0.0,
+                "max_ms": round(s["max_ms"], 2),
+            }
+            for name, s in self._stats.items()
+        }
+        return {"actions": actions, "unknown": self.unknown}
@@ -0,0 +1,37 @@
+"""
+🔘 Типизированные callback_data для параметризованных кнопок
+Формат совпадает с прежними строками (lang_ru, sub_trial, category_animals, catpage_1),
+поэтому кнопки в уже отправленных сообщениях продолжают работать.
+Версия формата — часть префикса: при изменении полей вводится новый префикс (ex -> ex2),
+а старый остаётся зарегистрированным, пока живы сообщения с его кнопками
+"""
+
+from aiogram.filters.callback_data import CallbackData
+
+
+class LanguageCallback(CallbackData, prefix="lang", sep="_"):
+    code: str
+
+
+class SubscriptionCallback(CallbackData, prefix="sub", sep="_"):
+    tariff: str
+
+
+class CategoryCallback(CallbackData, prefix="category", sep="_"):
+    key: str
+
+
+class CategoryPageCallback(CallbackData, prefix="catpage", sep="_"):
+    page: int
+
+
+class ExampleCallback(CallbackData, prefix="ex", sep="_"):
+    """Показать карточку примера: поиск и листание ⏪/⏩ (ex_fishing_3)"""
+    category: str
+    index: int
+
+
+class ExampleCreateCallback(CallbackData, prefix="exc", sep="_"):
+    """Создать видео по примеру с карточки (exc_fishing_3)"""
+    category: str
+    index: int
@@ -0,0 +1,85 @@
+"""
+🔗 Inline-режим: @bot <запрос> отдаёт примеры промптов
+Результаты (InlineQueryResultArticle) строятся один раз при загрузке,
+страницы для запросов кэшируются; ответы Telegram кэширует на своей стороне по cache_time
+"""
+
+import html
+import logging
+
+from aiogram.types import InlineQueryResultArticle, InputTextMessageContent
+
+from utils.cache import TTLCache
+from utils.examples_search import ExamplesSearch, tokenize
+
+# Telegram принимает не больше 50 результатов в одном ответе
+INLINE_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+# Сколько найденных примеров запроса раскладывается по страницам
+MAX_QUERY_RESULTS = 100
+
+
+class ExamplesInline:
+    """Готовые inline-результаты для всех примеров и кэш страниц по запросам"""
+
+    def __init__(self, examples: dict, search: ExamplesSearch, page_size: int = INLINE_PAGE_SIZE,
+                 cache_size: int = 1000, cache_ttl: float = 3600.0):
+        self.search = search
+        self.page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        self._queries = TTLCache(maxsize=cache_size, ttl=cache_ttl)  # {нормализованный запрос: (ключи примеров)}
+        self.served = 0
+        self.build(examples)
+
+    def build(self, examples: dict):
+        """Построить результаты для всех примеров; кэш запросов сбрасывается"""
+        articles = {}
+        for category_key, category in examples.items():
+            category_name = category.get("name", category_key)
+            for index, example in enumerate(category.get("examples", [])):
+                title = example["title"]
+                description = example["description"]
+                articles[(category_key, index)] = InlineQueryResultArticle(
+                    id=f"{category_key}:{index}",
+                    title=title,
+                    description=f"{category_name} · {description[:120]}",
+                    input_message_content=InputTextMessageContent(
+                        message_text=f"🎬 <b>{html.escape(title)}</b>\n\n<code>{html.escape(description)}</code>",
+                        parse_mode="HTML",
+                    ),
+                )
+
+        # Подмена целиком: читатели видят либо старый, либо новый набор
+        self._articles = articles
+        self._browse = tuple(articles)
+        self._queries.clear()
+        logging.info(f"🔗 Inline examples built: {len(articles)} results")
+
+    def _keys(self, query: str) -> tuple:
+        """Ключи примеров для запроса; пустой запрос — все примеры по порядку"""
+        # Запросы с одинаковыми основами слов делят одну запись кэша
+        normalized = " ".join(tokenize(query))
+        if not normalized:
+            return self._browse
+        keys = self._queries.get(normalized)
+        if keys is None:
+            hits = self.search.search(query, limit=MAX_QUERY_RESULTS)
+            keys = tuple((category_key, index) for category_key, index, _ in hits if (category_key, index) in self._articles)
+            self._queries.set(normalized, keys)
+        return keys
+
+    def page(self, query: str, offset: str = "") -> tuple:
+        """(результаты, next_offset) страницы; offset — номер страницы строкой"""
+        try:
+            page = max(0, int(offset or 0))
+        except ValueError:
+            page = 0
+        keys = self._keys(query)
+        start = page * self.page_size
+        end = start + self.page_size
+        self.served += 1
+        results = [self._articles[key] for key in keys[start:end]]
+        next_offset = str(page + 1) if end < len(keys) else ""
+        return results, next_offset
+
+    def stats(self) -> dict:
+        return {"results": len(self._articles), "served": self.served, "queries": self._queries.stats()}
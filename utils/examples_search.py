@@ -0,0 +1,107 @@
+"""
+🔎 Полнотекстовый поиск по библиотеке примеров
+Инвертированный индекс по названиям и описаниям: токенизация с учётом русского языка
+(ё -> е, стоп-слова, отсечение окончаний), поиск по префиксу и ранжирование по IDF
+"""
+
+import bisect
+import logging
+import math
+import re
+from collections import defaultdict
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+STOP_WORDS = frozenset(
+    "и в во на с со по из к у за от до не ни что как а но или же то это так его ее её их он она они "
+    "мы вы я ты бы ли уже еще ещё для при над под без про через после перед где все всё весь "
+    "the a an of and or in on at to with".split()
+)
+
+# Окончания русских слов, от длинных к коротким
+_ENDINGS = tuple(sorted(
+    "ами ями ого его ому ему ыми ими ых их ой ей ий ый ая яя ое ее ые ие ую юю ов ев ам ям ах ях ом ем ию ия ь ы и а я о е у ю".split(),
+    key=len,
+    reverse=True,
+))
+
+# Вес совпадения: в названии важнее, чем в описании
+TITLE_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+MIN_STEM = 3
+
+
+def stem(word: str) -> str:
+    """Грубое отсечение окончания: 'бабки' и 'бабкой' дают общий префикс 'бабк'"""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text: str) -> list:
+    """Нормализованные основы слов текста"""
+    tokens = []
+    for word in _TOKEN_RE.findall(text.lower().replace("ё", "е")):
+        if len(word) < 2 or word in STOP_WORDS:
+            continue
+        tokens.append(stem(word))
+    return tokens
+
+
+class ExamplesSearch:
+    """Индекс: основа слова -> {(раздел, индекс примера): вес}"""
+
+    def __init__(self, examples: dict):
+        self.build(examples)
+
+    def build(self, examples: dict):
+        postings = defaultdict(lambda: defaultdict(float))
+        docs = 0
+        for category_key, category in examples.items():
+            for index, example in enumerate(category.get("examples", [])):
+                doc = (category_key, index)
+                docs += 1
+                for token in tokenize(example.get("title", "")):
+                    postings[token][doc] += TITLE_WEIGHT
+                for token in tokenize(example.get("description", "")):
+                    postings[token][doc] += DESCRIPTION_WEIGHT
+
+        # Редкие слова важнее частых
+        self._idf = {term: math.log(1 + docs / len(hits)) for term, hits in postings.items()}
+        self._postings = {term: dict(hits) for term, hits in postings.items()}
+        self._terms = sorted(self._postings)
+        self.documents = docs
+        logging.info(f"🔎 Examples search index built: {docs} examples, {len(self._terms)} terms")
+
+    def _expand(self, token: str) -> list:
+        """Все термы индекса, начинающиеся с token (поиск по префиксу)"""
+        start = bisect.bisect_left(self._terms, token)
+        end = bisect.bisect_left(self._terms, token + "￿")
+        return self._terms[start:end]
+
+    def search(self, query: str, limit: int = 8) -> list:
+        """[(раздел, индекс, score)]: сначала примеры, совпавшие с большим числом слов запроса"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for token in tokens:
+            best = {}
+            for term in self._expand(token):
+                # Точное совпадение основы ценнее совпадения по префиксу
+                boost = 1.0 if term == token else 0.5
+                idf = self._idf[term]
+                for doc, weight in self._postings[term].items():
+                    best[doc] = max(best.get(doc, 0.0), weight * idf * boost)
+            for doc, score in best.items():
+                scores[doc] += score
+                matched[doc] += 1
+
+        ranked = sorted(scores, key=lambda doc: (matched[doc], scores[doc]), reverse=True)
+        return [(doc[0], doc[1], round(scores[doc], 3)) for doc in ranked[:limit]]
+
+    def stats(self) -> dict:
+        return {"documents": self.documents, "terms": len(self._terms)}
@@ -0,0 +1,130 @@
+"""
+📚 Предрасчитанный браузер примеров
+Страницы разделов и карточки примеров строятся один раз при загрузке:
+листание примеров — это поиск в словаре, без сборки текста и клавиатур.
+Кнопки карточки несут раздел и индекс в callback_data, поэтому листание не хранит состояния пользователя
+"""
+
+import logging
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from translations import get_text
+from utils.callbacks import CategoryCallback, CategoryPageCallback, ExampleCallback, ExampleCreateCallback
+
+EXAMPLES_INTRO_TEXT = "🎬 <b>Готовые идеи для создания вирусных видео!</b>\n\n<b>Как использовать:</b>\n1️⃣ Выбери понравившийся пример\n2️⃣ Скопируй текст\n3️⃣ Вставь в бот и создай видео!\nИли измени под свою идею 💡\n\n<b>Кнопки с разделами и примерами 👇</b>"
+
+# Разделов на одной странице списка
+CATEGORIES_PER_PAGE = 6
+
+
+class ExamplesView:
+    """Готовые страницы разделов и карточки примеров для всех языков"""
+
+    def __init__(self, examples: dict, languages, page_size: int = CATEGORIES_PER_PAGE):
+        self.page_size = page_size
+        self.languages = tuple(languages)
+        self._pages = {}  # {(page, language): markup}
+        self._cards = {}  # {(category_key, index): text}
+        self._card_markups = {}  # {(category_key, index, language): markup}
+        self._counts = {}  # {category_key: число примеров}
+        self.build(examples)
+
+    def build(self, examples: dict):
+        """Построить все страницы и карточки"""
+        categories = list(examples)
+        self.total_pages = max(1, -(-len(categories) // self.page_size))
+
+        pages = {}
+        for page in range(self.total_pages):
+            page_categories = categories[page * self.page_size:(page + 1) * self.page_size]
+            for language in self.languages:
+                pages[(page, language)] = self._categories_markup(examples, page_categories, page, language)
+
+        cards = {}
+        counts = {}
+        for category_key, category in examples.items():
+            items = category.get("examples", [])
+            counts[category_key] = len(items)
+            category_name = category.get("name", category_key)
+            for index, example in enumerate(items):
+                cards[(category_key, index)] = (
+                    f"📚 <b>{category_name}</b>\n\n<b>{example['title']}</b>\n\n"
+                    f"<code>{example['description']}</code>\n\n<i>{index + 1} из {len(items)}</i>"
+                )
+
+        # Подмена целиком: читатели видят либо старый, либо новый набор
+        self._pages = pages
+        self._cards = cards
+        self._counts = counts
+        self._card_markups = {
+            (category_key, index, language): self._card_markup(category_key, index, count, language)
+            for category_key, count in counts.items()
+            for index in range(count)
+            for language in self.languages
+        }
+        logging.info(f"📚 Examples view built: {len(categories)} categories, {len(cards)} cards, {self.total_pages} pages")
+
+    def _categories_markup(self, examples: dict, page_categories: list, page: int, language: str) -> InlineKeyboardMarkup:
+        keyboard = []
+        for category_key in page_categories:
+            category_name = examples[category_key].get("name", category_key)
+            keyboard.append([InlineKeyboardButton(text=category_name, callback_data=CategoryCallback(key=category_key).pack())])
+
+        # Навигационные кнопки
+        nav_buttons = []
+        if page > 0:
+            nav_buttons.append(InlineKeyboardButton(text="⏪ Назад", callback_data=CategoryPageCallback(page=page - 1).pack()))
+        if page < self.total_pages - 1:
+            # Первая страница: "Еще примеры", средние: "Еще"
+            more_text = "⏩ Еще" if page > 0 else "⏩ Еще примеры"
+            nav_buttons.append(InlineKeyboardButton(text=more_text, callback_data=CategoryPageCallback(page=page + 1).pack()))
+        if nav_buttons:
+            keyboard.append(nav_buttons)
+
+        keyboard.append([InlineKeyboardButton(
+            text=get_text(language, "btn_main_menu"),
+            callback_data="main_menu"
+        )])
+        return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+    def _card_markup(self, category_key: str, index: int, count: int, language: str) -> InlineKeyboardMarkup:
+        # Листание по кругу: соседние индексы зашиты в кнопки
+        prev_data = ExampleCallback(category=category_key, index=(index - 1) % count).pack()
+        next_data = ExampleCallback(category=category_key, index=(index + 1) % count).pack()
+        return InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(text="⏪ Назад", callback_data=prev_data),
+                InlineKeyboardButton(text="▶️ Создать", callback_data=ExampleCreateCallback(category=category_key, index=index).pack()),
+                InlineKeyboardButton(text="⏩ Далее", callback_data=next_data)
+            ],
+            [InlineKeyboardButton(text="⏹️ Другой раздел", callback_data="example_back_to_categories")],
+            [InlineKeyboardButton(
+                text=get_text(language, "btn_main_menu"),
+                callback_data="main_menu"
+            )]
+        ])
+
+    def _language(self, language: str) -> str:
+        return language if language in self.languages else "en"
+
+    def categories_page(self, page: int, language: str) -> InlineKeyboardMarkup:
+        """Клавиатура страницы разделов; несуществующая страница — первая"""
+        if not 0 <= page < self.total_pages:
+            page = 0
+        return self._pages[(page, self._language(language))]
+
+    def count(self, category_key: str) -> int:
+        return self._counts.get(category_key, 0)
+
+    def card(self, category_key: str, index: int, language: str):
+        """(текст, клавиатура, индекс) карточки примера или None, если раздел пуст"""
+        count = self._counts.get(category_key, 0)
+        if not count:
+            return None
+        if not 0 <= index < count:
+            index = 0
+        return self._cards[(category_key, index)], self._card_markups[(category_key, index, self._language(language))], index
+
+    def stats(self) -> dict:
+        return {"categories": len(self._counts), "cards": len(self._cards), "pages": self.total_pages}
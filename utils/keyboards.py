@@ -2,9 +2,52 @@
 🌍 Клавиатуры с поддержкой мультиязычности для SORA 2
 """
 
+from functools import lru_cache
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
-from translations import get_text, LANGUAGE_BUTTONS
+from translations import get_text, LANG, LANGUAGE_BUTTONS, on_translations_reload
+from utils.callbacks import LanguageCallback
+
+# Клавиатуры зависят только от языка, поэтому каждая строится один раз на язык.
+# Возвращается общий объект: изменять его после получения нельзя
+_language_keyboards = []
+_static_keyboards = []
+
+def language_keyboard(builder):
+    """Кэш клавиатуры по языку"""
+    cached = lru_cache(maxsize=16)(builder)
+    _language_keyboards.append(cached)
+    return cached
+
+def static_keyboard(builder):
+    """Кэш клавиатуры без параметров"""
+    cached = lru_cache(maxsize=1)(builder)
+    _static_keyboards.append(cached)
+    return cached
+
+def warm_keyboards():
+    """Построить все клавиатуры для всех языков заранее (при старте)"""
+    for builder in _static_keyboards:
+        builder()
+    for builder in _language_keyboards:
+        for language in LANG:
+            builder(language)
+
+@on_translations_reload
+def reset_keyboards():
+    """Сбросить кэш после перезагрузки переводов"""
+    for builder in _static_keyboards + _language_keyboards:
+        builder.cache_clear()
+    warm_keyboards()
+
+def keyboard_cache_stats() -> dict:
+    stats = {}
+    for builder in _static_keyboards + _language_keyboards:
+        info = builder.cache_info()
+        stats[builder.__wrapped__.__name__] = {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+    return stats
 
+@language_keyboard
 def main_menu(language: str = "en") -> InlineKeyboardMarkup:
     """Главное меню (inline) с учетом языка"""
     markup = InlineKeyboardMarkup(inline_keyboard=[
@@ -37,23 +80,25 @@ def main_menu(language: str = "en") -> InlineKeyboardMarkup:
     ])
     return markup
 
+@static_keyboard
 def language_selection() -> InlineKeyboardMarkup:
     """Клавиатура выбора языка"""
     markup = InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text=LANGUAGE_BUTTONS["ru"], callback_data="lang_ru"),
-            InlineKeyboardButton(text=LANGUAGE_BUTTONS["en"], callback_data="lang_en")
+            InlineKeyboardButton(text=LANGUAGE_BUTTONS["ru"], callback_data=LanguageCallback(code="ru").pack()),
+            InlineKeyboardButton(text=LANGUAGE_BUTTONS["en"], callback_data=LanguageCallback(code="en").pack())
         ],
         [
-            InlineKeyboardButton(text=LANGUAGE_BUTTONS["es"], callback_data="lang_es"),
-            InlineKeyboardButton(text=LANGUAGE_BUTTONS["ar"], callback_data="lang_ar")
+            InlineKeyboardButton(text=LANGUAGE_BUTTONS["es"], callback_data=LanguageCallback(code="es").pack()),
+            InlineKeyboardButton(text=LANGUAGE_BUTTONS["ar"], callback_data=LanguageCallback(code="ar").pack())
         ],
         [
-            InlineKeyboardButton(text=LANGUAGE_BUTTONS["hi"], callback_data="lang_hi")
+            InlineKeyboardButton(text=LANGUAGE_BUTTONS["hi"], callback_data=LanguageCallback(code="hi").pack())
         ]
     ])
     return markup
 
+@language_keyboard
 def orientation_menu(language: str = "en") -> InlineKeyboardMarkup:
     """Меню выбора ориентации видео"""
     markup = InlineKeyboardMarkup(inline_keyboard=[
@@ -76,6 +121,7 @@ def orientation_menu(language: str = "en") -> InlineKeyboardMarkup:
     ])
     return markup
 
+@language_keyboard
 def video_confirmation_keyboard(language: str = "en") -> InlineKeyboardMarkup:
     """Клавиатура подтверждения создания видео"""
     markup = InlineKeyboardMarkup(inline_keyboard=[
@@ -98,6 +144,7 @@ def video_confirmation_keyboard(language: str = "en") -> InlineKeyboardMarkup:
     ])
     return markup
 
+@language_keyboard
 def video_ready_keyboard(language: str = "en") -> InlineKeyboardMarkup:
     """Клавиатура после создания видео"""
     markup = InlineKeyboardMarkup(inline_keyboard=[
@@ -114,6 +161,7 @@ def video_ready_keyboard(language: str = "en") -> InlineKeyboardMarkup:
     ])
     return markup
 
+@language_keyboard
 def support_sent_keyboard(language: str = "en") -> InlineKeyboardMarkup:
     """Клавиатура после отправки сообщения в поддержку"""
     markup = InlineKeyboardMarkup(inline_keyboard=[
@@ -132,6 +180,7 @@ def support_sent_keyboard(language: str = "en") -> InlineKeyboardMarkup:
     ])
     return markup
 
+@language_keyboard
 def help_keyboard(language: str = "en") -> InlineKeyboardMarkup:
     """Клавиатура для помощи с кнопкой отмены"""
     markup = InlineKeyboardMarkup(inline_keyboard=[
@@ -146,6 +195,7 @@ def help_keyboard(language: str = "en") -> InlineKeyboardMarkup:
     ])
     return markup
 
+@language_keyboard
 def tariff_selection(language: str = "en") -> InlineKeyboardMarkup:
     """Клавиатура выбора тарифов для покупки"""
     markup = InlineKeyboardMarkup(inline_keyboard=[
@@ -180,4 +230,38 @@ def tariff_selection(language: str = "en") -> InlineKeyboardMarkup:
             )
         ]
     ])
-    return markup
\ No newline at end of file
+    return markup
+
+@language_keyboard
+def change_orientation_keyboard(language: str = "en") -> InlineKeyboardMarkup:
+    """Клавиатура под инструкцией после готового видео: смена ориентации"""
+    markup = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(
+            text=get_text(language, "btn_change_orientation"),
+            callback_data="change_orientation"
+        )],
+        [InlineKeyboardButton(
+            text=get_text(language, "btn_main_menu"),
+            callback_data="main_menu"
+        )]
+    ])
+    return markup
+
+@language_keyboard
+def foreign_tariffs_keyboard(language: str = "en") -> InlineKeyboardMarkup:
+    """Ссылки на тарифы Tribute для иностранных пользователей"""
+    trial_name = get_text(language, "foreign_trial")
+    basic_name = get_text(language, "foreign_basic")
+    premium_name = get_text(language, "foreign_premium")
+    videos_word = get_text(language, "videos")
+    
+    markup = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"🌱 {trial_name} — 3 {videos_word} — €5", url="https://web.tribute.tg/p/lEw")],
+        [InlineKeyboardButton(text=f"✨ {basic_name} — 10 {videos_word} — €12", url="https://web.tribute.tg/p/lEu")],
+        [InlineKeyboardButton(text=f"💎 {premium_name} — 30 {videos_word} — €25", url="https://web.tribute.tg/p/lEv")],
+        [InlineKeyboardButton(
+            text=get_text(language, "btn_main_menu"),
+            callback_data="main_menu"
+        )]
+    ])
+    return markup
@@ -0,0 +1,102 @@
+"""
+👤 Middleware контекста пользователя для SORA 2
+Пользователь загружается один раз на апдейт и передаётся в хендлеры как user_ctx,
+сессия диалога синхронизируется с общим хранилищем один раз до и после апдейта
+"""
+
+import contextvars
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+_current_user_ctx = contextvars.ContextVar("current_user_ctx", default=None)
+
+
+class UserContext:
+    """Данные пользователя в рамках одного апдейта"""
+
+    __slots__ = ("user_id", "_loader", "_user", "_loaded", "dirty", "loads")
+
+    def __init__(self, user_id: int, loader: Callable[[int], Awaitable[Any]]):
+        self.user_id = user_id
+        self._loader = loader
+        self._user = None
+        self._loaded = False
+        self.dirty = False
+        self.loads = 0
+
+    async def get(self):
+        """Строка пользователя; перечитывается только после записи в БД"""
+        if not self._loaded or self.dirty:
+            self._user = await self._loader(self.user_id)
+            self._loaded = True
+            self.dirty = False
+            self.loads += 1
+        return self._user
+
+    async def language(self, default: str = "en") -> str:
+        """Язык пользователя"""
+        user = await self.get()
+        return user.get("language", default) if user else default
+
+    def mark_dirty(self):
+        self.dirty = True
+
+
+def mark_user_dirty(user_id: int):
+    """Отметить, что строка пользователя изменена в текущем апдейте"""
+    ctx = _current_user_ctx.get()
+    if ctx is not None and ctx.user_id == user_id:
+        ctx.mark_dirty()
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """Создаёт UserContext для каждого апдейта с известным отправителем"""
+
+    def __init__(self, loader: Callable[[int], Awaitable[Any]]):
+        self.loader = loader
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user is None:
+            return await handler(event, data)
+
+        ctx = UserContext(from_user.id, self.loader)
+        data["user_ctx"] = ctx
+        token = _current_user_ctx.set(ctx)
+        try:
+            return await handler(event, data)
+        finally:
+            _current_user_ctx.reset(token)
+
+
+class SessionMiddleware(BaseMiddleware):
+    """Сессия пользователя читается из общего хранилища до хендлера и записывается после"""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        if from_user is None or self.store.backend is None:
+            return await handler(event, data)
+        # Inline-запрос приходит на каждое нажатие клавиши, а сессию не читает и не меняет
+        if getattr(event, "inline_query", None) is not None:
+            return await handler(event, data)
+
+        await self.store.load(from_user.id)
+        try:
+            return await handler(event, data)
+        finally:
+            await self.store.flush(from_user.id)
@@ -0,0 +1,261 @@
+"""
+📤 Планировщик исходящих запросов к Bot API
+Request-middleware сессии бота: каждый запрос в чат проходит через общий token bucket бота,
+новые сообщения (send*, copy*, forward*) — ещё и через token bucket чата; правки и удаления
+лимитом чата не ограничены. Места выдаются по приоритету до траты токенов чата: доставка видео
+и платёжные уведомления раньше ответов хендлеров, ответы раньше косметики (удаление сообщений,
+снятие кнопок). На 429 на паузу retry_after ставится только этот чат и запрос повторяется;
+вся выдача останавливается, если 429 пришли из нескольких чатов подряд или на запрос не в чат
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Dict
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+from utils.rate_limit import TokenBucket
+
+# Полосы приоритета: меньше — раньше
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITY_BULK = 3  # массовые рассылки: только когда остальным полосам нечего отправлять
+LANE_NAMES = {PRIORITY_HIGH: "high", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low", PRIORITY_BULK: "bulk"}
+
+# Косметика всегда идёт в нижней полосе
+LOW_PRIORITY_METHODS = frozenset({"deleteMessage", "deleteMessages", "editMessageReplyMarkup", "sendChatAction"})
+
+# Лимит ~1 сообщение в секунду на чат касается новых сообщений
+CHAT_LIMITED_PREFIXES = ("send", "copy", "forward")
+
+_priority = contextvars.ContextVar("outbound_priority", default=None)
+
+
+def set_outbound_priority(lane: int):
+    """Полоса для запросов текущей задачи (и задач, созданных из неё)"""
+    _priority.set(lane)
+
+
+@contextlib.contextmanager
+def outbound_priority(lane: int):
+    """Полоса для запросов внутри блока with"""
+    token = _priority.set(lane)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """Лимиты Telegram на отправку: общий на бота и на каждый чат"""
+
+    def __init__(
+        self,
+        global_rate: float = 25.0,
+        chat_rate: float = 1.0,
+        group_rate: float = 20 / 60,
+        chat_burst: float = 3.0,
+        max_retries: int = 3,
+        max_chats: int = 10000,
+        flood_chats: int = 3,
+        flood_window: float = 10.0,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        # Столько разных чатов с 429 за flood_window секунд — признак общего лимита бота
+        self.flood_chats = flood_chats
+        self.flood_window = flood_window
+        self._floods = deque()  # (monotonic-время, chat_id) последних 429
+        self._chats: Dict[int, TokenBucket] = {}
+        self._paused_until: Dict[int, float] = {}  # {chat_id: monotonic-время окончания паузы}
+        self._global_paused_until = 0.0
+        self._waiters = []  # (полоса, порядковый номер, chat_id, лимит чата, future)
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._granter = None
+        self.sent = {lane: 0 for lane in LANE_NAMES}
+        self.total_wait = {lane: 0.0 for lane in LANE_NAMES}
+        self.max_wait = {lane: 0.0 for lane in LANE_NAMES}
+        self.retry_after = 0
+        self.gave_up = 0
+        self.global_pauses = 0
+
+    def _lane(self, method) -> int:
+        lane = _priority.get()
+        if lane == PRIORITY_BULK:
+            return lane
+        if method.__api_method__ in LOW_PRIORITY_METHODS:
+            return PRIORITY_LOW
+        if lane is not None:
+            return lane
+        return PRIORITY_HIGH if method.__api_method__ == "sendVideo" else PRIORITY_NORMAL
+
+    @staticmethod
+    def _chat_limited(method) -> bool:
+        name = method.__api_method__
+        return name.startswith(CHAT_LIMITED_PREFIXES) and name != "sendChatAction"
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                # Полные бакеты ничего не ограничивают — их можно забыть
+                for key in [key for key, b in self._chats.items() if b.available() >= b.capacity]:
+                    del self._chats[key]
+            # Группы (отрицательный id) — около 20 сообщений в минуту
+            rate = self.group_rate if isinstance(chat_id, int) and chat_id < 0 else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, self.chat_burst)
+        return bucket
+
+    def _ensure_granter(self):
+        if self._granter is None or self._granter.done():
+            self._wakeup = asyncio.Event()
+            self._granter = asyncio.create_task(self._grant_loop())
+
+    def _pick(self):
+        """
+        Самый приоритетный ожидающий, чей чат может принять запрос прямо сейчас: (запись, 0).
+        Если такого нет — (None, секунд до ближайшего освобождения чата)
+        """
+        now = time.monotonic()
+        self._waiters = [entry for entry in self._waiters if not entry[4].done()]
+        wait = None
+        for entry in sorted(self._waiters):
+            _, _, chat_id, limited, _ = entry
+            delay = 0.0
+            paused = self._paused_until.get(chat_id)
+            if paused is not None:
+                if paused > now:
+                    delay = paused - now
+                else:
+                    del self._paused_until[chat_id]
+            if not delay and limited:
+                delay = self._chat_bucket(chat_id).time_until_available()
+            if not delay:
+                return entry, 0.0
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    async def _grant_loop(self):
+        """Выдаёт места по приоритету: токен чата тратит только тот, до кого дошла очередь"""
+        while True:
+            self._wakeup.clear()
+            delay = max(self._global_paused_until - time.monotonic(), self.global_bucket.time_until_available())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            entry, delay = self._pick()
+            if entry is None:
+                # Никого или все упёрлись в лимит своего чата: ждём освобождения чата или нового запроса
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._waiters.remove(entry)
+            _, _, chat_id, limited, future = entry
+            if limited:
+                self._chat_bucket(chat_id).try_acquire()
+            self.global_bucket.try_acquire()
+            future.set_result(None)
+
+    async def _acquire(self, chat_id, lane: int, limited: bool):
+        self._ensure_granter()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((lane, next(self._seq), chat_id, limited, future))
+        self._wakeup.set()
+        await future
+
+    def _pause_all(self, until: float):
+        if until > self._global_paused_until:
+            self._global_paused_until = until
+            self.global_pauses += 1
+
+    def _on_flood(self, chat_id, retry_after: float):
+        """429 в чате: пауза чата, а если так же упираются и другие чаты — пауза всей выдачи"""
+        now = time.monotonic()
+        until = now + retry_after
+        self._paused_until[chat_id] = until
+        self._floods.append((now, chat_id))
+        while self._floods and self._floods[0][0] < now - self.flood_window:
+            self._floods.popleft()
+        if len({flood_chat for _, flood_chat in self._floods}) >= self.flood_chats:
+            logging.warning(f"⚠️ Telegram flood limits in {self.flood_chats}+ chats within {self.flood_window:.0f}s: pausing all requests for {retry_after}s")
+            self._pause_all(until)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        # Запросы не в чат (getUpdates, answerCallbackQuery, setWebhook...) лимитам не подлежат,
+        # но их 429 — это лимит всего бота
+        if chat_id is None:
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                logging.warning(f"⚠️ Telegram flood limit for {method.__api_method__}: pausing all requests for {e.retry_after}s")
+                self._pause_all(time.monotonic() + e.retry_after)
+                raise
+
+        lane = self._lane(method)
+        limited = self._chat_limited(method)
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            await self._acquire(chat_id, lane, limited)
+            waited = time.monotonic() - started
+            self.total_wait[lane] += waited
+            self.max_wait[lane] = max(self.max_wait[lane], waited)
+            try:
+                response = await make_request(bot, method)
+                self.sent[lane] += 1
+                return response
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                if attempt >= self.max_retries:
+                    self.gave_up += 1
+                    raise
+                logging.warning(f"⚠️ Telegram flood limit for chat {chat_id}: retry after {e.retry_after}s ({method.__api_method__})")
+                self._on_flood(chat_id, e.retry_after)
+
+    async def stop(self):
+        if self._granter is not None:
+            self._granter.cancel()
+            await asyncio.gather(self._granter, return_exceptions=True)
+            self._granter = None
+        for *_, future in self._waiters:
+            if not future.done():
+                future.cancel()
+        self._waiters.clear()
+
+    def stats(self) -> dict:
+        waiting = {name: 0 for name in LANE_NAMES.values()}
+        for lane, *_, future in self._waiters:
+            if not future.done():
+                waiting[LANE_NAMES[lane]] += 1
+        now = time.monotonic()
+        return {
+            "waiting": waiting,
+            "sent": {LANE_NAMES[lane]: count for lane, count in self.sent.items()},
+            "avg_wait_seconds": {
+                LANE_NAMES[lane]: round(self.total_wait[lane] / self.sent[lane], 4) if self.sent[lane] else 0.0
+                for lane in LANE_NAMES
+            },
+            "max_wait_seconds": {LANE_NAMES[lane]: round(wait, 4) for lane, wait in self.max_wait.items()},
+            "retry_after": self.retry_after,
+            "gave_up": self.gave_up,
+            "paused_chats": sum(1 for until in self._paused_until.values() if until > now),
+            "global_paused_seconds": round(max(self._global_paused_until - now, 0.0), 2),
+            "global_pauses": self.global_pauses,
+            "chats": len(self._chats),
+            "global_tokens": round(self.global_bucket.available(), 2),
+        }
@@ -0,0 +1,49 @@
+"""
+⏱ Token bucket для ограничения частоты запросов к внешним API
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Токены пополняются со скоростью rate в секунду, но не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float):
+        """Изменить скорость пополнения (уже накопленные токены сохраняются)"""
+        self._refill()
+        self.rate = rate
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def time_until_available(self, tokens: float = 1.0) -> float:
+        """Сколько секунд ждать, пока накопится нужное число токенов"""
+        self._refill()
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1.0):
+        """Дождаться и забрать токены"""
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.time_until_available(tokens))
@@ -0,0 +1,142 @@
+"""
+🛡 Примитивы устойчивости для внешних API: circuit breaker, адаптивный таймаут, backoff
+"""
+
+import random
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Размыкается, когда доля ошибок за окно превышает порог; через reset_timeout пропускает одну пробу"""
+
+    def __init__(self, error_rate: float = 0.5, min_calls: int = 10, window: float = 60.0, reset_timeout: float = 30.0):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self._calls = deque()  # (time, ok)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.opened = 0
+        self.rejected = 0
+
+    def _trim(self, now: float):
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+        return self._state
+
+    def available(self) -> bool:
+        """Пропустит ли breaker запрос (без захвата пробы) — для ранней проверки в хендлерах"""
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and not self._probe_in_flight)
+
+    def retry_after(self) -> int:
+        """Через сколько секунд breaker попробует замкнуться"""
+        if self.state != OPEN:
+            return 0
+        return max(1, int(self.reset_timeout - (time.monotonic() - self._opened_at)))
+
+    def allow(self) -> bool:
+        """Захватить право на запрос"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def release(self):
+        """Вернуть пробу без результата (запрос отменён): следующий запрос сможет пробовать снова"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        now = time.monotonic()
+        if self._state == HALF_OPEN:
+            self._state = CLOSED
+            self._calls.clear()
+        self._probe_in_flight = False
+        self._calls.append((now, True))
+        self._trim(now)
+
+    def record_failure(self):
+        now = time.monotonic()
+        self._probe_in_flight = False
+        if self._state == HALF_OPEN:
+            self._open(now)
+            return
+        self._calls.append((now, False))
+        self._trim(now)
+        failures = sum(1 for _, ok in self._calls if not ok)
+        if self._state == CLOSED and len(self._calls) >= self.min_calls and failures / len(self._calls) >= self.error_rate:
+            self._open(now)
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self.opened += 1
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        self._trim(now)
+        failures = sum(1 for _, ok in self._calls if not ok)
+        return {
+            "state": self.state,
+            "window_calls": len(self._calls),
+            "window_failures": failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_after": self.retry_after(),
+        }
+
+
+class LatencyTracker:
+    """Таймаут по наблюдаемым задержкам: перцентиль * запас, в пределах [minimum, maximum]"""
+
+    def __init__(self, minimum: float, maximum: float, percentile: float = 0.99, headroom: float = 2.0, samples: int = 200, warmup: int = 20):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.percentile = percentile
+        self.headroom = headroom
+        self.warmup = warmup
+        self._samples = deque(maxlen=samples)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def timeout(self) -> float:
+        """Пока замеров мало — максимальный таймаут"""
+        if len(self._samples) < self.warmup:
+            return self.maximum
+        return min(self.maximum, max(self.minimum, self.quantile(self.percentile) * self.headroom))
+
+    def stats(self) -> dict:
+        return {
+            "samples": len(self._samples),
+            "p50": round(self.quantile(0.5), 3),
+            "p99": round(self.quantile(0.99), 3),
+            "timeout": round(self.timeout(), 3),
+        }
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Экспоненциальная задержка с full jitter (attempt начинается с 1)"""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
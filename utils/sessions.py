@@ -0,0 +1,292 @@
+"""
+🧾 Состояние диалога пользователей
+Один компактный объект на пользователя вместо десятка глобальных словарей.
+Сессии хранятся в одном LRU-словаре: простаивающие дольше TTL и лишние сверх maxsize вытесняются.
+С общим хранилищем (SessionBackend) локальный словарь работает как кэш: сессия читается
+в начале апдейта и записывается в конце одним запросом, конфликты реплик ловятся по версии
+"""
+
+import json
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import queries
+
+
+class UserSession:
+    """Состояние одного пользователя между апдейтами"""
+
+    __slots__ = (
+        "user_id",
+        "orientation",               # выбранная ориентация видео
+        "video_request",             # {'description': str, 'orientation': str} до подтверждения
+        "prompt_message_id",         # сообщение с просьбой прислать промпт
+        "confirmation_message_id",   # сообщение подтверждения
+        "video_message_id",          # сообщение с готовым видео и кнопками
+        "example_for_creation",      # промпт примера, выбранного для создания видео
+        "waiting_for_support",       # следующее сообщение — вопрос в поддержку
+        "touched_at",
+        "version",                   # версия в общем хранилище (0 — ещё не сохранялась)
+        "synced",                    # поля на момент последней синхронизации с хранилищем
+    )
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.orientation = None
+        self.video_request = None
+        self.prompt_message_id = None
+        self.confirmation_message_id = None
+        self.video_message_id = None
+        self.example_for_creation = None
+        self.waiting_for_support = False
+        self.touched_at = time.monotonic()
+        self.version = 0
+        self.synced = None
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in PERSISTED_FIELDS}
+
+    def apply(self, data: dict):
+        """Заполнить поля из хранилища; неизвестные ключи игнорируются"""
+        for name in PERSISTED_FIELDS:
+            if name in data:
+                setattr(self, name, data[name])
+
+    def size(self) -> int:
+        """Примерный объём в байтах вместе со значениями полей"""
+        total = sys.getsizeof(self)
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is None or value is True or value is False:
+                continue
+            total += sys.getsizeof(value)
+            if isinstance(value, dict):
+                total += sum(sys.getsizeof(v) for v in value.values())
+        return total
+
+
+# Поля, которые переживают перезапуск и видны другим репликам
+PERSISTED_FIELDS = tuple(name for name in UserSession.__slots__ if name not in ("user_id", "touched_at", "version", "synced"))
+_DEFAULTS = UserSession(0).to_dict()
+
+
+class SessionBackend:
+    """Общее хранилище сессий: {user_id: (поля, версия)}"""
+
+    async def load(self, user_id: int) -> Optional[Tuple[dict, int]]:
+        raise NotImplementedError
+
+    async def save(self, user_id: int, data: dict, expected_version: int) -> Optional[int]:
+        """Записать, если версия в хранилище равна expected_version. Новая версия или None при конфликте"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemorySessionBackend(SessionBackend):
+    """
+    Хранилище в памяти процесса: для одной реплики и как локальная замена общего хранилища.
+    С ttl ведёт себя как user_sessions: просроченная строка не читается и перезаписывается
+    без проверки версии, а после purge() вставляется заново с версии 1
+    """
+
+    def __init__(self, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._data = {}  # {user_id: (json, version, updated_at)}
+
+    def _expired(self, item) -> bool:
+        return self.ttl is not None and item[2] <= self.clock() - self.ttl
+
+    async def load(self, user_id: int):
+        item = self._data.get(user_id)
+        if item is None or self._expired(item):
+            return None
+        return json.loads(item[0]), item[1]
+
+    async def save(self, user_id: int, data: dict, expected_version: int):
+        item = self._data.get(user_id)
+        if item is None:
+            version = 1
+        elif item[1] == expected_version or self._expired(item):
+            version = item[1] + 1
+        else:
+            return None
+        self._data[user_id] = (json.dumps(data, ensure_ascii=False), version, self.clock())
+        return version
+
+    def purge(self):
+        """Удалить просроченные строки (как purge_sessions)"""
+        for user_id in [user_id for user_id, item in self._data.items() if self._expired(item)]:
+            del self._data[user_id]
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "rows": len(self._data)}
+
+
+class PostgresSessionBackend(SessionBackend):
+    """Сессии в таблице user_sessions: общие для всех реплик бота"""
+
+    PURGE_INTERVAL = 3600.0
+
+    def __init__(self, get_pool: Callable, ttl: float):
+        self.get_pool = get_pool
+        self.ttl = ttl
+        self._purged_at = time.monotonic()
+        self.loads = 0
+        self.saves = 0
+
+    async def load(self, user_id: int):
+        pool = self.get_pool()
+        if not pool:
+            return None
+        async with pool.acquire() as conn:
+            row = await queries.fetchrow(conn, "load_session", user_id, self.ttl)
+        self.loads += 1
+        if row is None:
+            return None
+        return json.loads(row["data"]), row["version"]
+
+    async def save(self, user_id: int, data: dict, expected_version: int):
+        pool = self.get_pool()
+        if not pool:
+            return None
+        async with pool.acquire() as conn:
+            version = await queries.fetchval(
+                conn, "save_session",
+                user_id, json.dumps(data, ensure_ascii=False), expected_version, self.ttl
+            )
+            # Просроченные строки удаляются попутно, не чаще раза в час
+            if time.monotonic() - self._purged_at > self.PURGE_INTERVAL:
+                self._purged_at = time.monotonic()
+                await queries.execute(conn, "purge_sessions", self.ttl)
+        self.saves += 1
+        return version
+
+    def stats(self) -> dict:
+        return {"backend": "postgres", "loads": self.loads, "saves": self.saves}
+
+
+class SessionStore:
+    """Сессии пользователей с вытеснением по простою (ttl) и по размеру (maxsize)"""
+
+    # Попыток записи при конфликте версий
+    SAVE_ATTEMPTS = 3
+
+    def __init__(self, ttl: float = 86400.0, maxsize: int = 100000, backend: Optional[SessionBackend] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.backend = backend
+        self._sessions = OrderedDict()  # {user_id: UserSession}, от давно неактивных к свежим
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self.conflicts = 0
+        self.backend_errors = 0
+
+    def _expire(self, now: float):
+        # Словарь упорядочен по последнему обращению: просроченные всегда в начале
+        deadline = now - self.ttl
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.touched_at > deadline:
+                break
+            self._sessions.popitem(last=False)
+            self.expired += 1
+
+    def get(self, user_id: int) -> Optional[UserSession]:
+        """Сессия пользователя или None; обращение продлевает её жизнь"""
+        now = time.monotonic()
+        self._expire(now)
+        session = self._sessions.get(user_id)
+        if session is not None:
+            session.touched_at = now
+            self._sessions.move_to_end(user_id)
+        return session
+
+    def session(self, user_id: int) -> UserSession:
+        """Сессия пользователя; создаётся при первом обращении"""
+        session = self.get(user_id)
+        if session is None:
+            session = self._sessions[user_id] = UserSession(user_id)
+            self.created += 1
+            while len(self._sessions) > self.maxsize:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+        return session
+
+    async def load(self, user_id: int):
+        """Начало апдейта: подтянуть сессию из общего хранилища, если её меняла другая реплика"""
+        if self.backend is None:
+            return
+        try:
+            row = await self.backend.load(user_id)
+        except Exception as e:
+            self.backend_errors += 1
+            logging.warning(f"⚠️ Session load failed for user {user_id}: {e}")
+            return
+        if row is None:
+            return
+        data, version = row
+        session = self.session(user_id)
+        # Та же версия и те же данные — локальная копия актуальна (и может содержать ещё не записанные
+        # изменения). Одной версии мало: после очистки просроченных строк нумерация начинается с 1 заново
+        if session.version != version or data != session.synced:
+            session.apply(data)
+            session.version = version
+            session.synced = session.to_dict()
+
+    async def flush(self, user_id: int):
+        """Конец апдейта: записать изменённую сессию одним запросом с проверкой версии"""
+        if self.backend is None:
+            return
+        session = self._sessions.get(user_id)
+        if session is None:
+            return
+        current = session.to_dict()
+        base = session.synced or _DEFAULTS
+        changed = {name: value for name, value in current.items() if base.get(name) != value}
+        if not changed:
+            return
+
+        try:
+            for _ in range(self.SAVE_ATTEMPTS):
+                version = await self.backend.save(user_id, current, session.version)
+                if version is not None:
+                    session.version = version
+                    session.synced = current
+                    return
+                # Сессию успела изменить другая реплика: накладываем свои изменения на её версию
+                self.conflicts += 1
+                row = await self.backend.load(user_id)
+                remote, remote_version = row if row is not None else (_DEFAULTS, 0)
+                session.apply({**remote, **changed})
+                session.version = remote_version
+                session.synced = dict(remote)
+                current = session.to_dict()
+            logging.warning(f"⚠️ Session for user {user_id} was not saved: version conflict")
+        except Exception as e:
+            self.backend_errors += 1
+            logging.warning(f"⚠️ Session save failed for user {user_id}: {e}")
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self) -> dict:
+        self._expire(time.monotonic())
+        return {
+            "entries": len(self._sessions),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "conflicts": self.conflicts,
+            "backend_errors": self.backend_errors,
+            "approx_bytes": sum(session.size() for session in self._sessions.values()),
+            "backend": self.backend.stats() if self.backend else {"backend": "local"},
+        }
@@ -0,0 +1,174 @@
+"""
+📥 Пул фоновой обработки апдейтов Telegram
+Вебхук кладёт апдейт в ограниченную очередь и сразу отвечает 200,
+фиксированное число воркеров обрабатывает очередь через dp.feed_update.
+Апдейты одного ключа (пользователя/чата) выполняются строго по порядку,
+апдейты разных ключей — параллельно
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class UpdatePool:
+    """Очередь апдейтов с упорядочиванием по ключу и супервизор воркеров"""
+
+    def __init__(
+        self,
+        process: Callable[[Any], Awaitable[Any]],
+        key: Callable[[Any], Hashable],
+        dedupe: Optional[Callable[[Any], Optional[Hashable]]] = None,
+        workers: int = 16,
+        maxsize: int = 1000,
+        per_key_limit: int = 10,
+    ):
+        self.process = process
+        self.key = key
+        self.dedupe = dedupe
+        self.workers = workers
+        self.maxsize = maxsize
+        self.per_key_limit = per_key_limit
+        self._pending = {}  # {key: deque[(enqueued_at, update)]}
+        self._ready = None  # ключи, у которых есть апдейты и которые никто не обрабатывает
+        self._current_taps = {}  # {key: dedupe-значение апдейта, который сейчас обрабатывается}
+        self._size = 0
+        self._tasks = set()
+        self._stopping = False
+        self.busy = 0
+        self.accepted = 0
+        self.dropped = 0
+        self.dropped_duplicates = 0
+        self.dropped_per_key = 0
+        self.processed = 0
+        self.failed = 0
+        self.restarts = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def submit(self, update) -> bool:
+        """
+        Поставить апдейт в очередь.
+        False — общая очередь переполнена (апдейт нужно отклонить);
+        повторные нажатия и переполнение очереди одного ключа отбрасываются с True
+        """
+        if self._ready is None or self._size >= self.maxsize:
+            self.dropped += 1
+            return False
+
+        key = self.key(update)
+        pending = self._pending.get(key)
+        if pending is not None:
+            # Повторное нажатие той же кнопки, пока первое ещё ждёт или идёт обработка
+            if self.dedupe is not None:
+                tap = self.dedupe(update)
+                if tap is not None and (
+                    self._current_taps.get(key) == tap
+                    or any(self.dedupe(queued) == tap for _, queued in pending)
+                ):
+                    self.dropped_duplicates += 1
+                    return True
+            if len(pending) >= self.per_key_limit:
+                self.dropped_per_key += 1
+                logging.warning(f"⚠️ Too many pending updates for {key}, dropping update {getattr(update, 'update_id', '?')}")
+                return True
+
+        if pending is None:
+            pending = self._pending[key] = deque()
+            self._ready.put_nowait(key)
+        pending.append((time.monotonic(), update))
+        self._size += 1
+        self.accepted += 1
+        self.max_depth = max(self.max_depth, self._size)
+        return True
+
+    def start(self):
+        if self._ready is not None:
+            return
+        self._ready = asyncio.Queue()
+        self._stopping = False
+        for _ in range(self.workers):
+            self._spawn()
+        logging.info(f"📥 Update pool started: {self.workers} workers, queue {self.maxsize}")
+
+    def _spawn(self):
+        task = asyncio.create_task(self._worker())
+        self._tasks.add(task)
+        task.add_done_callback(self._on_worker_done)
+
+    def _on_worker_done(self, task: asyncio.Task):
+        """Супервизор: упавший воркер заменяется новым"""
+        self._tasks.discard(task)
+        if self._stopping or task.cancelled():
+            return
+        logging.error(f"❌ Update worker died: {task.exception()!r}, restarting")
+        self.restarts += 1
+        self._spawn()
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            pending = self._pending[key]
+            enqueued_at, update = pending.popleft()
+            self._size -= 1
+            wait = time.monotonic() - enqueued_at
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.busy += 1
+            if self.dedupe is not None:
+                self._current_taps[key] = self.dedupe(update)
+            try:
+                await self.process(update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"❌ Error processing update {getattr(update, 'update_id', '?')}: {e}")
+            finally:
+                self.busy -= 1
+                self._current_taps.pop(key, None)
+                # Следующий апдейт ключа — в конец очереди, чтобы один чат не занимал воркер
+                if pending:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._pending[key]
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Дообработать очередь (не дольше drain_timeout) и остановить воркеры"""
+        if self._ready is None:
+            return
+        deadline = time.monotonic() + drain_timeout
+        while (self._size or self.busy) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._size:
+            logging.warning(f"⚠️ Update pool stopped with {self._size} updates left in queue")
+        self._stopping = True
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._ready = None
+        self._pending.clear()
+        self._current_taps.clear()
+        self._size = 0
+
+    def stats(self) -> dict:
+        started = self.processed + self.failed
+        return {
+            "depth": self._size,
+            "max_depth": self.max_depth,
+            "keys": len(self._pending),
+            "workers": len(self._tasks),
+            "busy": self.busy,
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "dropped_duplicates": self.dropped_duplicates,
+            "dropped_per_key": self.dropped_per_key,
+            "processed": self.processed,
+            "failed": self.failed,
+            "restarts": self.restarts,
+            "avg_wait_seconds": round(self.total_wait / started, 4) if started else 0.0,
+            "max_wait_seconds": round(self.max_wait, 4),
+        }